@@ -0,0 +1,285 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.0"
+# v0.0.0    initial release
+
+"""
+Runs a dependency graph (DAG) of command line steps (gcloud, terraform, bq), with the independent steps in parallel.
+Used by gcp_bootstrap.py, which gcp_generator.py generates from gcp_constants.txt.  Standard library only.
+
+Step options:
+    needs           names of the steps that must succeed (or be skipped) first.
+    skip_if         a command that is run first:  if it succeeds, the step is skipped (e.g. the project already
+                    exists), so the bootstrap can be run again.
+    retry_s         the command is retried for up to this many seconds, with an increasing interval between the
+                    attempts (POLL_INTERVAL up to POLL_MAX_INTERVAL).  This polls for IAM / API propagation
+                    instead of waiting a fixed time:  the step completes as soon as the change is visible.
+    lock            steps with the same lock never run at the same time (e.g. the IAM bindings of one project:
+                    gcloud reads, modifies and writes the whole policy, so concurrent bindings would conflict).
+    allow_fail      a failure is reported as a warning and the dependent steps still run.
+    interactive     the command uses the console (e.g. 'gcloud auth login'):  its output is not captured and
+                    no other step runs at the same time.
+    show_output     the output is printed even if the command succeeds.
+A step that fails blocks the steps that need it (directly or indirectly).  The other steps still run.
+
+The commands are lists of arguments (no shell).  The first argument is looked up on the PATH (gcloud.cmd on
+Windows is found as well), unless it is replaced with --gcloud, --terraform or --bq.
+
+Timing report:  after the run, the start time, duration, attempts and status of each step, the wall time, the
+sum of the step durations (the time a serial run would take) and the critical path (the chain of dependencies
+that determined the wall time).  --report writes it as JSON.
+
+Test the graph without Google Cloud with stub executables, e.g. a script 'stub' that prints its arguments and exits 0:
+    python gcp_bootstrap.py --gcloud ./stub --terraform ./stub --bq ./stub
+A stub that fails the first calls of a command (e.g. by counting calls in a file) exercises the retries.
+--dry-run prints the steps in the order they can run, without running them.
+"""
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+
+
+# Polling of the retried steps (seconds)
+POLL_INTERVAL = 2.0
+POLL_MAX_INTERVAL = 15.0
+
+# Step status
+OK = "ok"
+SKIPPED = "skipped"
+WARNING = "warning"
+FAILED = "failed"
+BLOCKED = "blocked"
+DONE = (OK, SKIPPED, WARNING)
+
+
+class Step:
+    """One command of the graph.  See the description at the top for the options."""
+
+    def __init__(self, name: str, cmd: list, needs: list = (), description: str = "", skip_if: list = None, retry_s: float = 0.0,
+                 lock: str = None, allow_fail: bool = False, interactive: bool = False, show_output: bool = False, cwd: str = None):
+        self.name = name
+        self.cmd = list(cmd)
+        self.needs = list(needs)
+        self.description = description
+        self.skip_if = list(skip_if) if skip_if else None
+        self.retry_s = retry_s
+        self.lock = lock
+        self.allow_fail = allow_fail
+        self.interactive = interactive
+        self.show_output = show_output
+        self.cwd = cwd
+        # Results
+        self.status = None
+        self.attempts = 0
+        self.output = ""
+        self.t_start = None
+        self.t_end = None
+
+    @property
+    def duration(self) -> float:
+        return self.t_end - self.t_start if self.t_end is not None else 0.0
+
+
+def get_waves(steps: list) -> list:
+    """
+    Returns the steps grouped in waves:  each wave only needs the steps of the earlier waves.
+    Raises an Exception for an unknown step in 'needs', a duplicate name, or a cycle.
+    """
+    by_name = {}
+    for step in steps:
+        if step.name in by_name: raise Exception(f"Duplicate step name '{step.name}'")
+        by_name[step.name] = step
+    for step in steps:
+        for name in step.needs:
+            if name not in by_name: raise Exception(f"Step '{step.name}' needs the unknown step '{name}'")
+
+    waves = []
+    placed = set()
+    remaining = list(steps)
+    while remaining:
+        wave = [step for step in remaining if all(name in placed for name in step.needs)]
+        if not wave: raise Exception(f"Dependency cycle between the steps: {', '.join(step.name for step in remaining)}")
+        waves.append(wave)
+        placed.update(step.name for step in wave)
+        remaining = [step for step in remaining if step.name not in placed]
+    return waves
+
+
+def run_command(cmd: list, cwd: str = None, capture: bool = True) -> tuple:
+    """Returns (exit code, output).  A command that cannot be started returns 127."""
+    try:
+        r = subprocess.run(cmd, cwd=cwd, text=True, errors="replace",
+                           stdin=subprocess.DEVNULL if capture else None,
+                           stdout=subprocess.PIPE if capture else None,
+                           stderr=subprocess.STDOUT if capture else None)
+    except OSError as e:
+        return 127, f"{type(e).__name__}: {e}"
+    return r.returncode, r.stdout or ""
+
+
+def run_step(step: Step, executables: dict, cwd: str = None):
+    """Runs 'step' (skip check, command, retries) and sets its results."""
+    def resolve(cmd: list) -> list:
+        exe = executables.get(cmd[0]) or cmd[0]
+        return [shutil.which(exe) or exe] + cmd[1:]
+
+    cwd = step.cwd or cwd
+    step.t_start = time.monotonic()
+    try:
+        if step.skip_if and run_command(resolve(step.skip_if), cwd)[0] == 0:
+            step.status = SKIPPED
+            return
+        deadline = step.t_start + step.retry_s
+        interval = POLL_INTERVAL
+        while True:
+            step.attempts += 1
+            returncode, step.output = run_command(resolve(step.cmd), cwd, capture=not step.interactive)
+            if returncode == 0:
+                step.status = OK
+                return
+            if time.monotonic() + interval > deadline:
+                step.output = step.output.rstrip() + f"\n(exit code {returncode} after {step.attempts} attempt(s))"
+                step.status = WARNING if step.allow_fail else FAILED
+                return
+            time.sleep(interval)
+            interval = min(2 * interval, POLL_MAX_INTERVAL)
+    finally:
+        step.t_end = time.monotonic()
+
+
+def run_dag(steps: list, jobs: int = 8, executables: dict = None, cwd: str = None) -> bool:
+    """
+    Runs the steps, up to 'jobs' at the same time, each as soon as the steps it needs are done.
+    Prints each step as it completes.  Returns True if no step failed or was blocked.
+    """
+    executables = executables or {}
+    order = [step for wave in get_waves(steps) for step in wave]
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        step.status, step.attempts, step.output, step.t_start, step.t_end = None, 0, "", None, None
+
+    t_zero = time.monotonic()
+    pending = list(order)
+    running = {}
+    locks = set()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            interactive_running = any(step.interactive for step in running.values())
+            for step in list(pending):
+                needs = [by_name[name] for name in step.needs]
+                if any(n.status in (FAILED, BLOCKED) for n in needs):
+                    step.status = BLOCKED
+                    pending.remove(step)
+                    print(f"[{time.monotonic() - t_zero:7.1f} s] - {step.name}: blocked by {', '.join(n.name for n in needs if n.status in (FAILED, BLOCKED))}")
+                    continue
+                if not all(n.status in DONE for n in needs): continue
+                if step.lock is not None and step.lock in locks: continue
+                if interactive_running or len(running) >= jobs: continue
+                if step.interactive and running:
+                    # No new steps until the running ones are done and the console is free
+                    interactive_running = True
+                    continue
+                pending.remove(step)
+                if step.lock is not None: locks.add(step.lock)
+                print(f"[{time.monotonic() - t_zero:7.1f} s]   {step.name}: {step.description or ' '.join(step.cmd)}")
+                running[pool.submit(run_step, step, executables, cwd)] = step
+                if step.interactive:
+                    interactive_running = True
+            if not running:
+                if pending: raise Exception(f"No step can start: {', '.join(step.name for step in pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                future.result()
+                if step.lock is not None: locks.discard(step.lock)
+                mark = {OK: "✓", SKIPPED: "=", WARNING: "!", FAILED: "X"}[step.status]
+                retries = f", {step.attempts} attempts" if step.attempts > 1 else ""
+                print(f"[{time.monotonic() - t_zero:7.1f} s] {mark} {step.name}: {step.status} ({step.duration:.1f} s{retries})")
+                if step.output.strip() and (step.show_output or step.status in (FAILED, WARNING)):
+                    print("    " + step.output.strip().replace("\n", "\n    "))
+
+    return all(step.status in DONE for step in steps)
+
+
+def get_critical_path(steps: list) -> list:
+    """The chain of dependencies with the longest total duration (the steps that determined the wall time)."""
+    by_name = {step.name: step for step in steps}
+    longest = {}
+    for step in (s for wave in get_waves(steps) for s in wave):
+        ran = [by_name[name] for name in step.needs if by_name[name].t_end is not None]
+        before = max((longest[n.name] for n in ran), key=lambda path: sum(s.duration for s in path), default=[])
+        longest[step.name] = before + [step] if step.t_end is not None else before
+    return max(longest.values(), key=lambda path: sum(s.duration for s in path), default=[])
+
+
+def get_timing_report(steps: list, wall_s: float) -> dict:
+    t_zero = min((step.t_start for step in steps if step.t_start is not None), default=0.0)
+    critical_path = get_critical_path(steps)
+    return {
+        "wall_s": round(wall_s, 2),
+        "sum_of_steps_s": round(sum(step.duration for step in steps), 2),
+        "critical_path": [step.name for step in critical_path],
+        "critical_path_s": round(sum(step.duration for step in critical_path), 2),
+        "steps": {step.name: {"status": step.status, "start_s": round(step.t_start - t_zero, 2) if step.t_start is not None else None,
+                              "duration_s": round(step.duration, 2), "attempts": step.attempts} for step in steps},
+    }
+
+
+def print_timing_report(report: dict):
+    print(f"\n{'step':30s} {'status':8s} {'start s':>8s} {'duration s':>11s} {'attempts':>9s}")
+    for name, r in sorted(report["steps"].items(), key=lambda item: (item[1]["start_s"] is None, item[1]["start_s"] or 0)):
+        start = f"{r['start_s']:8.1f}" if r["start_s"] is not None else f"{'-':>8s}"
+        print(f"{name:30s} {r['status'] or '-':8s} {start} {r['duration_s']:11.1f} {r['attempts']:9d}")
+    print(f"Wall time {report['wall_s']:.1f} s.  Sum of the step times {report['sum_of_steps_s']:.1f} s (serial run).")
+    print(f"Critical path ({report['critical_path_s']:.1f} s): {' -> '.join(report['critical_path'])}")
+
+
+def main(steps: list, description: str = "", cwd: str = None, required_files: list = ()):
+    """Command line of a generated bootstrap script:  runs 'steps' and prints the timing report.  Exits with 1 on failure."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--dry-run", action="store_true", help="Print the steps in the order they can run, without running them")
+    parser.add_argument("--jobs", type=int, default=8, help="Maximum steps running at the same time (default 8)")
+    parser.add_argument("--report", default=None, help="Write the timing report as JSON to this file")
+    parser.add_argument("--gcloud", default=None, help="gcloud executable (e.g. a stub for testing)")
+    parser.add_argument("--terraform", default=None, help="terraform executable")
+    parser.add_argument("--bq", default=None, help="bq executable")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for i, wave in enumerate(get_waves(steps), 1):
+            print(f"Wave {i}:")
+            for step in wave:
+                print(f"    {step.name:30s} {' '.join(step.cmd)}")
+        return
+
+    for path_file in required_files:
+        if not Path(path_file).is_file(): raise Exception(f"File not found: {path_file}")
+
+    t_start = time.monotonic()
+    succeeded = run_dag(steps, jobs=args.jobs, executables={"gcloud": args.gcloud, "terraform": args.terraform, "bq": args.bq}, cwd=cwd)
+    report = get_timing_report(steps, time.monotonic() - t_start)
+    print_timing_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Timing report written to {args.report}")
+
+    if not succeeded:
+        print(f"\nFAILED: {', '.join(step.name for step in steps if step.status == FAILED)}")
+        sys.exit(1)
+    print("\n✓ Bootstrap complete.")
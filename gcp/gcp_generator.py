@@ -6,7 +6,7 @@
 
 # Define the script version in terms of Semantic Versioning (SemVer)
 # when Git or other versioning systems are not employed.
-__version__ = "0.0.11"
+__version__ = "0.0.21"
 # v0.0.0    14 Jan 2026
 # v0.0.1    Removed [cite: *] that AI added during audit. Revised path_file_py_script_for_cloud_run
 # v0.0.2    Several minor optimizations to gcp_bootstrap.bat
@@ -19,10 +19,27 @@ __version__ = "0.0.11"
 # v0.0.9    Removed the google_storage_bucket lifecycle_rule that caused the startup_probe.txt to be deleted after one day. 
 # v0.0.10   Grant API Keys Admin role to the service account so it can delete API Gateway keys
 # v0.0.11   Added display of the API Gateway URL
+# v0.0.12   Added GCP_RUN_WORKERS and GCP_RUN_PROCESS_MANAGER for a CPU-aware multi-worker server launch.
+# v0.0.13   Added GCP_RUN_RUNTIME_PROFILE to select the uvloop event loop and httptools HTTP parser.
+# v0.0.14   Incremental generation:  manifest of input / output hashes, unchanged files are not rewritten.  --check reports drift.
+# v0.0.15   Added GCP_DOCKERFILE_MODE=multistage:  cached dependency layers, BuildKit pip cache, registry layer cache in cloudbuild.yaml.
+# v0.0.16   Added GCP_IMAGE_PROFILE=optimized:  slim venv, unchecked-hash bytecode, import smoke test with the startup time as an image label.
+# v0.0.17   Added GCP_RUN_PERFORMANCE_PROFILE (cheap, balanced, low-latency) and GCP_RUN_CONCURRENCY / _MIN_INSTANCES / _MAX_INSTANCES / _CPU / _MEMORY.
+# v0.0.18   Generates gcp_bootstrap.py:  the bootstrap steps as a dependency graph run in parallel by gcp_dag.py, polling instead of fixed waits.
+# v0.0.19   Added GCP_IMPORT_TIME_THRESHOLD:  import-time regression gate (gcp_import_time.py), no files are generated if the startup regressed.
+# v0.0.20   Removed generate_dockerfile() (unused, ignored GCP_DOCKERFILE_MODE / GCP_IMAGE_PROFILE).  Use get_dockerfile_content().
+# v0.0.21   The import-time gate runs on every run (also --check), before the manifest short-circuit.
+# v0.0.22   RUN_PERFORMANCE_PROFILES:  balanced keeps the CPU allocated between requests (--no-cpu-throttling).
 
 import os
 from pathlib import Path
+import argparse
+import hashlib
+import json
 import re
+import sys
+
+from gcp_import_time import check_import_time
 
 print(f"'{Path(__file__).stem}.py' v{__version__}")
 
@@ -56,9 +73,144 @@ def get_app_version(file_path: Path):
         return "error"
     
 
-def generate_dockerfile(path_file_dockerfile:Path, path_file_py_script_for_cloud_run:str):
+# Python one-liner executed by the container at startup when GCP_RUN_WORKERS=auto.
+# Prints the number of vCPUs allotted to the container by the cgroup v2 CPU quota (/sys/fs/cgroup/cpu.max),
+# rounded up.  Falls back to the CPUs the process may run on when no quota is set.
+# Written without double quotes or $ so it can be embedded in the shell form of the Dockerfile CMD.
+CGROUP_WORKERS_PY = (
+    "import os;"
+    "p='/sys/fs/cgroup/cpu.max';"
+    "q,t=(open(p).read().split()+['',''])[:2] if os.path.exists(p) else ('max','');"
+    "print(max(1,-(-int(q)//int(t))) if q.isdigit() and t.isdigit() else len(os.sched_getaffinity(0)))"
+)
+
+# Supported values for GCP_RUN_PROCESS_MANAGER
+PROCESS_MANAGERS = ("uvicorn", "gunicorn")
+
+# Supported values for GCP_RUN_RUNTIME_PROFILE
+# "standard"     asyncio event loop and the pure Python h11 HTTP parser.
+# "performance"  uvloop event loop and the httptools HTTP parser (C implementations, typically 
+#                noticeably more requests/s).  uvicorn's 'auto' setting is used so the server falls back 
+#                to asyncio / h11 if either package is missing.
+RUNTIME_PROFILES = ("standard", "performance")
+
+# Supported values for GCP_DOCKERFILE_MODE
+# "standard"     single stage Dockerfile, built with 'docker build --no-cache' (every build reinstalls requirements.txt).
+# "multistage"   the dependencies are installed into a virtual environment in a separate build stage that only 
+#                depends on requirements.txt, and /src is copied last, so a change to /src only rebuilds the last 
+#                layers.  The layers are cached in Artifact Registry between builds (see get_cloudbuild_build_steps()),
+#                pip downloads use a BuildKit cache mount, and the bytecode of /src is compiled at build time.
+DOCKERFILE_MODES = ("standard", "multistage")
+
+# Supported values for GCP_IMAGE_PROFILE  (multistage Dockerfile only)
+# "standard"     the image as built by GCP_DOCKERFILE_MODE.
+# "optimized"    faster cold start:  pip, the test suites, type stubs, C sources and docs of the installed packages
+#                are removed, the bytecode of the packages and of /src is compiled at build time as 'unchecked-hash'
+#                .pyc files (no source timestamp checks at import), and an import smoke test stage measures the
+#                interpreter start + import time of PYTHON_FILENAME.  cloudbuild.yaml runs the smoke test first
+#                (the build stops if the app cannot be imported) and stores the measured time in the image label
+#                'startup.import_ms', so the builds can be compared.
+IMAGE_PROFILES = ("standard", "optimized")
+
+# Supported values for GCP_RUN_PERFORMANCE_PROFILE:  the 'gcloud run deploy' flags of each profile.
+# "default"      the flags of the earlier versions (Cloud Run defaults:  concurrency 80, 1 vCPU, 512Mi, CPU only 
+#                allocated during requests, scale to zero, up to 100 instances).
+# "cheap"        scale to zero, few small instances that each take many requests, no startup CPU boost.
+#                Expect cold starts, and 429 responses when the load exceeds max-instances.
+# "balanced"     scale to zero, moderate concurrency so the latency stays low under load, startup CPU boost.
+# "low-latency"  one instance always warm with CPU always allocated (billed while idle, even without requests), 
+#                2 vCPUs (see GCP_RUN_WORKERS=auto), low concurrency.
+# GCP_RUN_CONCURRENCY, GCP_RUN_MIN_INSTANCES, GCP_RUN_MAX_INSTANCES, GCP_RUN_CPU and GCP_RUN_MEMORY override the 
+# values of the profile (e.g. with the settings recommended by 'python rest_api_client.py recommend').
+# A flag with the value True is written without a value.
+# With --cpu-throttling (cheap, and the Cloud Run default of "default") the CPU is only allocated while a request is
+# in flight:  the background work of rest_api_server.py stalls between requests (the job runner of /api/jobs/...,
+# the analytics and Firestore flushers, the tracing exporter).  balanced and low-latency keep it allocated.
+RUN_PERFORMANCE_PROFILES = {
+    "default": {"timeout": "300s", "cpu-boost": True},
+    "cheap": {"timeout": "300s", "concurrency": "80", "min-instances": "0", "max-instances": "3",
+              "cpu": "1", "memory": "512Mi", "cpu-throttling": True, "no-cpu-boost": True},
+    "balanced": {"timeout": "300s", "concurrency": "40", "min-instances": "0", "max-instances": "10",
+                 "cpu": "1", "memory": "1Gi", "no-cpu-throttling": True, "cpu-boost": True},
+    "low-latency": {"timeout": "300s", "concurrency": "20", "min-instances": "1", "max-instances": "20",
+                    "cpu": "2", "memory": "2Gi", "no-cpu-throttling": True, "cpu-boost": True},
+}
+
+# gcp_constants.txt key: deploy flag overridden by it
+RUN_DEPLOY_OVERRIDES = {
+    "GCP_RUN_CONCURRENCY": "concurrency",
+    "GCP_RUN_MIN_INSTANCES": "min-instances",
+    "GCP_RUN_MAX_INSTANCES": "max-instances",
+    "GCP_RUN_CPU": "cpu",
+    "GCP_RUN_MEMORY": "memory",
+}
+
+
+def get_extra_requirements(c:dict) -> list:
+    """
+    Returns the packages that the options in gcp_constants.txt require in the container
+    in addition to those listed in pip_install.txt.
+    """
+    extra = []
+    if c.get('GCP_RUN_PROCESS_MANAGER', 'uvicorn') == "gunicorn":
+        extra += ["gunicorn", "uvicorn-worker"]
+    if c.get('GCP_RUN_RUNTIME_PROFILE', 'standard') == "performance":
+        extra += ["uvloop", "httptools"]
+    return extra
+
+
+def get_server_cmd(filename_only:str, workers:str="1", process_manager:str="uvicorn", runtime_profile:str="standard") -> str:
+    """
+    Returns the Dockerfile CMD line (shell form) that launches the FastAPI app 'src.{filename_only}:app'.
+
+    workers:            "1" (default) a single uvicorn process,
+                        "N" a fixed number of worker processes,
+                        "auto" size the worker count at container start from the cgroup CPU quota.
+    process_manager:    "uvicorn" uses uvicorn's built-in supervisor (--workers),
+                        "gunicorn" uses gunicorn with uvicorn workers (restarts crashed workers).
+    runtime_profile:    "standard" or "performance" (see RUNTIME_PROFILES).
+
+    The worker count is passed through WEB_CONCURRENCY (read by both uvicorn and gunicorn), so a value
+    set with 'gcloud run deploy --set-env-vars WEB_CONCURRENCY=#' overrides it without a rebuild.
+    Each worker is a separate process that runs its own lifespan (own httpx.AsyncClient, drain state, etc.).
+    """
+    app_path = f"src.{filename_only}:app"
+
+    if runtime_profile == "performance":
+        loop_http = "--loop auto --http auto"
+        gunicorn_worker = "uvicorn_worker.UvicornWorker"
+    else:
+        loop_http = "--loop asyncio --http h11"
+        gunicorn_worker = "uvicorn_worker.UvicornH11Worker"
+
+    if process_manager == "uvicorn" and workers == "1":
+        # Single process (the original behavior)
+        return f"CMD uvicorn {app_path} --host 0.0.0.0 --port $PORT {loop_http}"
+
+    if workers == "auto":
+        web_concurrency = f'export WEB_CONCURRENCY=${{WEB_CONCURRENCY:-$(python -c "{CGROUP_WORKERS_PY}")}}'
+    else:
+        web_concurrency = f"export WEB_CONCURRENCY=${{WEB_CONCURRENCY:-{workers}}}"
+
+    if process_manager == "gunicorn":
+        # --timeout 0 disables the gunicorn worker heartbeat timeout (Cloud Run enforces the request timeout).
+        # --graceful-timeout stays under the 10 s Cloud Run allows between SIGTERM and SIGKILL.
+        server = f"exec gunicorn {app_path} -k {gunicorn_worker} --bind 0.0.0.0:$PORT --workers $WEB_CONCURRENCY --timeout 0 --graceful-timeout 9"
+    else:
+        server = f"exec uvicorn {app_path} --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY {loop_http}"
+
+    return f"CMD {web_concurrency} && echo WEB_CONCURRENCY=$WEB_CONCURRENCY && {server}"
+
+
+def get_dockerfile_content(path_file_py_script_for_cloud_run:str, workers:str="1", process_manager:str="uvicorn", runtime_profile:str="standard",
+                           dockerfile_mode:str="standard", py_ver:str="3.12", image_profile:str="standard") -> str:
     """
-    Generates a Dockerfile and specifies 'path_file_py_script_for_cloud_run' at the end for the CMD command.
+    Returns the Dockerfile contents, with 'path_file_py_script_for_cloud_run' at the end for the CMD command.
+    'dockerfile_mode' (GCP_DOCKERFILE_MODE) selects a single stage or a multi-stage Dockerfile (see DOCKERFILE_MODES).
+    'image_profile' (GCP_IMAGE_PROFILE) applies to the multi-stage Dockerfile (see IMAGE_PROFILES).
+
+    'workers', 'process_manager' and 'runtime_profile' come from GCP_RUN_WORKERS, GCP_RUN_PROCESS_MANAGER
+    and GCP_RUN_RUNTIME_PROFILE in gcp_constants.txt.  See get_server_cmd().
     """
 
     # Get just the Python filename (no filename extension) from path_file_py_script_for_cloud_run
@@ -66,14 +218,11 @@ def generate_dockerfile(path_file_dockerfile:Path, path_file_py_script_for_cloud
     filename_only = filename_only.split(".")[0].strip()
     #print(f"filename_only: '{filename_only}'")
 
-    # Delete the Dockerfile if it already exists (makes sure it can be overwritten later).
-    if path_file_dockerfile.is_file(): 
-        try:
-          path_file_dockerfile.unlink()
-        except Exception as e:
-            print(e)
-            return False
-    
+    server_cmd = get_server_cmd(filename_only, workers, process_manager, runtime_profile)
+
+    if dockerfile_mode == "multistage":
+        return get_multistage_dockerfile_content(path_file_py_script_for_cloud_run, server_cmd, runtime_profile, py_ver, image_profile)
+
     # Create the Dockerfile content.
     dockerfile_content = f"""# syntax=docker/dockerfile:1 
 
@@ -109,7 +258,9 @@ ENV PIP_DEFAULT_TIMEOUT=100 \\
     # disable a pip version check to reduce run-time & log-spam 
     PIP_DISABLE_PIP_VERSION_CHECK=1 \\
     # cache is useless in docker image, so disable to reduce image size 
-    PIP_NO_CACHE_DIR=1
+    PIP_NO_CACHE_DIR=1 \\
+    # event loop / HTTP parser profile (reported by the app at startup) 
+    RUNTIME_PROFILE={runtime_profile}
 
 # Install any needed packages specified in requirements.txt 
 RUN pip install --no-cache-dir -r requirements.txt
@@ -133,18 +284,341 @@ EXPOSE 8080
 # Added --server.enableXsrfProtection false because Cloud Run already terminates connections safely.  This removes overhead on every interaction.
 #CMD streamlit run {path_file_py_script_for_cloud_run} --server.address 0.0.0.0 --server.port $PORT --server.enableXsrfProtection false\n
 
-# Below is for uvicorn
-CMD uvicorn src.{filename_only}:app --host 0.0.0.0 --port $PORT\n
+# Below is for uvicorn (GCP_RUN_WORKERS / GCP_RUN_PROCESS_MANAGER in gcp_constants.txt)
+{server_cmd}\n
 """
+    return dockerfile_content
 
-    try:
-        with open(path_file_dockerfile, "w", encoding="utf-8") as f:
-            f.write(dockerfile_content)
-        print(f"Successfully generated {path_file_py_script_for_cloud_run}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return False
-    return True
+
+def get_multistage_dockerfile_content(path_file_py_script_for_cloud_run:str, server_cmd:str, runtime_profile:str="standard", py_ver:str="3.12",
+                                      image_profile:str="standard") -> str:
+    """
+    Returns the contents of a multi-stage Dockerfile (GCP_DOCKERFILE_MODE=multistage).
+    The layers are ordered from least to most frequently changed, so a change to /src reuses every layer
+    up to 'COPY src' (from the local Docker cache, or from the registry cache in Cloud Build).
+    'image_profile' (GCP_IMAGE_PROFILE) "optimized" adds the steps described at IMAGE_PROFILES.
+    """
+    # Module imported by the smoke test, the same one the CMD launches ('src.{filename_only}:app')
+    filename_only = path_file_py_script_for_cloud_run.split("/")[-1].split(".")[0].strip()
+
+    deps_optimized = ""
+    runtime_stage = ""
+    compile_src = """# Compile the bytecode at build time, so each new Cloud Run instance does not compile it at startup.
+RUN python -m compileall -q /app/src"""
+    smoke_stages = ""
+    if image_profile == "optimized":
+        deps_optimized = """
+# Slim the virtual environment:  remove pip, the test suites, type stubs, C sources / headers and docs of the
+# installed packages (the license files in *.dist-info are kept), then compile all the bytecode.
+# 'unchecked-hash' .pyc files are never checked against the source, so the interpreter does not stat each .py
+# file at import (the image is immutable).  A file that does not compile (e.g. a template) is skipped.
+RUN pip uninstall -y -q pip \\
+ && find /opt/venv -type d \\( -name tests -o -name __pycache__ \\) -prune -exec rm -rf {} + \\
+ && find /opt/venv -type f \\( -name "*.pyi" -o -name "*.pyx" -o -name "*.pxd" -o -name "*.c" -o -name "*.h" -o -name "*.md" -o -name "*.rst" \\) \\
+        -not -path "*.dist-info/*" -delete \\
+ && (python -m compileall -q -j 0 --invalidation-mode unchecked-hash /opt/venv/lib || echo "Some files were not compiled")
+"""
+        runtime_stage = " AS runtime"
+        compile_src = """# Compile the bytecode at build time, so each new Cloud Run instance does not compile it at startup.
+# ('unchecked-hash':  see the deps stage.  Unlike the packages, every file in /src must compile.)
+RUN python -m compileall -q -j 0 --invalidation-mode unchecked-hash /app/src"""
+        smoke_stages = f"""
+# ---------------------------------------------------------------------
+# Import smoke test (only built when targeted, see cloudbuild.yaml):  the build fails if the app cannot be imported.
+# Records the median time of 5 cold starts of the interpreter + import of the app (milliseconds) and
+# the 'python -X importtime' report.
+FROM runtime AS smoke
+RUN <<EOF
+set -e
+mkdir -p /smoke
+python - <<'PY'
+import statistics, subprocess, sys, time
+times = []
+for _ in range(5):
+    t_start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import src.{filename_only}"], check=True, stdout=subprocess.DEVNULL)
+    times.append(1000 * (time.perf_counter() - t_start))
+open("/smoke/import_ms.txt", "w").write("%.0f" % statistics.median(times))
+PY
+python -X importtime -c "import src.{filename_only}" 2> /smoke/importtime.txt >/dev/null
+EOF
+
+# Only the results, so 'docker buildx build --target smoke-result --output type=local,dest=smoke .' exports two files.
+FROM scratch AS smoke-result
+COPY --from=smoke /smoke /
+
+# ---------------------------------------------------------------------
+# Final image:  the runtime stage, labeled with the startup time measured by the smoke test.
+# Compare builds with:  docker buildx imagetools inspect IMAGE:TAG --format "{{{{json .Image.Config.Labels}}}}"
+FROM runtime
+ARG STARTUP_IMPORT_MS=unknown
+LABEL startup.import_ms=$STARTUP_IMPORT_MS \\
+      startup.import_module=src.{filename_only}
+"""
+
+    return f"""# syntax=docker/dockerfile:1
+# Generated by gcp_generator.py  (GCP_DOCKERFILE_MODE=multistage)
+
+ARG PY_VER={py_ver}
+
+# ---------------------------------------------------------------------
+# Stage 1:  install the dependencies into a virtual environment.
+# Only requirements.txt is copied into this stage, so it is rebuilt only when requirements.txt changes.
+FROM python:${{PY_VER}}-slim AS deps
+
+ENV PIP_DEFAULT_TIMEOUT=100 \\
+    PIP_DISABLE_PIP_VERSION_CHECK=1
+
+RUN python -m venv /opt/venv
+ENV PATH="/opt/venv/bin:$PATH"
+
+COPY requirements.txt /tmp/requirements.txt
+
+# The BuildKit cache mount keeps the pip download cache between local builds without adding it to the image.
+# pip compiles the bytecode of the installed packages.
+RUN --mount=type=cache,target=/root/.cache/pip \\
+    pip install -r /tmp/requirements.txt
+{deps_optimized}
+# ---------------------------------------------------------------------
+# Stage 2:  runtime image.  No build tools or pip cache, only the virtual environment and the app.
+FROM python:${{PY_VER}}-slim{runtime_stage}
+
+WORKDIR /app
+
+ENV PATH="/opt/venv/bin:$PATH" \\
+    # Set the environment variable so Python can find the modules in /app/src 
+    PYTHONPATH="/app/src" \\
+    # Allow statements and log messages to immediately appear 
+    PYTHONUNBUFFERED=1 \\
+    # event loop / HTTP parser profile (reported by the app at startup) 
+    RUNTIME_PROFILE={runtime_profile}
+
+COPY --from=deps /opt/venv /opt/venv
+
+# Copy the data folder from root to /app/data 
+# (--chmod:  Cloud Run instances may have strict "User" permissions, without a separate chmod layer)
+COPY --chmod=755 data /app/data
+
+# Copy the source code last:  a change to /src only rebuilds from here.
+COPY src /app/src
+
+{compile_src}
+
+EXPOSE 8080
+
+# Below is only for a streamlit app
+#CMD streamlit run {path_file_py_script_for_cloud_run} --server.address 0.0.0.0 --server.port $PORT --server.enableXsrfProtection false\n
+
+# Below is for uvicorn (GCP_RUN_WORKERS / GCP_RUN_PROCESS_MANAGER in gcp_constants.txt)
+{server_cmd}\n
+{smoke_stages}"""
+
+
+def get_cloudbuild_build_steps(dockerfile_mode:str="standard", image_profile:str="standard") -> str:
+    """
+    Returns the cloudbuild.yaml steps that build and push the image ${_IMAGE}:${BUILD_ID}.
+
+    "standard":    docker build --no-cache, then docker push.
+    "multistage":  docker buildx with a registry cache:  the layers of every build stage (mode=max, including
+                   the dependency stage) are stored as ${_IMAGE}:buildcache in Artifact Registry and reused by
+                   the next build, so a build after a change to /src only runs the last layers.
+                   (A BuildKit cache mount does not persist between Cloud Build runs, the registry cache does.)
+    "multistage" with image_profile "optimized":  first builds the 'smoke-result' target (import smoke test, see
+                   get_multistage_dockerfile_content()) and passes the measured time to the image build as the
+                   build argument STARTUP_IMPORT_MS (a Dockerfile LABEL cannot be set from the output of a RUN step).
+                   ('$$' is a literal '$' in cloudbuild.yaml, for the bash variable.)
+    """
+    image = "${_REGION}-docker.pkg.dev/${PROJECT_ID}/${_REPO}/${_IMAGE}"
+    if dockerfile_mode == "multistage" and image_profile == "optimized":
+        return f"""  # Import smoke test, then build with BuildKit, reusing the layers cached in Artifact Registry by the previous build, and push.
+  # The startup time measured by the smoke test is stored in the image label 'startup.import_ms'.
+  # The docker-container driver is required to export the cache of all the build stages (mode=max).
+  - name: 'gcr.io/cloud-builders/docker'
+    entrypoint: 'bash'
+    args:
+      - '-c'
+      - |
+        set -e
+        docker buildx create --name cached-builder --driver docker-container --use
+        docker buildx build \\
+          --cache-from type=registry,ref={image}:buildcache \\
+          --target smoke-result --output type=local,dest=smoke .
+        STARTUP_IMPORT_MS=$$(cat smoke/import_ms.txt)
+        echo "Import smoke test: $$STARTUP_IMPORT_MS ms (interpreter start + import, median of 5).  Slowest imports (cumulative us):"
+        sort -t '|' -k 2 -n smoke/importtime.txt | tail -n 15
+        docker buildx build \\
+          --cache-from type=registry,ref={image}:buildcache \\
+          --cache-to type=registry,ref={image}:buildcache,mode=max \\
+          --build-arg STARTUP_IMPORT_MS=$$STARTUP_IMPORT_MS \\
+          -t {image}:${{BUILD_ID}} \\
+          --push .
+"""
+    if dockerfile_mode == "multistage":
+        return f"""  # Build with BuildKit, reusing the layers cached in Artifact Registry by the previous build, and push.
+  # The docker-container driver is required to export the cache of all the build stages (mode=max).
+  - name: 'gcr.io/cloud-builders/docker'
+    entrypoint: 'bash'
+    args:
+      - '-c'
+      - |
+        docker buildx create --name cached-builder --driver docker-container --use
+        docker buildx build \\
+          --cache-from type=registry,ref={image}:buildcache \\
+          --cache-to type=registry,ref={image}:buildcache,mode=max \\
+          -t {image}:${{BUILD_ID}} \\
+          --push .
+"""
+    return f"""  # Build the image with a unique tag
+  # Note that argument '--no-cache' was added to force Docker to ignore caches during the build (so that updates to the Python file in /src will be recognized).
+  - name: 'gcr.io/cloud-builders/docker'
+    args: ['build', '--no-cache', '-t', '{image}:${{BUILD_ID}}', '.']
+
+  # Push the image with a unique tag
+  - name: 'gcr.io/cloud-builders/docker'
+    args: ['push', '{image}:${{BUILD_ID}}']
+"""
+
+
+def get_deploy_flags(c:dict) -> str:
+    """
+    Returns the 'gcloud run deploy' flags of GCP_RUN_PERFORMANCE_PROFILE (see RUN_PERFORMANCE_PROFILES) with the
+    overrides in gcp_constants.txt (RUN_DEPLOY_OVERRIDES), one per line for the deploy step in cloudbuild.yaml.
+    """
+    flags = dict(RUN_PERFORMANCE_PROFILES[c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default')])
+    for key, flag in RUN_DEPLOY_OVERRIDES.items():
+        if c.get(key): flags[flag] = c[key]
+    lines = [f"--{flag}" if value is True else f"--{flag} {value}" for flag, value in flags.items()]
+    return "".join(f"          {line} \\\n" for line in lines)
+
+
+# Services enabled by the bootstrap (one 'gcloud services enable' call)
+BOOTSTRAP_SERVICES = ("iam.googleapis.com", "iamcredentials.googleapis.com", "cloudresourcemanager.googleapis.com",
+                      "cloudbuild.googleapis.com", "run.googleapis.com", "artifactregistry.googleapis.com", "storage.googleapis.com",
+                      "apigateway.googleapis.com", "servicemanagement.googleapis.com", "servicecontrol.googleapis.com",
+                      "apikeys.googleapis.com", "bigquery.googleapis.com")
+# Roles of the service account in GCP_PROJ_ID, and in the BigQuery data project GCP_BQ_PROJ_ID
+BOOTSTRAP_PROJECT_ROLES = ("storage.admin", "iam.serviceAccountUser", "bigquery.admin", "run.developer", "serviceusage.apiKeysAdmin",
+                           "bigquery.dataViewer", "bigquery.metadataViewer", "bigquery.jobUser")
+BOOTSTRAP_BQ_PROJECT_ROLES = ("bigquery.jobUser", "bigquery.dataViewer")
+# Seconds a step that depends on propagation (new project, service account, IAM) keeps retrying
+BOOTSTRAP_PROPAGATION_S = 300
+
+
+def get_bootstrap_steps(c:dict) -> list:
+    """
+    Returns the steps of gcp_bootstrap.py as [(name, command, options), ...] (see Step in gcp_dag.py).
+    The same commands as gcp_bootstrap.bat, with the dependencies that allow the independent ones to run in parallel:
+    e.g. 'terraform init' (local) runs while the project is created, and the IAM bindings of GCP_PROJ_ID, those of
+    GCP_BQ_PROJ_ID and the Artifact Registry run at the same time.  The fixed waits (timeout /t 60, /t 30) are replaced
+    by retrying the steps that depend on propagation until they succeed (retry_s).
+    """
+    proj = c['GCP_PROJ_ID']
+    bq_proj = c['GCP_BQ_PROJ_ID']
+    region = c['GCP_REGION']
+    sa = f"{c['GCP_SVC_ACT_PREFIX']}@{proj}.iam.gserviceaccount.com"
+    propagation = BOOTSTRAP_PROPAGATION_S
+
+    steps = [
+        ("auth", ["gcloud", "auth", "login"],
+         {"description": "Log in (gcloud CLI)", "skip_if": ["gcloud", "auth", "print-access-token"], "interactive": True}),
+        ("adc", ["gcloud", "auth", "application-default", "login"],
+         {"needs": ["auth"], "description": "Log in (application default credentials for Terraform)",
+          "skip_if": ["gcloud", "auth", "application-default", "print-access-token"], "interactive": True}),
+        ("gcloud_update", ["gcloud", "components", "update", "--quiet"], {"allow_fail": True}),
+        ("bq_cli", ["gcloud", "components", "install", "bq", "--quiet"],
+         {"needs": ["gcloud_update"], "description": "Install the BigQuery CLI (bq) if needed", "skip_if": ["bq", "version"]}),
+        ("terraform_init", ["terraform", "init"], {}),
+        ("project", ["gcloud", "projects", "create", proj],
+         {"needs": ["auth"], "skip_if": ["gcloud", "projects", "describe", proj]}),
+        ("config_project", ["gcloud", "config", "set", "project", proj], {"needs": ["project"]}),
+        ("billing", ["gcloud", "billing", "projects", "link", proj, f"--billing-account={c['GCP_BILLING_ACCOUNT']}"],
+         {"needs": ["project"], "retry_s": propagation}),
+        ("quota_project", ["gcloud", "auth", "application-default", "set-quota-project", proj],
+         {"needs": ["project", "adc"], "retry_s": propagation}),
+        ("bq_project", ["gcloud", "projects", "describe", bq_proj],
+         {"needs": ["auth"], "description": f"Verify that the BigQuery project GCP_BQ_PROJ_ID={bq_proj} exists"}),
+        ("services", ["gcloud", "services", "enable", *BOOTSTRAP_SERVICES, f"--project={proj}"],
+         {"needs": ["billing"], "retry_s": propagation}),
+        ("service_account", ["gcloud", "iam", "service-accounts", "create", c['GCP_SVC_ACT_PREFIX'], f"--project={proj}"],
+         {"needs": ["services"], "skip_if": ["gcloud", "iam", "service-accounts", "describe", sa, f"--project={proj}"], "retry_s": propagation}),
+    ]
+
+    # IAM bindings.  gcloud rewrites the whole policy of the project, so the bindings of one project share a lock.
+    iam_steps = []
+    for project, roles, prefix in ((proj, BOOTSTRAP_PROJECT_ROLES, "iam"), (bq_proj, BOOTSTRAP_BQ_PROJECT_ROLES, "bq_iam")):
+        for role in roles:
+            name = f"{prefix}_{role.replace('.', '_')}"
+            iam_steps.append(name)
+            steps.append((name, ["gcloud", "projects", "add-iam-policy-binding", project, f"--member=serviceAccount:{sa}",
+                                 f"--role=roles/{role}", "--condition=None", "--quiet"],
+                          {"needs": ["service_account"] + (["bq_project"] if prefix == "bq_iam" else []),
+                           "retry_s": propagation, "lock": f"iam:{project}"}))
+
+    steps += [
+        ("registry_delete", ["gcloud", "artifacts", "repositories", "delete", c['GCP_REPOSITORY'], f"--location={region}", f"--project={proj}", "--quiet"],
+         {"needs": ["services"], "description": "Delete the Artifact Registry repository (if it exists)", "allow_fail": True}),
+        ("registry", ["gcloud", "artifacts", "repositories", "create", c['GCP_REPOSITORY'], "--repository-format=docker", f"--location={region}", f"--project={proj}"],
+         {"needs": ["registry_delete"], "retry_s": propagation}),
+        ("terraform_apply", ["terraform", "apply", "-auto-approve"],
+         {"needs": ["terraform_init", "config_project", "quota_project", "services"]}),
+        ("build", ["gcloud", "builds", "submit", "--config", "cloudbuild.yaml", f"--project={proj}", "."],
+         {"needs": ["terraform_apply", "registry", "bq_cli"] + iam_steps, "description": "Build the image and deploy to Cloud Run (Cloud Build)"}),
+        ("run_invoker", ["gcloud", "run", "services", "add-iam-policy-binding", c['GCP_RUN_JOB'], "--member=allUsers", "--role=roles/run.invoker",
+                         f"--project={proj}", f"--region={region}"],
+         {"needs": ["build"], "retry_s": propagation}),
+        ("bucket_iam", ["gcloud", "storage", "buckets", "add-iam-policy-binding", f"gs://{c['GCP_GS_BUCKET']}", f"--project={proj}",
+                        f"--member=serviceAccount:{sa}", "--role=roles/storage.objectAdmin"],
+         {"needs": ["terraform_apply", "service_account"], "retry_s": propagation}),
+        ("show_logs", ["gcloud", "run", "services", "logs", "read", c['GCP_RUN_JOB'], f"--region={region}", f"--project={proj}", "--limit=50"],
+         {"needs": ["build"], "allow_fail": True, "show_output": True}),
+        ("show_env", ["gcloud", "run", "services", "describe", c['GCP_RUN_JOB'], f"--region={region}", f"--project={proj}",
+                      "--format=yaml(spec.template.spec.containers[0].env)"],
+         {"needs": ["build"], "allow_fail": True, "show_output": True, "description": "Environment variables available to the app"}),
+        ("show_url", ["gcloud", "run", "services", "describe", c['GCP_RUN_JOB'], f"--region={region}", f"--project={proj}", "--format=value(status.url)"],
+         {"needs": ["run_invoker"], "allow_fail": True, "show_output": True, "description": "Cloud Run URL"}),
+    ]
+    return steps
+
+
+def get_bootstrap_py_content(c:dict) -> str:
+    """Returns gcp_bootstrap.py:  the steps of get_bootstrap_steps() run by gcp_dag.py."""
+    def literal(value) -> str:
+        # JSON strings and lists are valid Python (with double quotes), booleans and numbers are not.
+        return repr(value) if isinstance(value, (bool, int, float)) else json.dumps(value)
+
+    step_lines = []
+    for name, cmd, options in get_bootstrap_steps(c):
+        options = ", ".join(f"{key}={literal(value)}" for key, value in options.items())
+        step_lines.append(f"    Step({literal(name)}, {literal(cmd)}" + (f",\n         {options}" if options else "") + "),")
+    steps = "\n".join(step_lines)
+
+    return f'''# Generated by gcp_generator.py
+"""
+Bootstrap of the Google Cloud project {c['GCP_PROJ_ID']}:  the steps of gcp_bootstrap.bat as a dependency graph.
+Independent steps run in parallel, and the steps that depend on propagation are retried until they succeed
+instead of waiting a fixed time.  A timing report is printed at the end.  See gcp_dag.py.
+
+Run from any folder (Windows, macOS or Linux):
+    python gcp/gcp_bootstrap.py
+    python gcp/gcp_bootstrap.py --dry-run                      (the steps in the order they can run)
+    python gcp/gcp_bootstrap.py --report bootstrap_timing.json
+    python gcp/gcp_bootstrap.py --gcloud ./stub --terraform ./stub --bq ./stub      (test with stub executables)
+"""
+
+from pathlib import Path
+
+from gcp_dag import Step, main
+
+PATH_BASE = Path(__file__).resolve().parent.parent
+
+STEPS = [
+{steps}
+]
+
+if __name__ == "__main__":
+    main(STEPS, description="Bootstrap of the Google Cloud project {c['GCP_PROJ_ID']}", cwd=str(PATH_BASE),
+         required_files=[PATH_BASE / "src" / ".env"])
+'''
 
 
 def validate_constants(c):
@@ -167,6 +641,51 @@ def validate_constants(c):
     if not re.match(r'^[a-z0-9][a-z0-9-]{0,61}[a-z0-9]$', c.get('GCP_REPOSITORY', '')):
         errors.append(f"Invalid GCP_REPOSITORY: '{c.get('GCP_REPOSITORY')}'")
 
+    # 5. Server workers (optional): a positive integer or 'auto'.
+    if not re.match(r'^(auto|[1-9][0-9]*)$', c.get('GCP_RUN_WORKERS', '1')):
+        errors.append(f"Invalid GCP_RUN_WORKERS: '{c.get('GCP_RUN_WORKERS')}' (Must be a positive integer or 'auto')")
+
+    # 6. Process manager (optional)
+    if c.get('GCP_RUN_PROCESS_MANAGER', 'uvicorn') not in PROCESS_MANAGERS:
+        errors.append(f"Invalid GCP_RUN_PROCESS_MANAGER: '{c.get('GCP_RUN_PROCESS_MANAGER')}' (Must be one of {PROCESS_MANAGERS})")
+
+    # 7. Runtime profile (optional)
+    if c.get('GCP_RUN_RUNTIME_PROFILE', 'standard') not in RUNTIME_PROFILES:
+        errors.append(f"Invalid GCP_RUN_RUNTIME_PROFILE: '{c.get('GCP_RUN_RUNTIME_PROFILE')}' (Must be one of {RUNTIME_PROFILES})")
+
+    # 8. Dockerfile mode (optional)
+    if c.get('GCP_DOCKERFILE_MODE', 'standard') not in DOCKERFILE_MODES:
+        errors.append(f"Invalid GCP_DOCKERFILE_MODE: '{c.get('GCP_DOCKERFILE_MODE')}' (Must be one of {DOCKERFILE_MODES})")
+
+    # 9. Image profile (optional).  The optimized image is built from the multi-stage Dockerfile.
+    if c.get('GCP_IMAGE_PROFILE', 'standard') not in IMAGE_PROFILES:
+        errors.append(f"Invalid GCP_IMAGE_PROFILE: '{c.get('GCP_IMAGE_PROFILE')}' (Must be one of {IMAGE_PROFILES})")
+    elif c.get('GCP_IMAGE_PROFILE', 'standard') == "optimized" and c.get('GCP_DOCKERFILE_MODE', 'standard') != "multistage":
+        errors.append("GCP_IMAGE_PROFILE=optimized requires GCP_DOCKERFILE_MODE=multistage")
+
+    # 10. Cloud Run performance profile and overrides (optional)
+    if c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default') not in RUN_PERFORMANCE_PROFILES:
+        errors.append(f"Invalid GCP_RUN_PERFORMANCE_PROFILE: '{c.get('GCP_RUN_PERFORMANCE_PROFILE')}' (Must be one of {tuple(RUN_PERFORMANCE_PROFILES)})")
+    if c.get('GCP_RUN_CONCURRENCY') and not re.match(r'^([1-9][0-9]{0,2}|1000)$', c['GCP_RUN_CONCURRENCY']):
+        errors.append(f"Invalid GCP_RUN_CONCURRENCY: '{c['GCP_RUN_CONCURRENCY']}' (Must be 1-1000)")
+    for key in ('GCP_RUN_MIN_INSTANCES', 'GCP_RUN_MAX_INSTANCES'):
+        if c.get(key) and not re.match(r'^[0-9]+$', c[key]):
+            errors.append(f"Invalid {key}: '{c[key]}' (Must be an integer >= 0)")
+    if c.get('GCP_RUN_CPU') and not re.match(r'^([0-9]+(\.[0-9]+)?|[0-9]+m)$', c['GCP_RUN_CPU']):
+        errors.append(f"Invalid GCP_RUN_CPU: '{c['GCP_RUN_CPU']}' (e.g. 1, 2, 4 or 500m)")
+    if c.get('GCP_RUN_MEMORY') and not re.match(r'^[0-9]+(Mi|Gi)$', c['GCP_RUN_MEMORY']):
+        errors.append(f"Invalid GCP_RUN_MEMORY: '{c['GCP_RUN_MEMORY']}' (e.g. 512Mi or 2Gi)")
+    if not errors and c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default') in RUN_PERFORMANCE_PROFILES:
+        flags = RUN_PERFORMANCE_PROFILES[c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default')]
+        min_instances = int(c.get('GCP_RUN_MIN_INSTANCES') or flags.get("min-instances", 0))
+        max_instances = int(c.get('GCP_RUN_MAX_INSTANCES') or flags.get("max-instances", 100))
+        if min_instances > max_instances:
+            errors.append(f"GCP_RUN_MIN_INSTANCES ({min_instances}) is greater than the max instances ({max_instances})")
+
+    # 11. Import-time regression gate (optional):  'off' or the allowed increase in percent
+    if not re.match(r'^(off|[0-9]+(\.[0-9]+)?)$', c.get('GCP_IMPORT_TIME_THRESHOLD', 'off')):
+        errors.append(f"Invalid GCP_IMPORT_TIME_THRESHOLD: '{c.get('GCP_IMPORT_TIME_THRESHOLD')}' (Must be 'off' or a percentage, e.g. 20)")
+
     if errors:
         print("\n!!! VALIDATION FAILED !!!")
         for err in errors:
@@ -191,7 +710,126 @@ def load_constants(filepath):
     return constants
 
 
-def generate_files():
+# ----------------------------------------------------------------------
+# Incremental generation
+#
+# The manifest records the hash of each input (gcp_constants.txt, /src/.env, pip_install.txt, the version of
+# PYTHON_FILENAME and this script) and of each output file as written.  On the next run:
+# - Nothing is rendered or written if no input changed and every output still has the hash it was written with.
+# - Otherwise all outputs are rendered in memory, and only those whose content changed are written
+#   (the others keep their modification time, so caches keyed on it are kept).
+# - An output edited by hand since it was generated is reported, and overwritten.
+# python gcp_generator.py --check   writes nothing, reports what would change and exits with 1 if anything would.
+
+PATH_FILE_MANIFEST = PATH_GCP / "gcp_generator_manifest.json"
+
+
+def get_output_bytes(content: str) -> bytes:
+    """The bytes written for 'content':  UTF-8 with the line endings of this OS (as open(..., "w") would write)."""
+    return content.replace("\n", os.linesep).encode("utf-8")
+
+
+def get_hash(content) -> str:
+    """SHA-256 of the bytes written for a str (see get_output_bytes()), or of bytes."""
+    if isinstance(content, str): content = get_output_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_file_hash(path_file: Path) -> str:
+    """SHA-256 of the file contents, or None if the file does not exist."""
+    return get_hash(path_file.read_bytes()) if path_file.is_file() else None
+
+
+def load_manifest() -> dict:
+    if not PATH_FILE_MANIFEST.is_file(): return {"inputs": {}, "outputs": {}}
+    try:
+        with open(PATH_FILE_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"WARNING: ignoring unreadable {PATH_FILE_MANIFEST.name}: {e}")
+        return {"inputs": {}, "outputs": {}}
+
+
+def get_output_name(path_file: Path) -> str:
+    """Output file name relative to the project root, as stored in the manifest."""
+    return path_file.relative_to(PATH_BASE).as_posix()
+
+
+def outputs_unchanged(manifest: dict, inputs: dict) -> bool:
+    """True if the inputs are those of the manifest and every output file still has the hash it was written with."""
+    if manifest.get("inputs") != inputs or not manifest.get("outputs"): return False
+    return all(get_file_hash(PATH_BASE / name) == h for name, h in manifest["outputs"].items())
+
+
+def publish_outputs(outputs: dict, inputs: dict, manifest: dict, check: bool = False) -> list:
+    """
+    Writes the files in 'outputs' {Path: content} whose content differs from the file on disk, then the manifest.
+    With 'check', nothing is written.  Returns the names of the outputs that were (or would be) written.
+    """
+    changed = []
+    for path_file, content in outputs.items():
+        name = get_output_name(path_file)
+        on_disk = get_file_hash(path_file)
+        new = get_hash(content)
+        if on_disk == new:
+            continue
+        recorded = manifest.get("outputs", {}).get(name)
+        if on_disk is None:
+            reason = "missing"
+        elif recorded is not None and on_disk != recorded:
+            reason = "edited by hand since it was generated"
+        else:
+            reason = "inputs changed"
+        changed.append(name)
+        if check:
+            print(f"  DRIFT {name} ({reason})")
+            continue
+        if reason.startswith("edited"): print(f"WARNING: {name} was {reason}, overwriting it")
+        path_file.write_bytes(get_output_bytes(content))
+        print(f"✓ Wrote {name}")
+
+    if not check:
+        manifest = {"generator_version": __version__, "inputs": inputs,
+                    "outputs": {get_output_name(path_file): get_hash(content) for path_file, content in outputs.items()}}
+        with open(PATH_FILE_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    return changed
+
+
+def import_time_gate(c: dict, check: bool = False, update_baseline: bool = False) -> bool:
+    """
+    Import-time regression gate (GCP_IMPORT_TIME_THRESHOLD, see gcp_import_time.py).  Measures the import time
+    of PYTHON_FILENAME and returns False if it regressed beyond the threshold, or if the script cannot be
+    imported.  Returns True if the gate is off (and 'update_baseline' is not set).  'update_baseline' saves the
+    measurement as the new baseline.  With 'check' no baseline is written.
+    An invalid threshold or a missing PYTHON_FILENAME is left to validate_constants() / generate_files().
+    """
+    import_time_threshold = c.get('GCP_IMPORT_TIME_THRESHOLD', 'off')
+    if import_time_threshold == "off" and not update_baseline: return True
+    if not re.match(r'^(off|[0-9]+(\.[0-9]+)?)$', import_time_threshold): return True
+    if not (PATH_SRC / c.get('PYTHON_FILENAME', '')).is_file(): return True
+
+    threshold_pct = float(import_time_threshold) if import_time_threshold != "off" else 0.0
+    try:
+        import_time_ok = check_import_time(c['PYTHON_FILENAME'], threshold_pct, update_baseline=update_baseline and not check,
+                                           save_baseline=not check, path_src=PATH_SRC)
+    except Exception as e:
+        print(f"\n!!! IMPORT TIME CHECK FAILED !!!\n{e}")
+        print("Install the packages in pip_install.txt into the venv, or run with --skip-import-check")
+        return False
+    if not import_time_ok and not check: print("No files were generated.")
+    return import_time_ok
+
+
+def generate_files(check: bool = False, force: bool = False, skip_import_check: bool = False, update_import_baseline: bool = False) -> bool:
+    """
+    Generates the Dockerfile, main.tf, cloudbuild.yaml, requirements.txt, gcp_bootstrap.py and the .bat files from gcp_constants.txt.
+    Only the files whose content changed are written (see Incremental generation above).  'force' renders
+    them even if the manifest says nothing changed.  With 'check', nothing is written:  returns False if 
+    any output is out of date.
+    If GCP_IMPORT_TIME_THRESHOLD is set, nothing is written (and 'check' fails) when the import time of
+    PYTHON_FILENAME regressed, unless 'skip_import_check'.  See import_time_gate().
+    """
     # Make sure required files exist
     path_file_gcp_constants = PATH_GCP.joinpath("gcp_constants.txt")
     if not path_file_gcp_constants.is_file(): raise Exception(f"File not found: {path_file_gcp_constants}")
@@ -224,24 +862,52 @@ def generate_files():
 
     # Consider the need to delete an existing terraform.tfstate in PATH_BASE if it exists.
 
+    # Read the constants before requirements.txt is published (some options add requirements).
+    c = load_constants(path_file_gcp_constants)
+    if not c: return False
+
+    # Before the manifest short-circuit:  the inputs only hash the version of PYTHON_FILENAME, so a new
+    # (heavy) import in /src or an updated package in the venv changes none of them.
+    if not skip_import_check and not import_time_gate(c, check=check, update_baseline=update_import_baseline):
+        return False
+
+    # Hashes of everything the outputs are generated from
+    inputs = {
+        "gcp_constants.txt": get_file_hash(path_file_gcp_constants),
+        ".env": get_file_hash(path_file_env),
+        "pip_install.txt": get_file_hash(path_file_pip_install),
+        "PYTHON_FILENAME version": get_app_version(PATH_SRC / c.get('PYTHON_FILENAME', '')),
+        "gcp_generator.py": get_file_hash(Path(__file__).resolve()),
+    }
+    manifest = load_manifest()
+    if not force and outputs_unchanged(manifest, inputs):
+        print("✓ No inputs changed since the last generation and the outputs are unchanged.  Nothing to do.")
+        return True
+    if check:
+        changed_inputs = [name for name, h in inputs.items() if manifest.get("inputs", {}).get(name) != h]
+        if changed_inputs: print(f"Inputs changed since the last generation: {', '.join(changed_inputs)}")
+
+    # Path: content of each generated file, written by publish_outputs()
+    outputs = {}
+
     if path_file_pip_install.exists():
         with open(path_file_pip_install, 'r') as src_file:
             requirements_content = src_file.read()
+
+        # Add any packages required by the options in gcp_constants.txt (container only, not the local venv).
+        installed = [line.strip().lower() for line in requirements_content.splitlines()]
+        for pkg in get_extra_requirements(c):
+            if pkg not in installed:
+                requirements_content = requirements_content.rstrip("\n") + f"\n{pkg}\n"
         
         # Write contents from pip_install.txt to the Project Root as requirements.txt (where Docker expects it)
-        with open(PATH_BASE / "requirements.txt", 'w') as dest_file:
-            dest_file.write(requirements_content)
-        print("✓ Successfully published requirements.txt to project root from /gcp/pip_install.txt")
+        outputs[PATH_BASE / "requirements.txt"] = requirements_content
     else:
         print(f"ERROR: {path_file_pip_install} not found. Build will fail.")
 
-
-    c = load_constants(path_file_gcp_constants)
-    if not c: return
-
     # Validate the constants in gcp_constants.txt against Google Cloud requirements. 
     if not validate_constants(c):
-            return
+            return False
 
     # Verify the Python script exists in /src
     path_file_py_script_for_cloud_run = PATH_SRC.joinpath(c['PYTHON_FILENAME'])
@@ -257,12 +923,20 @@ def generate_files():
     path_file_py_script_for_cloud_run = f"src/{c['PYTHON_FILENAME']}"
     path_file_dockerfile = PATH_BASE.joinpath("Dockerfile")
     # Write the Dockerfile
-    if not generate_dockerfile(path_file_dockerfile, path_file_py_script_for_cloud_run):
-        raise Exception(f"ERROR generating the Dockerfile")
+    workers = c.get('GCP_RUN_WORKERS', '1')
+    process_manager = c.get('GCP_RUN_PROCESS_MANAGER', 'uvicorn')
+    runtime_profile = c.get('GCP_RUN_RUNTIME_PROFILE', 'standard')
+    dockerfile_mode = c.get('GCP_DOCKERFILE_MODE', 'standard')
+    image_profile = c.get('GCP_IMAGE_PROFILE', 'standard')
+    print(f"Server workers: {workers}  process manager: {process_manager}  runtime profile: {runtime_profile}  Dockerfile: {dockerfile_mode}  image: {image_profile}")
+    deploy_flags = get_deploy_flags(c)
+    print(f"Cloud Run performance profile: {c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default')}  " +
+          " ".join(line.strip(" \\") for line in deploy_flags.splitlines()))
+    outputs[path_file_dockerfile] = get_dockerfile_content(path_file_py_script_for_cloud_run, workers, process_manager, runtime_profile,
+                                                           dockerfile_mode, c.get('GCP_PYTHON_VERSION', '3.12'), image_profile)
 
     # Generate main.tf (Infrastructure) in project root
-    with open(path_file_terraform, 'w') as f:
-        f.write(f'''# Generated by gcp_generator.py
+    outputs[path_file_terraform] = (f'''# Generated by gcp_generator.py
 provider "google" {{
   project = "{c['GCP_PROJ_ID']}"
   region  = "{c['GCP_REGION']}"
@@ -284,8 +958,7 @@ resource "google_bigquery_dataset" "dataset" {{
     # Generate cloudbuild.yaml (Pipeline) in project root
     # Note the double braces {{ }} to escape the Python f-string
     # Added :${BUILD_ID} to the image name to bypass all registry caching
-    with open(path_file_cloudbuild_yaml, 'w') as f:
-        f.write(f'''# Generated by gcp_generator.py
+    outputs[path_file_cloudbuild_yaml] = (f'''# Generated by gcp_generator.py
 steps:
   # Create the probe file startup_probe.txt used to determine when the FUSE bucket is ready and upload it directly to the bucket
   - name: 'gcr.io/google.com/cloudsdktool/cloud-sdk'
@@ -296,17 +969,9 @@ steps:
         echo "ready" > startup_probe.txt
         gcloud storage cp startup_probe.txt gs://${{_BUCKET}}/startup_probe.txt
 
-  # Build the image with a unique tag
-  # Note that argument '--no-cache' was added to force Docker to ignore caches during the build (so that updates to the Python file in /src will be recognized).
-  - name: 'gcr.io/cloud-builders/docker'
-    args: ['build', '--no-cache', '-t', '${{_REGION}}-docker.pkg.dev/${{PROJECT_ID}}/${{_REPO}}/${{_IMAGE}}:${{BUILD_ID}}', '.']
-
-  # Push the image with a unique tag
-  - name: 'gcr.io/cloud-builders/docker'
-    args: ['push', '${{_REGION}}-docker.pkg.dev/${{PROJECT_ID}}/${{_REPO}}/${{_IMAGE}}:${{BUILD_ID}}']
-
+{get_cloudbuild_build_steps(dockerfile_mode, image_profile)}
   # Deploy to Cloud Run with a unique tag
-  # Arguments for quick startup: --min-instances=1,--concurrency=2,--cpu=1,--memory=1Gi,--no-cpu-throttling
+  # Performance flags from GCP_RUN_PERFORMANCE_PROFILE={c.get('GCP_RUN_PERFORMANCE_PROFILE', 'default')} (see RUN_PERFORMANCE_PROFILES in gcp_generator.py)
   # Argument for full public access:  --allow-unauthenticated
   # Argument for protection behind an API Gateway: --no-allow-unauthenticated
   # BUILD_ID is a built-in substitution variable provided automatically by Google Cloud Build.
@@ -322,9 +987,7 @@ steps:
           --add-volume name=${{_VOL_NAME}},type=cloud-storage,bucket=${{_BUCKET}} \\
           --add-volume-mount mount-path=${{_MOUNT_PATH}},volume=${{_VOL_NAME}} \\
           --service-account ${{_SVC_ACCOUNT}} \\
-          --timeout 300s \\
-          --cpu-boost \\
-          --startup-probe httpGet.port=8080,httpGet.path=/ready,initialDelaySeconds=10,failureThreshold=15,periodSeconds=20,timeoutSeconds=5 \\
+{deploy_flags}          --startup-probe httpGet.port=8080,httpGet.path=/ready,initialDelaySeconds=10,failureThreshold=15,periodSeconds=20,timeoutSeconds=5 \\
           --set-env-vars "MOUNT_PATH=${{_MOUNT_PATH}},DEPLOYED_VERSION={current_version},{env_string}" \\
           --platform managed \\
           --allow-unauthenticated
@@ -348,8 +1011,7 @@ options:
     #bootstrap_name = f"gcp_bootstrap_{ver}.bat"
     bootstrap_name = f"gcp_bootstrap.bat"
     path_file_bootstrap = PATH_GCP.joinpath(bootstrap_name)
-    with open(path_file_bootstrap, 'w') as f:
-        f.write(f'''@echo off
+    outputs[path_file_bootstrap] = (f'''@echo off
 echo Bootstrapping Project: {c['GCP_PROJ_ID']}
 
 rem GCP_PROJ_ID check
@@ -624,15 +1286,12 @@ echo Execute the following batch file to see useful commands:  gcp_show_commands
 echo.
 ''')
 
-    print(f"\nDONE: Generated files for {c['GCP_PROJ_ID']}")
-    print(f"Next steps:")
-    print(f"Open a Windows command prompt / Terminal window and navigate to the folder /gcp")
-    print(f"Run: gcp_bootstrap.bat")
+    # Generate the cross-platform, parallel version of the bootstrap in /gcp (run by gcp_dag.py)
+    outputs[PATH_GCP.joinpath("gcp_bootstrap.py")] = get_bootstrap_py_content(c)
 
     # Generate batch file to show commands with gcp_constants.txt already populated
-    path_file_bootstrap = PATH_GCP.joinpath("gcp_show_commands.bat")
-    with open(path_file_bootstrap, 'w') as f:
-        f.write(f'''@echo off
+    path_file_show_commands = PATH_GCP.joinpath("gcp_show_commands.bat")
+    outputs[path_file_show_commands] = (f'''@echo off
 echo.
 echo GCP_PROJ_ID: {c['GCP_PROJ_ID']}
 echo Cloud Run: {c['GCP_RUN_JOB']}
@@ -670,8 +1329,28 @@ echo gcloud storage cp "%DATA_DIR%\README.txt" gs://%GCP_GS_BUCKET%
 echo.
 ''')
 
+    if check:
+        changed = publish_outputs(outputs, inputs, manifest, check=True)
+        print(f"{len(changed)} of {len(outputs)} generated files out of date" if changed else "✓ All generated files are up to date.")
+        return not changed
+
+    changed = publish_outputs(outputs, inputs, manifest)
+    print(f"{len(changed)} of {len(outputs)} files written, {len(outputs) - len(changed)} unchanged")
+
     print(f"\nDONE: Generated files for {c['GCP_PROJ_ID']}")
+    print(f"Next steps:")
+    print(f"Open a Windows command prompt / Terminal window and navigate to the folder /gcp")
+    print(f"Run: python gcp_bootstrap.py  (parallel, any OS.  --dry-run shows the steps)  or  gcp_bootstrap.bat  (serial)")
+    return True
 
 
 if __name__ == "__main__":
-    generate_files()
+    parser = argparse.ArgumentParser(description="Generate the Dockerfile, main.tf, cloudbuild.yaml, requirements.txt, gcp_bootstrap.py and .bat files from gcp_constants.txt.")
+    parser.add_argument("--check", action="store_true", help="Write nothing.  Report the files that are out of date and exit with 1 if any")
+    parser.add_argument("--force", action="store_true", help="Render all the files even if no input changed (only changed files are written)")
+    parser.add_argument("--skip-import-check", action="store_true", help="Don't run the import-time regression gate (GCP_IMPORT_TIME_THRESHOLD)")
+    parser.add_argument("--update-import-baseline", action="store_true", help="Save the measured import time of PYTHON_FILENAME as the new baseline")
+    args = parser.parse_args()
+    if not generate_files(check=args.check, force=args.force, skip_import_check=args.skip_import_check,
+                          update_import_baseline=args.update_import_baseline):
+        sys.exit(1)
@@ -0,0 +1,196 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.1"
+# v0.0.0    initial release
+# v0.0.1    check_import_time(save_baseline=False) for gcp_generator.py --check.
+
+"""
+Import-time regression gate for the script deployed to Cloud Run (PYTHON_FILENAME in gcp_constants.txt).
+
+Each new Cloud Run instance imports the script before it can serve a request, so the import time is part of
+every cold start.  It grows as packages are added to pip_install.txt, a few hundred milliseconds at a time.
+
+How it is measured:
+- 'python -E -X importtime -c "import MODULE"' in a new interpreter (-E:  PYTHONPATH, PYTHONSTARTUP etc. are
+  ignored), with /src on sys.path, using the interpreter that runs this script (the venv of the project).
+- One warm-up run first (it writes the .pyc files, as the image build does), then IMPORT_TIME_RUNS runs.
+  The median of the runs is reported.
+- total_ms:  the import time of everything imported by the interpreter (site, encodings, ...) and the script.
+- packages:  the 'self' time summed per top-level package (fastapi, pydantic, httpx, ...), i.e. what each
+  dependency costs.  modules:  the IMPORT_TIME_TOP modules with the largest cumulative time.
+
+The gate (check_import_time()):
+- The first measurement is saved as the baseline (gcp_import_time_baseline.json in /gcp).
+- Later measurements are compared with it.  A regression is an increase of more than 'threshold' percent and
+  more than IMPORT_TIME_MIN_MS (smaller changes are noise).  The packages that grew the most are listed.
+- The baseline is not lowered automatically when the import gets faster.  Save a new one with --update-baseline
+  (or 'python gcp_generator.py --update-import-baseline') after an intended change.
+Compare measurements from the same machine only.
+
+gcp_generator.py runs the gate first on every run when GCP_IMPORT_TIME_THRESHOLD (percent) is set in
+gcp_constants.txt:  before it compares the inputs with its manifest (they don't cover every change to /src or
+to the venv) and before it writes any file.  It writes nothing if the import time regressed, and
+'gcp_generator.py --check' fails (without saving a baseline).
+
+Run it directly from the /gcp folder:
+    python gcp_import_time.py rest_api_server.py
+    python gcp_import_time.py rest_api_server.py --threshold 20
+    python gcp_import_time.py rest_api_server.py --update-baseline
+"""
+
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Runs measured after the warm-up run
+IMPORT_TIME_RUNS = 3
+# Increases of the total import time smaller than this are not regressions (ms)
+IMPORT_TIME_MIN_MS = 50.0
+# Modules and packages listed
+IMPORT_TIME_TOP = 15
+
+PATH_SRC = Path(__file__).resolve().parent.parent / "src"
+PATH_FILE_BASELINE = Path(__file__).resolve().parent / "gcp_import_time_baseline.json"
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Parses the output of 'python -X importtime':
+        import time: self [us] | cumulative | imported package
+        import time:       112 |        112 |   _io
+    Returns {"total_us": ..., "modules": {name: cumulative us}, "packages": {top-level package: self us}}.
+    The name is indented by 2 spaces per nesting level.  The total is the sum of the top-level imports.
+    """
+    total_us = 0
+    modules = {}
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        top_level = len(name) - len(name.lstrip()) <= 1
+        name = name.strip()
+        if top_level: total_us += int(cumulative_us)
+        modules[name] = modules.get(name, 0) + int(cumulative_us)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return {"total_us": total_us, "modules": modules, "packages": packages}
+
+
+def measure_import_time(module: str, path_src: Path = PATH_SRC, runs: int = IMPORT_TIME_RUNS, python: str = sys.executable) -> dict:
+    """
+    Returns the median import time of 'module' (see the description at the top) in milliseconds:
+    {"module", "python", "runs", "total_ms", "packages": {package: ms}, "modules": {module: ms}}.
+    Raises an Exception if the module cannot be imported.
+    """
+    cmd = [python, "-E", "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {str(path_src)!r}); import {module}"]
+    samples = []
+    for run in range(runs + 1):
+        r = subprocess.run(cmd, cwd=path_src, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           text=True, errors="replace")
+        if r.returncode != 0:
+            errors = "\n".join(line for line in r.stderr.splitlines() if not line.startswith("import time:"))
+            raise Exception(f"'import {module}' failed (exit code {r.returncode}):\n{errors[-2000:]}")
+        if run > 0: samples.append(parse_importtime(r.stderr))
+
+    def median_ms(key: str, name: str) -> float:
+        return round(statistics.median(s[key].get(name, 0) for s in samples) / 1000, 1)
+
+    packages = {name: median_ms("packages", name) for name in set().union(*(s["packages"] for s in samples))}
+    modules = {name: median_ms("modules", name) for name in set().union(*(s["modules"] for s in samples))}
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "total_ms": round(statistics.median(s["total_us"] for s in samples) / 1000, 1),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+        "modules": dict(sorted(modules.items(), key=lambda item: -item[1])[:IMPORT_TIME_TOP]),
+    }
+
+
+def compare_import_time(current: dict, baseline: dict, threshold_pct: float, min_ms: float = IMPORT_TIME_MIN_MS) -> tuple:
+    """Returns (regressed, report lines):  the change of the total and of the packages that changed the most."""
+    change_ms = current["total_ms"] - baseline["total_ms"]
+    change_pct = 100 * change_ms / baseline["total_ms"] if baseline["total_ms"] else 0.0
+    regressed = change_pct > threshold_pct and change_ms > min_ms
+    lines = [f"Import time {baseline['total_ms']:.1f} ms (baseline) -> {current['total_ms']:.1f} ms  ({change_pct:+.1f}%, limit +{threshold_pct:g}%)"]
+
+    changes = []
+    for name in set(current["packages"]) | set(baseline["packages"]):
+        old, new = baseline["packages"].get(name), current["packages"].get(name)
+        changes.append(((new or 0) - (old or 0), name, old, new))
+    changes.sort(reverse=True)
+    for delta, name, old, new in changes[:IMPORT_TIME_TOP]:
+        if delta < 1.0: break
+        label = "(new)" if old is None else f"{old:.1f} ms ->"
+        lines.append(f"    {name:30s} {label:>12s} {new:8.1f} ms  (+{delta:.1f} ms)")
+    if baseline.get("python") != current["python"]:
+        lines.append(f"    Note: the baseline was measured with Python {baseline.get('python')}, now {current['python']}")
+    return regressed, lines
+
+
+def print_import_time(result: dict):
+    print(f"Import time of '{result['module']}': {result['total_ms']:.1f} ms  (median of {result['runs']} runs, Python {result['python']})")
+    print(f"    {'package (self time)':30s} {'ms':>8s}")
+    for name, ms in list(result["packages"].items())[:IMPORT_TIME_TOP]:
+        print(f"    {name:30s} {ms:8.1f}")
+    print(f"    {'module (cumulative time)':30s} {'ms':>8s}")
+    for name, ms in result["modules"].items():
+        print(f"    {name:30s} {ms:8.1f}")
+
+
+def check_import_time(script_filename: str, threshold_pct: float, update_baseline: bool = False, save_baseline: bool = True,
+                      path_src: Path = PATH_SRC, path_file_baseline: Path = PATH_FILE_BASELINE) -> bool:
+    """
+    Measures the import time of 'script_filename' (e.g. "rest_api_server.py" in /src) and compares it with the
+    baseline.  Saves the measurement as the baseline if there is none (or it is for another script), or if
+    'update_baseline'.  'save_baseline'=False never writes the baseline.
+    Returns False if the import time regressed by more than 'threshold_pct' percent.
+    """
+    module = Path(script_filename).stem
+    current = measure_import_time(module, path_src)
+    print_import_time(current)
+
+    baseline = None
+    if path_file_baseline.is_file():
+        with open(path_file_baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("module") != module: baseline = None
+
+    if baseline is None and not save_baseline:
+        print(f"No import time baseline for '{module}' in {path_file_baseline}.  Nothing to compare.")
+        return True
+    if baseline is None or update_baseline:
+        with open(path_file_baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"✓ Import time baseline saved to {path_file_baseline}")
+        return True
+
+    regressed, lines = compare_import_time(current, baseline, threshold_pct)
+    for line in lines: print(line)
+    if regressed:
+        print(f"\n!!! IMPORT TIME REGRESSION !!!  Cold starts of '{module}' are slower than the baseline by more than {threshold_pct:g}%.")
+        print("Remove or defer (import inside the function that uses it) the packages listed above, or accept the new import time")
+        print("with:  python gcp_generator.py --update-import-baseline")
+        return False
+    print("✓ Import time within the limit of the baseline.")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of a script in /src and compare it with the baseline.")
+    parser.add_argument("script", help="Python file in /src, e.g. rest_api_server.py")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent (default 20)")
+    parser.add_argument("--update-baseline", action="store_true", help="Save this measurement as the baseline")
+    args = parser.parse_args()
+    if not check_import_time(args.script, args.threshold, update_baseline=args.update_baseline):
+        sys.exit(1)
@@ -0,0 +1,312 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.2"
+# v0.0.0    initial release
+# v0.0.1    Non-blocking logging (log_config.py).
+# v0.0.2    pyarrow is imported when the first sink is created, not at import (it is not on the cold start path).
+
+"""
+Request analytics sink for 'rest_api_server.py'.
+
+Streaming one row per request into BigQuery costs an insert API call per request and adds its latency to the request.
+Instead, AnalyticsSink:
+- Records rows in memory.  record_request() / record_upstream() only append a tuple to a list, so nothing
+  on the request path waits on I/O.
+- Flushes each table as a compressed (zstd) Parquet file when it holds 'max_rows' rows or 'flush_interval' seconds
+  after the last flush, whichever comes first.  The Parquet encoding and the file write run in a worker thread.
+- Writes the files to 'path_folder' (the GCS bucket mount by default), partitioned by table and UTC date:
+        {path_folder}/{table}/dt=YYYY-MM-DD/{table}-YYYYMMDDTHHMMSS-{unique id}.parquet
+  The unique id keeps files from different workers and instances from colliding (GCS FUSE does not support
+  concurrent writes to the same object).  Files are written with a '.tmp' suffix and renamed when complete,
+  so a load of '*.parquet' never sees a partial file.
+- Keeps at most 'max_pending_rows' rows per table in memory.  If flushes keep failing, new rows are dropped
+  and counted in stats["dropped"] rather than exhausting the instance memory.
+- Flushes everything still in memory on close() (lifespan shutdown).
+
+Tables (see SCHEMAS):
+    requests        One row per HTTP request served:  ts, method, route, status, duration_ms, pid, revision
+    upstream        One row per savvy_request_get_async() call:  ts, host, status, attempts, duration_ms, error, pid, revision
+
+Loading into BigQuery (batch load jobs are free, unlike streaming inserts):
+    bigquery_load("requests", "gs://BUCKET/analytics", project_id, dataset_id)
+or with the bq CLI (see bq_load_command()):
+    bq load --source_format=PARQUET --hive_partitioning_mode=AUTO --hive_partitioning_source_uri_prefix=gs://BUCKET/analytics/requests
+        DATASET.requests "gs://BUCKET/analytics/requests/*.parquet"
+
+Run this script to write sample rows to a local folder and read them back:
+    python analytics.py
+
+Requires:  pip install pyarrow    (bigquery_load() also requires:  pip install google-cloud-bigquery)
+pyarrow is imported when the first AnalyticsSink is created (it takes a noticeable part of a cold start).
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+from uuid import uuid4
+import asyncio
+import os
+import tempfile
+import time
+
+# ---------------------------------------------------------------------------
+# Configure logging
+
+from log_config import get_logger
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+
+# pyarrow modules, imported by import_pyarrow()
+pa = None
+pq = None
+
+
+def import_pyarrow() -> bool:
+    """Imports pyarrow on first use.  Returns False if it is not installed."""
+    global pa, pq
+    if pa is not None: return True
+    try:
+        # pip install pyarrow
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    pa, pq = pyarrow, pyarrow.parquet
+    return True
+
+
+# ----------------------------------------------------------------------
+# Constants
+
+# Column names and Arrow types of each table.  "ts" is recorded as time.time() and stored as a UTC timestamp.
+SCHEMAS = {
+    "requests": [
+        ("ts", "timestamp"),
+        ("method", "string"),
+        ("route", "string"),
+        ("status", "int32"),
+        ("duration_ms", "float64"),
+        ("pid", "int32"),
+        ("revision", "string"),
+    ],
+    "upstream": [
+        ("ts", "timestamp"),
+        ("host", "string"),
+        ("status", "int32"),
+        ("attempts", "int32"),
+        ("duration_ms", "float64"),
+        ("error", "string"),
+        ("pid", "int32"),
+        ("revision", "string"),
+    ],
+}
+
+# Cloud Run revision (injected by Cloud Run), so rows can be compared across deployments.
+REVISION = os.environ.get("K_REVISION", "local")
+
+
+def _arrow_type(name: str):
+    if name == "timestamp": return pa.timestamp("us", tz="UTC")
+    return getattr(pa, name)()
+
+
+def rows_to_table(table: str, rows: list):
+    """Convert the row tuples of 'table' into a pyarrow.Table (column-wise, no per-row dicts)."""
+    columns = list(zip(*rows)) if rows else [() for _ in SCHEMAS[table]]
+    arrays = []
+    for (name, type_name), values in zip(SCHEMAS[table], columns):
+        if type_name == "timestamp":
+            arrays.append(pa.array([int(t * 1e6) for t in values], pa.int64()).cast(_arrow_type(type_name)))
+        else:
+            arrays.append(pa.array(values, _arrow_type(type_name)))
+    return pa.Table.from_arrays(arrays, names=[name for name, _ in SCHEMAS[table]])
+
+
+class AnalyticsSink:
+    """
+    In-memory buffer of analytics rows flushed as Parquet files.  See the description at the top of this script.
+    """
+
+    def __init__(self, path_folder: Path, max_rows: int = 10000, flush_interval: float = 60.0,
+                 max_pending_rows: int = 100000, compression: str = "zstd"):
+        if not import_pyarrow(): raise Exception("pyarrow is not installed.  pip install pyarrow")
+        self.path_folder = Path(path_folder)
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self.compression = compression
+        self.pid = os.getpid()
+        self._rows = {table: [] for table in SCHEMAS}
+        self._flush_event = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self.stats = {"rows": 0, "dropped": 0, "files": 0, "errors": 0}
+
+    def start(self):
+        """Start the background flusher.  Call from a running event loop (e.g. lifespan)."""
+        self._task = asyncio.create_task(self._flush_loop())
+
+    # ------------------------------------------------------------------
+    # Hot path (no I/O, no awaits)
+
+    def _append(self, table: str, row: tuple):
+        rows = self._rows[table]
+        if len(rows) >= self.max_pending_rows:
+            self.stats["dropped"] += 1
+            return
+        rows.append(row)
+        self.stats["rows"] += 1
+        if len(rows) >= self.max_rows: self._flush_event.set()
+
+    def record_request(self, method: str, route: str, status: int, duration_ms: float):
+        self._append("requests", (time.time(), method, route, status, duration_ms, self.pid, REVISION))
+
+    def record_upstream(self, host: str, status: int, attempts: int, duration_ms: float, error: str = None):
+        self._append("upstream", (time.time(), host, status, attempts, duration_ms, error, self.pid, REVISION))
+
+    # ------------------------------------------------------------------
+    # Flushing
+
+    def _write_parquet(self, table: str, rows: list) -> Path:
+        """Runs in a worker thread.  Returns the path of the file written."""
+        now = datetime.now(timezone.utc)
+        path_dir = self.path_folder / table / f"dt={now:%Y-%m-%d}"
+        path_dir.mkdir(parents=True, exist_ok=True)
+        path_file = path_dir / f"{table}-{now:%Y%m%dT%H%M%S}-{uuid4().hex[:12]}.parquet"
+        path_tmp = path_file.with_suffix(".tmp")
+        pq.write_table(rows_to_table(table, rows), path_tmp, compression=self.compression)
+        os.replace(path_tmp, path_file)
+        return path_file
+
+    async def flush(self):
+        """Write all rows currently in memory (one file per table with rows)."""
+        for table in SCHEMAS:
+            rows = self._rows[table]
+            if not rows: continue
+            # Swap the buffer first so rows recorded during the write go into the next file.
+            self._rows[table] = []
+            try:
+                path_file = await asyncio.to_thread(self._write_parquet, table, rows)
+                self.stats["files"] += 1
+                logger.debug(f"Analytics: {len(rows)} '{table}' rows written to {path_file}")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Analytics: failed to write {len(rows)} '{table}' rows: {repr(e)}")
+                # Put the rows back (oldest first) for the next flush, within max_pending_rows.
+                self._rows[table] = (rows + self._rows[table])[-self.max_pending_rows:]
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def close(self):
+        """Stop the background flusher and write the rows still in memory."""
+        if self._task is not None:
+            # Let a flush in progress finish rather than cancelling it part way.
+            self._closing = True
+            self._flush_event.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info(f"Analytics sink closed. {self.stats}")
+
+
+def get_analytics_sink(kind: str, app_config: dict, max_rows: int = 10000, flush_interval: float = 60.0):
+    """
+    Returns an AnalyticsSink for 'kind', or None if analytics is disabled:
+        "bucket"    {bucket_mount_path}/analytics   (persistent, can be loaded into BigQuery)
+        "tmp"       {path_gcp_tmp}/analytics         (ephemeral, for local runs)
+        "off"       None
+    Returns None (with a warning) if pyarrow is not installed.
+    """
+    if kind == "off": return None
+    if not import_pyarrow():
+        logger.warning("pyarrow is not installed. Request analytics disabled.  pip install pyarrow")
+        return None
+    if kind == "bucket":
+        path_folder = Path(app_config["bucket_mount_path"]) / "analytics"
+    elif kind == "tmp":
+        path_folder = Path(app_config["path_gcp_tmp"]) / "analytics"
+    else:
+        raise Exception(f"Unknown analytics sink '{kind}'. Use 'bucket', 'tmp' or 'off'.")
+    logger.info(f"Analytics sink: {path_folder}  (max_rows {max_rows}, flush_interval {flush_interval} s)")
+    return AnalyticsSink(path_folder, max_rows=max_rows, flush_interval=flush_interval)
+
+
+# ----------------------------------------------------------------------
+# BigQuery
+
+def bq_load_command(table: str, gcs_prefix: str, dataset_id: str, project_id: str = None) -> str:
+    """Returns the bq CLI command that appends all Parquet files of 'table' under 'gcs_prefix' to DATASET.table."""
+    prefix = f"{gcs_prefix.rstrip('/')}/{table}"
+    dataset = f"{project_id}:{dataset_id}" if project_id else dataset_id
+    return (f"bq load --source_format=PARQUET --hive_partitioning_mode=AUTO --hive_partitioning_source_uri_prefix={prefix} "
+            f"{dataset}.{table} \"{prefix}/*.parquet\"")
+
+
+def bigquery_load(table: str, gcs_prefix: str, project_id: str, dataset_id: str, since: str = None) -> int:
+    """
+    Append the Parquet files of 'table' under 'gcs_prefix' (e.g. "gs://BUCKET/analytics") to the BigQuery
+    table 'project_id.dataset_id.table' with a (free) batch load job.  The table is created if needed and
+    'dt' is added as a column from the folder name.
+    'since' (YYYY-MM-DD) loads only one day's partition, e.g. from a daily scheduled job.
+    Returns the number of rows loaded.
+    """
+    # pip install google-cloud-bigquery
+    from google.cloud import bigquery
+
+    prefix = f"{gcs_prefix.rstrip('/')}/{table}"
+    uri = f"{prefix}/dt={since}/*.parquet" if since else f"{prefix}/*.parquet"
+    hive = bigquery.HivePartitioningOptions()
+    hive.mode = "AUTO"
+    hive.source_uri_prefix = prefix
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        hive_partitioning=hive,
+    )
+    client = bigquery.Client(project=project_id)
+    job = client.load_table_from_uri(uri, f"{project_id}.{dataset_id}.{table}", job_config=job_config)
+    job.result()
+    logger.info(f"Loaded {job.output_rows} rows from {uri} into {project_id}.{dataset_id}.{table}")
+    return job.output_rows
+
+
+# ----------------------------------------------------------------------
+# Local test
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = AnalyticsSink(Path(tmp), max_rows=5000, flush_interval=1.0)
+        sink.start()
+        n_rows = 20000
+        t_start = time.perf_counter()
+        for i in range(n_rows):
+            sink.record_request("POST", "/api/calculator", 200, 0.5 + i % 7)
+            if i % 10 == 0: sink.record_upstream("api.example.com", 200 if i % 50 else 503, 1 + (i % 50 == 0), 120.0)
+            if i % 1000 == 0: await asyncio.sleep(0)
+        t_record = time.perf_counter() - t_start
+        await sink.close()
+
+        files = sorted(Path(tmp).rglob("*.parquet"))
+        for table in SCHEMAS:
+            data = pq.read_table(Path(tmp) / table)
+            logger.info(f"{table}: {data.num_rows} rows in {len([f for f in files if f.parent.parent.name == table])} file(s)")
+        logger.info(f"record_*() cost {1e6*t_record/(n_rows*1.1):.2f} us per row.  {sink.stats}")
+        logger.info(f"Total Parquet size {sum(f.stat().st_size for f in files)/1024:.1f} KiB")
+    logger.info(bq_load_command("requests", "gs://BUCKET/analytics", "DATASET"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+#
+#   Generated by generate_client_sdk.py v0.0.1 from the OpenAPI schema of 'Simple REST API Server' v0.0.15.
+#   Do not edit:  regenerate with  python generate_client_sdk.py  (see generate_client_sdk.py).
+
+
+__version__ = "0.0.15"
+
+# Hash of the OpenAPI schema this SDK was generated from (see check_schema())
+SCHEMA_HASH = "e5af99a3753676a0bd7145c2a44ce17b3cd43b0b375a986ff6dc8a40863654d3"
+GENERATOR_VERSION = "0.0.1"
+
+"""
+Typed async client for 'Simple REST API Server'.
+
+    async with ApiClient("http://localhost:8000") as api:                       # or ("https://GATEWAY_HOST", api_key="###")
+        if await api.is_up():
+            reply = await api.calculate(5.5, 10.2)
+            replies = await api.batch(api.calculate, [dict(num1=i, num2=2) for i in range(100)])
+
+Methods:
+    liveness_check               GET   /healthz
+    readiness_check              GET   /readyz
+    startup_probe                GET   /ready
+    debug_startup                GET   /debug/startup
+    read_root                    GET   /
+    calculate                    POST  /api/calculator
+    do_ext_api_call              POST  /api/ext_api_call
+    submit_ext_api_call_job      POST  /api/jobs/ext_api_call
+    submit_ext_api_batch_job     POST  /api/jobs/ext_api_batch
+    get_job                      GET   /api/jobs/{job_id}
+    sse_job_events               GET   /sse/jobs/{job_id}
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypedDict, Union
+from typing import NotRequired
+from importlib.util import find_spec
+import asyncio
+import hashlib
+import json
+# pip install
+import httpx
+
+try:
+    # pip install orjson   (faster encoding and decoding of the JSON payloads)
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# HTTP/2 support in httpx requires the 'h2' package (pip install httpx[http2])
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+_JSON_HEADERS = {"content-type": "application/json"}
+# Default of the optional body fields that have no default in the schema:  the field is not sent.
+_UNSET = object()
+
+
+class ApiError(Exception):
+    """The server replied with a status code other than 2xx.  'body' is the decoded JSON reply, or the text."""
+
+    def __init__(self, status_code: int, body: Any):
+        super().__init__(f"HTTP {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class CalculatorInput(TypedDict):
+    num1: float
+    num2: float
+    operation: NotRequired[str]
+
+
+class ExtApiBatchInput(TypedDict):
+    urls: List[str]
+    concurrency: NotRequired[int]
+
+
+class ExtApiInput(TypedDict):
+    url: str
+
+
+class ValidationError(TypedDict):
+    loc: List[Union[str, int]]
+    msg: str
+    type: str
+    input: NotRequired[Any]
+    ctx: NotRequired[Dict[str, Any]]
+
+
+class HTTPValidationError(TypedDict):
+    detail: NotRequired[List[ValidationError]]
+
+
+class JobAccepted(TypedDict):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class ApiClient:
+    """
+    Async client for 'Simple REST API Server'.  One shared httpx.AsyncClient (connection pool) for all the methods.
+    'api_key' is sent as ?key= (API Gateway).  Pass 'client' to use an existing httpx.AsyncClient.
+    """
+
+    def __init__(self, base_url: str, api_key: str = None, concurrency: int = 32, timeout: float = 60.0, http2: bool = True,
+                 client: httpx.AsyncClient = None):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self._own_client = client is None
+        if client is None:
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            client = httpx.AsyncClient(base_url=self.base_url, http2=http2 and HTTP2_AVAILABLE, timeout=timeout, limits=limits,
+                                       params={"key": api_key} if api_key else None, follow_redirects=True)
+        self.client = client
+        self._schema_ok = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._own_client: await self.client.aclose()
+
+    async def _request(self, method: str, url: str, body: Any = None, params: dict = None, headers: dict = None) -> Any:
+        if params: params = {k: v for k, v in params.items() if v is not None}
+        if body is not None:
+            response = await self.client.request(method, url, content=_dumps(body), params=params, headers={**_JSON_HEADERS, **(headers or {})})
+        else:
+            response = await self.client.request(method, url, params=params, headers=headers)
+        if response.is_success:
+            return _loads(response.content) if response.content else None
+        try:
+            detail = _loads(response.content)
+        except ValueError:
+            detail = response.text
+        raise ApiError(response.status_code, detail)
+
+    async def _stream_events(self, method: str, url: str, params: dict = None, headers: dict = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the events of a Server-Sent Events response."""
+        async with self.client.stream(method, url, params=params, headers=headers, timeout=None) as response:
+            if not response.is_success:
+                await response.aread()
+                raise ApiError(response.status_code, response.text)
+            event = {}
+            async for line in response.aiter_lines():
+                if not line:
+                    if "data" in event: yield event
+                    event = {}
+                elif line.startswith(":"):
+                    continue            # comment (heartbeat)
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "data": event["data"] = _loads(value) if value[:1] in "{[\"" else value
+                    elif field in ("event", "id"): event[field] = value
+
+    async def batch(self, method: Callable[..., Awaitable], items: Iterable, concurrency: int = None, return_exceptions: bool = True) -> list:
+        """
+        Calls 'method' (e.g. api.calculate) once for each item of 'items' (a dict of keyword arguments, or a tuple of
+        positional arguments) with at most 'concurrency' (default: the client's) calls in flight.
+        Returns the results in the order of 'items'.  A failed call is returned as its exception
+        (e.g. ApiError), or raised if 'return_exceptions' is False.
+        """
+        slots = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def call(item):
+            async with slots:
+                return await (method(**item) if isinstance(item, dict) else method(*item))
+
+        return await asyncio.gather(*(call(item) for item in items), return_exceptions=return_exceptions)
+
+    async def is_up(self) -> bool:
+        """True if the server answers /healthz."""
+        try:
+            await self._request("GET", "/healthz")
+            return True
+        except (httpx.HTTPError, ApiError):
+            return False
+
+    async def check_schema(self) -> bool:
+        """
+        True if the server's OpenAPI schema is the one this SDK was generated from (SCHEMA_HASH:  the "paths"
+        and "components", not the server version).
+        The schema is downloaded once per client, later calls return the cached result.
+        """
+        if self._schema_ok is None:
+            schema = await self._request("GET", "/openapi.json")
+            api = {"paths": schema.get("paths", {}), "components": schema.get("components", {})}
+            schema_hash = hashlib.sha256(json.dumps(api, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+            self._schema_ok = schema_hash == SCHEMA_HASH
+        return self._schema_ok
+
+    # ------------------------------------------------------------------
+    # Endpoints
+
+    async def liveness_check(self) -> Any:
+        """GET /healthz
+
+        This is a simple liveness probe for the Google Cloud Load Balancer. It should be as fast as possible."""
+        return await self._request("GET", "/healthz")
+
+    async def readiness_check(self) -> Any:
+        """GET /readyz
+
+        Checks if the environment and storage are fully ready."""
+        return await self._request("GET", "/readyz")
+
+    async def startup_probe(self) -> Any:
+        """GET /ready
+
+        Cloud Run Startup Probe: Checks FUSE readiness."""
+        return await self._request("GET", "/ready")
+
+    async def debug_startup(self) -> Dict[str, Any]:
+        """GET /debug/startup
+
+        Startup report for this worker process: version, pid, runtime profile (requested vs. active
+        event loop and HTTP parser) and the time taken from import to the end of lifespan startup."""
+        return await self._request("GET", "/debug/startup")
+
+    async def read_root(self) -> Dict[str, Any]:
+        """GET /
+
+        This is for users and developers. It provides a friendly "Hello World," a status summary, and links to documentation like Swagger UI."""
+        return await self._request("GET", "/")
+
+    async def calculate(self, num1: float, num2: float, operation: str = "add") -> Any:
+        """POST /api/calculator
+
+        RESTful endpoint for the simple calculator."""
+        body = {"num1": num1, "num2": num2, "operation": operation}
+        return await self._request("POST", "/api/calculator", body=body)
+
+    async def do_ext_api_call(self, url: str) -> Dict[str, Any]:
+        """POST /api/ext_api_call
+
+        Simulate a simple external API call"""
+        body = {"url": url}
+        return await self._request("POST", "/api/ext_api_call", body=body)
+
+    async def submit_ext_api_call_job(self, url: str) -> JobAccepted:
+        """POST /api/jobs/ext_api_call
+
+        Asynchronous version of /api/ext_api_call.  Returns a job ID immediately.
+        Get the result from /api/jobs/{job_id}."""
+        body = {"url": url}
+        return await self._request("POST", "/api/jobs/ext_api_call", body=body)
+
+    async def submit_ext_api_batch_job(self, urls: List[str], concurrency: int = 8) -> JobAccepted:
+        """POST /api/jobs/ext_api_batch
+
+        Fan-out job: fetch many URLs concurrently.  Returns a job ID immediately.
+        Stream progress and partial results from /sse/jobs/{job_id}, or get the summary from /api/jobs/{job_id}."""
+        body = {"urls": urls, "concurrency": concurrency}
+        return await self._request("POST", "/api/jobs/ext_api_batch", body=body)
+
+    async def get_job(self, job_id: str, wait: float = 0.0) -> Dict[str, Any]:
+        """GET /api/jobs/{job_id}
+
+        Returns the job status, and the result once status is "done".
+        Pass 'wait' (seconds, max 10) to long-poll: the response is sent as soon as the job finishes or 'wait' elapses."""
+        params = {"wait": wait}
+        return await self._request("GET", f"/api/jobs/{job_id}", params=params)
+
+    async def sse_job_events(self, job_id: str, last_event_id: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """GET /sse/jobs/{job_id}
+
+        Server-Sent Events stream of a job's status, progress and partial results.
+        Reconnect with the Last-Event-ID header to resume after the last event received.
+
+        Yields the Server-Sent Events as {"event": ..., "id": ..., "data": ...} (data decoded from JSON)."""
+        headers = {"last-event-id": str(last_event_id)}
+        async for event in self._stream_events("GET", f"/sse/jobs/{job_id}", headers=headers):
+            yield event
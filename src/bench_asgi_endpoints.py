@@ -0,0 +1,243 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.0"
+# v0.0.0    initial release
+
+"""
+In-process micro-benchmark of the 'rest_api_server.py' endpoints (no network, no HTTP parser, no client).
+
+The app is imported and its lifespan is run against a temporary folder (with 'startup_probe.txt') standing in for
+the GCS FUSE mount (MOUNT_PATH).  Each request is then sent by calling the ASGI app directly with a prepared
+scope, so the time measured is the server side cost of a request:  the middleware stack, routing, request body
+JSON decoding and Pydantic validation, the endpoint, and response serialization.
+
+Cases (see get_cases()):
+    GET  /healthz, /readyz, /debug/startup, /openapi.json
+    GET  /ready                     probe already confirmed (the normal path), and with the full FUSE check each time
+    POST /api/calculator            request sizes ~60 B, 1 KB, 10 KB, 100 KB (the 'operation' string is echoed in
+                                    the reply message, so the response grows with the request)
+    POST /api/calculator invalid    validation error (422) path
+
+Stability (to catch regressions of a few percent):
+- The number of iterations per round is calibrated so each round takes about ROUND_SECONDS.
+- ROUNDS rounds are run, interleaving the cases, so slow drift (CPU frequency, other processes) affects all cases alike.
+- The reported time is the median of the per-round means, and 'spread' is the interquartile range of the
+  rounds relative to the median (a measure of the noise that ignores the occasional disturbed round).
+- The garbage collector is disabled during each round (and run between rounds).
+Run on an idle machine and compare results from the same machine only.
+
+Run from the /src folder:
+    python bench_asgi_endpoints.py --save baseline.json
+    (change the code)
+    python bench_asgi_endpoints.py --baseline baseline.json --threshold 3
+The second run exits with code 1 if any case is slower than the baseline by more than 'threshold' percent
+(and by more than its own spread), so it can be used as a CI step.
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+# ----------------------------------------------------------------------
+# Environment for the server (must be set before it is imported)
+
+PATH_MOUNT = Path(tempfile.mkdtemp(prefix="bench_mount_"))
+PATH_MOUNT.joinpath("startup_probe.txt").write_text("ready")
+os.environ["MOUNT_PATH"] = str(PATH_MOUNT)
+os.environ["K_SERVICE"] = "bench"
+# Keep request logging out of the measurement unless asked for.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FORMAT", "text")
+
+import rest_api_server
+from rest_api_server import app
+
+from log_config import get_logger
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+logger.setLevel("INFO")
+
+logger.info(f"'{Path(__file__).stem}.py' v{__version__}")
+
+# ----------------------------------------------------------------------
+# Constants
+
+ROUNDS = 9
+ROUND_SECONDS = 0.25
+CALCULATOR_SIZES = (0, 1_000, 10_000, 100_000)
+
+
+def get_cases() -> dict:
+    """name: (method, path, body bytes, setup function or None, expected status)"""
+    cases = {
+        "GET /healthz": ("GET", "/healthz", b"", None, 200),
+        "GET /readyz": ("GET", "/readyz", b"", None, 200),
+        "GET /ready (confirmed)": ("GET", "/ready", b"", None, 200),
+        "GET /ready (full check)": ("GET", "/ready", b"", reset_probe, 200),
+        "GET /debug/startup": ("GET", "/debug/startup", b"", None, 200),
+        "GET /openapi.json": ("GET", "/openapi.json", b"", None, 200),
+    }
+    for size in CALCULATOR_SIZES:
+        body = json.dumps({"num1": 5.5, "num2": 10.2, "operation": "add" if size == 0 else "x" * size}).encode()
+        cases[f"POST /api/calculator {len(body):>6d} B"] = ("POST", "/api/calculator", body, None, 200)
+    cases["POST /api/calculator invalid"] = ("POST", "/api/calculator", b'{"num1": "five"}', None, 422)
+    return cases
+
+
+def reset_probe():
+    app.state.probe_succeeded = False
+
+
+class AsgiCall:
+    """
+    One prepared ASGI request.  call() runs it through the app and returns the response status.
+    Equivalent to what uvicorn hands the app after parsing the HTTP request.
+    """
+
+    def __init__(self, method: str, path: str, body: bytes):
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": ("127.0.0.1", 8080),
+            "state": {},
+        }
+        self.message = {"type": "http.request", "body": body, "more_body": False}
+        self.status = None
+
+    async def receive(self):
+        return self.message
+
+    async def send(self, message):
+        if message["type"] == "http.response.start": self.status = message["status"]
+
+    async def call(self) -> int:
+        # The app adds keys (route, endpoint, ...) to the scope, so each call gets a fresh copy.
+        await app(dict(self.scope), self.receive, self.send)
+        return self.status
+
+
+async def time_round(call: AsgiCall, setup, iterations: int) -> float:
+    """Returns the mean seconds per request over 'iterations' requests."""
+    gc.collect()
+    gc.disable()
+    try:
+        t_start = perf_counter()
+        if setup is None:
+            for _ in range(iterations): await call.call()
+        else:
+            for _ in range(iterations):
+                setup()
+                await call.call()
+        return (perf_counter() - t_start) / iterations
+    finally:
+        gc.enable()
+
+
+async def run_benchmark(rounds: int = ROUNDS, round_seconds: float = ROUND_SECONDS, only: str = None) -> dict:
+    """Returns {case: {"us": median microseconds per request, "spread_pct": ..., "iterations": ...}}."""
+    cases = {name: case for name, case in get_cases().items() if only is None or only in name}
+    results = {}
+    async with rest_api_server.lifespan(app):
+        prepared = {}
+        for name, (method, path, body, setup, expected) in cases.items():
+            call = AsgiCall(method, path, body)
+            if setup: setup()
+            status = await call.call()
+            if status != expected: raise Exception(f"{name}: status {status}, expected {expected}")
+            # Warm up and calibrate the iterations per round
+            per_request = await time_round(call, setup, 50)
+            prepared[name] = (call, setup, max(int(round_seconds / per_request), 20))
+
+        samples = {name: [] for name in prepared}
+        for r in range(rounds):
+            for name, (call, setup, iterations) in prepared.items():
+                samples[name].append(await time_round(call, setup, iterations))
+            logger.info(f"Round {r + 1}/{rounds} done")
+
+        for name, times in samples.items():
+            median = statistics.median(times)
+            q1, _, q3 = statistics.quantiles(times, n=4)
+            results[name] = {
+                "us": round(1e6 * median, 3),
+                "spread_pct": round(100 * (q3 - q1) / median, 2),
+                "iterations": prepared[name][2],
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold_pct: float) -> list:
+    """Logs the change from 'baseline' per case.  Returns the names of the cases that regressed."""
+    regressions = []
+    logger.info(f"{'case':34s} {'baseline us':>12s} {'now us':>10s} {'change':>8s}")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None: continue
+        change = 100 * (r["us"] - old["us"]) / old["us"]
+        # A change smaller than the noise of either run is not reported as a regression.
+        noise = max(r["spread_pct"], old["spread_pct"])
+        regressed = change > threshold_pct and change > noise
+        if regressed: regressions.append(name)
+        logger.info(f"{name:34s} {old['us']:12.1f} {r['us']:10.1f} {change:+7.1f}% {'REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process ASGI micro-benchmark of the rest_api_server.py endpoints.")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--round-seconds", type=float, default=ROUND_SECONDS)
+    parser.add_argument("--only", default=None, help="Only run the cases whose name contains this text")
+    parser.add_argument("--save", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=3.0, help="Regression threshold in percent (default 3)")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run_benchmark(args.rounds, args.round_seconds, args.only))
+    finally:
+        shutil.rmtree(PATH_MOUNT, ignore_errors=True)
+
+    logger.info(f"{'case':34s} {'us/request':>11s} {'spread':>8s}")
+    for name, r in results.items():
+        logger.info(f"{name:34s} {r['us']:11.1f} {r['spread_pct']:7.1f}%")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"version": rest_api_server.__version__, "python": sys.version.split()[0], "results": results}, f, indent=2)
+        logger.info(f"Results written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold}%: {regressions}")
+            sys.exit(1)
+        logger.info(f"No regressions beyond {args.threshold}%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.2"
+# v0.0.0    initial release
+# v0.0.1    Moved the server start / stop into local_server() for reuse by other benchmarks.
+# v0.0.2    Non-blocking logging (log_config.py).
+
+"""
+Throughput benchmark of the runtime profiles (event loop + HTTP parser) for 'rest_api_server.py'.
+
+For each runtime profile ("standard" = asyncio + h11, "performance" = uvloop + httptools) this script:
+    1) Starts 'rest_api_server.py' with uvicorn in a subprocess on a local port, using a temporary
+       folder with a 'startup_probe.txt' file in place of the GCS FUSE mount (MOUNT_PATH).  See local_server().
+    2) Reads /debug/startup to confirm which event loop and HTTP parser are actually in use.
+    3) Sends REQUESTS requests with CONCURRENCY concurrent connections to each endpoint in ENDPOINTS
+       and reports the requests per second.
+
+Run from the /src folder:
+    python bench_runtime_profile.py
+
+The "performance" profile requires:  pip install uvloop httptools  (uvloop is not available on Windows).
+The client runs in this process, so absolute numbers are limited by the client. Compare the profiles relative to each other.
+"""
+
+from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+# pip install
+import httpx
+
+# ---------------------------------------------------------------------------
+# Configure logging
+
+# log_config writes through a queue to a background thread, so logging never blocks the event loop.
+# JSON with "severity" on Cloud Run, [LEVEL] message locally.  See log_config.py for LOG_LEVEL, LOG_FORMAT and LOG_RATE_LIMIT.
+from log_config import get_logger
+
+# Use a named logger
+logger = get_logger(Path(__file__).stem)
+
+logger.info(f"'{Path(__file__).stem}.py' v{__version__}")
+
+# ----------------------------------------------------------------------
+# Constants
+
+PATH_SRC = Path(__file__).resolve().parent
+
+PORT = 8765
+REQUESTS = 5000
+CONCURRENCY = 32
+
+# (method, path, json payload)
+ENDPOINTS = [
+    ("GET", "/healthz", None),
+    ("POST", "/api/calculator", {"num1": 5.5, "num2": 10.2, "operation": "add"}),
+]
+
+# uvicorn command line options for each runtime profile (must match gcp_generator.get_server_cmd())
+PROFILES = {
+    "standard": ["--loop", "asyncio", "--http", "h11"],
+    "performance": ["--loop", "auto", "--http", "auto"],
+}
+
+
+async def wait_until_up(client: httpx.AsyncClient, base_url: str, timeout: float = 20.0) -> dict:
+    """Polls /debug/startup until the server answers.  Returns the startup report."""
+    t_start = perf_counter()
+    while perf_counter() - t_start < timeout:
+        try:
+            response = await client.get(f"{base_url}/debug/startup")
+            if response.status_code == 200: return response.json()
+        except httpx.RequestError:
+            pass
+        await asyncio.sleep(0.2)
+    raise Exception(f"Server did not start within {timeout} s at {base_url}")
+
+
+async def measure_endpoint(client: httpx.AsyncClient, base_url: str, method: str, path: str, payload: dict) -> float:
+    """Sends REQUESTS requests with CONCURRENCY workers.  Returns requests per second."""
+    remaining = REQUESTS
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            response = await client.request(method, f"{base_url}{path}", json=payload)
+            if response.status_code != 200: errors += 1
+
+    t_start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = perf_counter() - t_start
+    if errors: logger.warning(f"{errors} error response(s) from {path}")
+    return REQUESTS / elapsed
+
+
+@asynccontextmanager
+async def local_server(profile: str = "performance", port: int = PORT):
+    """
+    Async context manager that runs 'rest_api_server.py' under uvicorn in a subprocess with the runtime
+    profile 'profile', using a temporary folder (with 'startup_probe.txt') as MOUNT_PATH.
+    Yields (base_url, startup report from /debug/startup).  The server is stopped on exit.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path_mount = Path(tmp)
+        path_mount.joinpath("startup_probe.txt").write_text("ready")
+        env = dict(os.environ, MOUNT_PATH=str(path_mount), K_SERVICE="bench", RUNTIME_PROFILE=profile)
+        cmd = [sys.executable, "-m", "uvicorn", "rest_api_server:app", "--port", str(port), "--log-level", "warning"] + PROFILES[profile]
+        proc = subprocess.Popen(cmd, cwd=PATH_SRC, env=env, stdout=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            async with httpx.AsyncClient() as client:
+                report = await wait_until_up(client, base_url)
+            yield base_url, report
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+async def bench_profile(profile: str) -> dict:
+    """Starts the server with the runtime profile 'profile' and measures each endpoint."""
+    results = {}
+    async with local_server(profile) as (base_url, report):
+        logger.info(f"{profile}: active runtime {report['runtime_active']}")
+        limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+        async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+            # Warm up
+            await measure_endpoint(client, base_url, "GET", "/healthz", None)
+            for method, path, payload in ENDPOINTS:
+                results[path] = await measure_endpoint(client, base_url, method, path, payload)
+                logger.info(f"{profile:12s} {method:4s} {path:20s} {results[path]:8.0f} req/s")
+    return results
+
+
+async def main():
+    all_results = {}
+    for profile in PROFILES:
+        all_results[profile] = await bench_profile(profile)
+
+    logger.info("-" * 60)
+    for method, path, payload in ENDPOINTS:
+        standard = all_results["standard"][path]
+        performance = all_results["performance"][path]
+        logger.info(f"{path:20s} standard {standard:8.0f} req/s  performance {performance:8.0f} req/s  ({performance/standard:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
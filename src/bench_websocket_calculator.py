@@ -0,0 +1,123 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.1"
+# v0.0.0    initial release
+# v0.0.1    Non-blocking logging (log_config.py).
+
+"""
+Throughput comparison of the calculator over REST (/api/calculator) and over WebSocket (/ws/calculator).
+
+Starts 'rest_api_server.py' locally (see bench_runtime_profile.local_server()) and sends REQUESTS calculator
+requests with each method:
+    REST                one POST per request, CONCURRENCY concurrent connections.
+    WebSocket           one connection, one request per frame, up to WINDOW frames in flight (pipelining).
+    WebSocket batch     one connection, BATCH requests per frame, up to WINDOW frames in flight.
+
+Run from the /src folder:
+    python bench_websocket_calculator.py
+
+Requires:  pip install websockets
+"""
+
+from pathlib import Path
+import asyncio
+import json
+from time import perf_counter
+# pip install
+import httpx
+import websockets
+
+from bench_runtime_profile import local_server, CONCURRENCY
+
+# ---------------------------------------------------------------------------
+# Configure logging
+
+# log_config writes through a queue to a background thread, so logging never blocks the event loop.
+# JSON with "severity" on Cloud Run, [LEVEL] message locally.  See log_config.py for LOG_LEVEL, LOG_FORMAT and LOG_RATE_LIMIT.
+from log_config import get_logger
+
+# Use a named logger
+logger = get_logger(Path(__file__).stem)
+
+logger.info(f"'{Path(__file__).stem}.py' v{__version__}")
+
+# ----------------------------------------------------------------------
+# Constants
+
+REQUESTS = 5000
+# Maximum frames sent but not yet answered (client side flow control window)
+WINDOW = 64
+# Requests per frame for the batched WebSocket test
+BATCH = 50
+
+
+async def bench_rest(base_url: str) -> float:
+    """REQUESTS POSTs to /api/calculator with CONCURRENCY workers.  Returns requests per second."""
+    remaining = REQUESTS
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.post(f"{base_url}/api/calculator", json={"num1": remaining, "num2": 1.5})
+                response.raise_for_status()
+
+        t_start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+        return REQUESTS / (perf_counter() - t_start)
+
+
+async def bench_websocket(base_url: str, batch: int = 1) -> float:
+    """
+    REQUESTS calculator requests over one WebSocket, 'batch' requests per frame, pipelined with up to
+    WINDOW frames outstanding.  Verifies every reply id.  Returns requests per second.
+    """
+    ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://") + "/ws/calculator"
+    window = asyncio.Semaphore(WINDOW)
+    n_frames = -(-REQUESTS // batch)
+
+    async with websockets.connect(ws_url, max_size=None) as ws:
+
+        async def sender():
+            for f in range(n_frames):
+                ids = range(f * batch, min((f + 1) * batch, REQUESTS))
+                items = [{"id": i, "num1": i, "num2": 1.5} for i in ids]
+                await window.acquire()
+                await ws.send(json.dumps(items if batch > 1 else items[0]))
+
+        async def receiver():
+            expected_id = 0
+            for _ in range(n_frames):
+                reply = json.loads(await ws.recv())
+                window.release()
+                for item in (reply if isinstance(reply, list) else [reply]):
+                    # Replies arrive in request order
+                    if item["id"] != expected_id: raise Exception(f"Reply id {item['id']} != {expected_id}")
+                    expected_id += 1
+
+        t_start = perf_counter()
+        await asyncio.gather(sender(), receiver())
+        return REQUESTS / (perf_counter() - t_start)
+
+
+async def main():
+    async with local_server() as (base_url, report):
+        logger.info(f"Server runtime {report['runtime_active']}")
+        rest = await bench_rest(base_url)
+        logger.info(f"REST            {rest:10.0f} req/s  ({CONCURRENCY} connections)")
+        ws = await bench_websocket(base_url)
+        logger.info(f"WebSocket       {ws:10.0f} req/s  (1 connection, window {WINDOW})  {ws/rest:.1f}x REST")
+        ws_batch = await bench_websocket(base_url, batch=BATCH)
+        logger.info(f"WebSocket batch {ws_batch:10.0f} req/s  ({BATCH} per frame)  {ws_batch/rest:.1f}x REST")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,13 +7,14 @@
 
 # Define the script version in terms of Semantic Versioning (SemVer)
 # when Git or other versioning systems are not employed.
-__version__ = "0.0.1"
+__version__ = "0.0.2"
 from pathlib import Path
 print("'" + Path(__file__).stem + ".py'  v" + __version__)
 
 # v0.0.0    initial release
 # v0.0.1    Added endpoings / and /api/calculator
 # v0.0.0    Fixed several important references related to BASE_URL and GATEWAY_HOST.
+# v0.0.2    Pooled connections (requests.Session), concurrent async checks (--async) and a throughput mode for many API keys (--throughput).
 
 """
 
@@ -71,6 +72,25 @@ Versioning: Always increment the info/version field (e.g., from 1.0.3 to 1.0.4)
 Clean Deployment: In cases of persistent, hard-to-diagnose errors (like the 405 you experienced), performing a full delete and redeploy of the API Gateway is the most effective way to eliminate environmental or cached configuration issues.
 
 
+# ---------------------------------------------------------------------------------------------------------
+Connection Pooling, Concurrent Checks and Throughput Mode
+
+Each bare requests.get() / requests.post() opens a new TCP + TLS connection to the Gateway host (several round trips
+before the request is even sent).  The functions below take an optional requests.Session, which keeps the connection
+alive between calls.  Run from the command line:
+
+    python gcp_api_gateway_client.py                 The checks one after another over one Session (keep-alive).
+    python gcp_api_gateway_client.py --async         The checks (ready with / without key, status, calculator)
+                                                     concurrently over one httpx.AsyncClient.
+    python gcp_api_gateway_client.py --throughput --keys-file keys.txt --duration 30 --concurrency 4
+                                                     Exercises the Gateway with many API keys in parallel:  'concurrency'
+                                                     workers per key send 'endpoint' requests for 'duration' seconds over
+                                                     one shared connection pool, then the requests/s, status codes
+                                                     (e.g. 429 when a key exceeds its quota) and latency are printed per key.
+API keys for --throughput:  --keys-file (one key per line), else the environment variable GATEWAY_API_KEYS
+(comma separated), else API_KEY.
+
+
 # ---------------------------------------------------------------------------------------------------------
 PIP INSTALL:
 
@@ -80,13 +100,18 @@ python-dotenv
 rich
 fastapi
 uvicorn
+httpx
 
 """
 
 import requests
 import os
-from typing import Dict, Any
-from time import sleep
+import argparse
+import asyncio
+import time
+from typing import Dict, Any, List
+# pip install
+import httpx
 
 # Update GATEWAY_HOST and API_KEY below with the output from execution of gcp_9_api_gateway.bat 
 # Additional API_KEY strings can be generated by executing gcp_api_gateway_add_api_key.bat 
@@ -97,19 +122,23 @@ API_KEY = "the_39_char_api_gateway_key_###########"
 # -----------------------------------------
 
 
-def run_check_ready_endpoint():
+def run_check_ready_endpoint(session: requests.Session = None):
     """
+    Calls /ready with the API key (expects 200) and without it (expects 401/403).
+    Pass a requests.Session to reuse its connection (keep-alive).
     """
+    http = session or requests
+    params = {'key': API_KEY}
+    endpoint = f"https://{GATEWAY_HOST}/ready"
+
     # --- Test Case 1: Successful Call with API Key ---
     print("\n--- Test 1: Calling with API Key ---")
     try:
 
-        endpoint = f"https://{GATEWAY_HOST}/ready"
-
         print(f"\nbase_url: {GATEWAY_HOST}")
         print(f"params: {params}\n")
 
-        response = requests.get(endpoint, params=params)
+        response = http.get(endpoint, params=params)
         
         # API Gateway returns 401 if API key is invalid or not enabled for the service
         # Cloud Run returns 200/40x depending on your app logic
@@ -132,7 +161,7 @@ def run_check_ready_endpoint():
     print("\n--- Test 2: Calling WITHOUT API Key ---")
     try:
         # Do not include the 'params' dictionary
-        response_unauth = requests.get(endpoint) 
+        response_unauth = http.get(endpoint) 
         
         # API Gateway typically returns 401 Unauthorized or 403 Forbidden 
         # when the API key is missing due to the OpenAPI security requirement.
@@ -145,11 +174,13 @@ def run_check_ready_endpoint():
         print(f"An error occurred: {e}")
 
 
-def get_server_status():
+def get_server_status(session: requests.Session = None):
     """
     Checks the server status by requesting the OpenAPI specification 
     and retrieves the MCP server title, description, and version.
+    Pass a requests.Session to reuse its connection (keep-alive).
     """
+    http = session or requests
 
     endpoint = f"https://{GATEWAY_HOST}/openapi.json"
 
@@ -158,7 +189,7 @@ def get_server_status():
 
     try:
         # Request the OpenAPI specification (FastAPI's documentation endpoint)
-        response = requests.get(endpoint, params={'key': API_KEY})
+        response = http.get(endpoint, params={'key': API_KEY})
         response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
         
         openapi_spec = response.json()
@@ -182,14 +213,17 @@ def get_server_status():
         print(f"An unexpected error occurred during status check: {e}")
 
 
-def run_calculator_tool(num1: float, num2: float, operation: str = "add"):
+def run_calculator_tool(num1: float, num2: float, operation: str = "add", session: requests.Session = None):
     """
     Calls the /api/calculator endpoint with structured input.
 
     :param num1: The first number.
     :param num2: The second number.
     :param operation: The operation to perform (e.g., 'add').
+    :param session: Optional requests.Session to reuse its connection (keep-alive).
     """
+    http = session or requests
+    response = None
 
     endpoint = f"https://{GATEWAY_HOST}/api/calculator"
 
@@ -205,7 +239,7 @@ def run_calculator_tool(num1: float, num2: float, operation: str = "add"):
 
     try:
         # Send the POST request with JSON payload
-        response = requests.post(endpoint, json=payload, params={'key': API_KEY})
+        response = http.post(endpoint, json=payload, params={'key': API_KEY})
         
         # Check for successful response status codes (2xx)
         response.raise_for_status() 
@@ -229,27 +263,164 @@ def run_calculator_tool(num1: float, num2: float, operation: str = "add"):
 
 
 
+# ---------------------------------------------------------------------------------------------------------
+# Concurrent checks (httpx.AsyncClient)
+
+
+async def run_checks_async(client: httpx.AsyncClient):
+    """
+    Runs the /ready (with and without the API key), /openapi.json and /api/calculator checks concurrently
+    over the shared 'client', then prints the results in order.  The total time is that of the slowest check.
+    """
+    base_url = f"https://{GATEWAY_HOST}"
+    payload = {"num1": 5.5, "num2": 10.2, "operation": "add"}
+    checks = {
+        "ready (with API key)": client.get(f"{base_url}/ready", params={'key': API_KEY}),
+        "ready (WITHOUT API key)": client.get(f"{base_url}/ready"),
+        "status (/openapi.json)": client.get(f"{base_url}/openapi.json", params={'key': API_KEY}),
+        "calculator": client.post(f"{base_url}/api/calculator", json=payload, params={'key': API_KEY}),
+    }
+    t_start = time.perf_counter()
+    responses = await asyncio.gather(*checks.values(), return_exceptions=True)
+    print(f"\n--- {len(checks)} checks concurrently in {time.perf_counter()-t_start:.3f} s ---")
+
+    for name, response in zip(checks, responses):
+        if isinstance(response, Exception):
+            print(f"{name}: ERROR {type(response).__name__}: {response}")
+            continue
+        expected = (401, 403) if "WITHOUT" in name else (200,)
+        outcome = "OK" if response.status_code in expected else "UNEXPECTED"
+        print(f"{name}: {outcome} (Code: {response.status_code})")
+        if name.startswith("status") and response.status_code == 200:
+            info = response.json().get('info', {})
+            print(f"    Title: {info.get('title', 'N/A')}  Version: {info.get('version', 'N/A')}")
+        elif name == "calculator" and response.status_code == 200:
+            result_data = response.json()
+            print(f"    Output Message: {result_data.get('message')}")
+            print(f"    Output Result: {result_data.get('result')}")
+        elif outcome == "UNEXPECTED":
+            print(f"    {response.text[:500]}")
+    print("-" * 20)
+
+
+# ---------------------------------------------------------------------------------------------------------
+# Throughput mode (many API keys in parallel)
+
+
+def get_api_keys(keys_file: str = None) -> List[str]:
+    """API keys from 'keys_file' (one per line), else GATEWAY_API_KEYS (comma separated), else [API_KEY]."""
+    if keys_file:
+        with open(keys_file, "r", encoding="utf-8") as f:
+            keys = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        keys = [k.strip() for k in os.environ.get("GATEWAY_API_KEYS", "").split(",") if k.strip()] or [API_KEY]
+    return keys
+
+
+async def throughput_test(api_keys: List[str], duration_s: float = 30.0, concurrency: int = 4, endpoint: str = "/api/calculator",
+                          timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    'concurrency' workers per API key send requests to 'endpoint' for 'duration_s' seconds, all over one
+    shared httpx.AsyncClient (connection pool, keep-alive).  The key is sent per request as ?key=.
+    Returns {key: {"requests", "rps", "status_codes", "errors", "p50_ms", "p99_ms"}}.
+    """
+    url = f"https://{GATEWAY_HOST}{endpoint}"
+    payload = {"num1": 5.5, "num2": 10.2, "operation": "add"} if endpoint == "/api/calculator" else None
+    n_workers = concurrency * len(api_keys)
+    limits = httpx.Limits(max_connections=n_workers, max_keepalive_connections=n_workers)
+    per_key = {key: {"latencies": [], "status_codes": {}, "errors": {}} for key in api_keys}
+
+    async def worker(client: httpx.AsyncClient, key: str, deadline: float):
+        stats = per_key[key]
+        while time.perf_counter() < deadline:
+            t_start = time.perf_counter()
+            try:
+                if payload is None:
+                    response = await client.get(url, params={'key': key})
+                else:
+                    response = await client.post(url, json=payload, params={'key': key})
+                code = response.status_code
+                stats["status_codes"][code] = stats["status_codes"].get(code, 0) + 1
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+                stats["errors"][error] = stats["errors"].get(error, 0) + 1
+            stats["latencies"].append(1000*(time.perf_counter()-t_start))
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        print(f"\n--- Throughput: {len(api_keys)} API key(s) x {concurrency} worker(s), {duration_s} s, {url} ---")
+        t_start = time.perf_counter()
+        deadline = t_start + duration_s
+        await asyncio.gather(*(worker(client, key, deadline) for key in api_keys for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t_start
+
+    results = {}
+    for key, stats in per_key.items():
+        latencies = sorted(stats["latencies"])
+        n = len(latencies)
+        results[key] = {
+            "requests": n,
+            "rps": round(n / elapsed, 2),
+            "status_codes": dict(sorted(stats["status_codes"].items())),
+            "errors": stats["errors"],
+            "p50_ms": round(latencies[n // 2], 1) if n else None,
+            "p99_ms": round(latencies[min(int(0.99 * n), n - 1)], 1) if n else None,
+        }
+    return results
+
+
+def print_throughput_results(results: Dict[str, Any]):
+    print(f"{'API key':14s} {'requests':>8s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s}  status codes / errors")
+    for key, r in results.items():
+        # Only show the end of the key
+        label = f"...{key[-8:]}" if key else "(none)"
+        print(f"{label:14s} {r['requests']:8d} {r['rps']:8.1f} {r['p50_ms'] or 0:8.1f} {r['p99_ms'] or 0:8.1f}  {r['status_codes']} {r['errors'] or ''}")
+    total = sum(r["requests"] for r in results.values())
+    print(f"{'ALL':14s} {total:8d} {sum(r['rps'] for r in results.values()):8.1f}")
+
+
+def get_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Client for the API Gateway.  Without options, runs the checks over one requests.Session.")
+    parser.add_argument("--async", dest="run_async", action="store_true", help="Run the checks concurrently (httpx.AsyncClient)")
+    parser.add_argument("--throughput", action="store_true", help="Throughput mode with many API keys in parallel")
+    parser.add_argument("--keys-file", default=None, help="File with one API key per line (throughput mode)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds (throughput mode)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Workers per API key (throughput mode)")
+    parser.add_argument("--endpoint", default="/api/calculator", help="Endpoint (throughput mode), e.g. /ready")
+    return parser
+
+
+async def main_async():
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await run_checks_async(client)
+
+
 if __name__ == "__main__":
-    pass
+    args = get_arg_parser().parse_args()
 
-    # Check the /ready endpoint
-    run_check_ready_endpoint()
+    if args.throughput:
+        results = asyncio.run(throughput_test(get_api_keys(args.keys_file), args.duration, args.concurrency, args.endpoint))
+        print_throughput_results(results)
 
-    # Check if the server is up
-    sleep(1)
-    get_server_status()
-    
-    # Run the simple calculator tool
-    sleep(1)
-    run_calculator_tool(num1=5.5, num2=10.2, operation="add")
-    
-    # Test with a different set of numbers
-    #sleep(1)
-    #run_calculator_tool(num1=100, num2=25, operation="add")
+    elif args.run_async:
+        asyncio.run(main_async())
+
+    else:
+        # One Session (connection pool) for all the calls:  the TLS connection to the Gateway is reused.
+        with requests.Session() as session:
+            # Check the /ready endpoint
+            run_check_ready_endpoint(session)
+
+            # Check if the server is up
+            get_server_status(session)
+
+            # Run the simple calculator tool
+            run_calculator_tool(num1=5.5, num2=10.2, operation="add", session=session)
+
+            # Test with a different set of numbers
+            #run_calculator_tool(num1=100, num2=25, operation="add", session=session)
 
-    # Test an unsupported operation to see the server's fallback response
-    #sleep(1)
-    #run_calculator_tool(num1=10, num2=3, operation="multiply")
+            # Test an unsupported operation to see the server's fallback response
+            #run_calculator_tool(num1=10, num2=3, operation="multiply", session=session)
 
     
 
@@ -0,0 +1,476 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.1"
+# v0.0.0    initial release
+# v0.0.1    SCHEMA_HASH covers only the paths and components, not info.version (a server version bump is not a schema change).
+
+"""
+Generates a typed async client SDK ('api_client_sdk.py') from the OpenAPI schema of 'rest_api_server.py'.
+
+    python generate_client_sdk.py                               schema from the app (imported, not started)
+    python generate_client_sdk.py --url http://localhost:8000   schema from a running server (/openapi.json)
+    python generate_client_sdk.py --url https://GATEWAY_HOST --api-key ###
+    python generate_client_sdk.py --check                       exit 1 if 'api_client_sdk.py' is out of date
+
+The generated ApiClient has:
+- One async method per endpoint, named after the endpoint function (e.g. calculate(), get_job()), with the path,
+  query, header and body parameters as typed arguments and the defaults from the schema.
+  Request bodies are TypedDicts (e.g. CalculatorInput) generated from the schema components.
+- Payloads encoded with orjson when installed (pip install orjson), else compact json.dumps(), and sent as bytes.
+  URLs are prepared f-strings, nothing is looked up in the schema at run time.
+- One shared httpx.AsyncClient (connection pool, HTTP/2 when the 'h2' package is installed).
+- batch():  runs one method for many argument sets concurrently, results in order.
+- is_up():  a GET of the cheapest endpoint (/healthz) instead of downloading /openapi.json.
+- check_schema():  compares the hash of the server's schema with SCHEMA_HASH (the schema the SDK was generated
+  from) once per client, so a client that is out of date with the server is detected.  Only the "paths" and
+  "components" are hashed:  bumping the server's __version__ (info.version) does not change the API.
+- Server-Sent Events endpoints (/sse/...) are async generators of the events.
+
+Generation is skipped when the existing SDK was generated from the same schema (SCHEMA_HASH) by the same
+version of this script.  The WebSocket endpoint (/ws/calculator) is not part of the OpenAPI schema.
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import keyword
+import os
+import re
+import sys
+
+from log_config import get_logger
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+
+# ----------------------------------------------------------------------
+# Constants
+
+PATH_SRC = Path(__file__).resolve().parent
+PATH_FILE_SDK = PATH_SRC / "api_client_sdk.py"
+
+# Endpoints under this prefix are Server-Sent Events streams
+SSE_PATH_PREFIX = "/sse/"
+# Used by is_up(), the first one found in the schema
+HEALTH_PATHS = ("/healthz", "/readyz", "/openapi.json")
+
+JSON_TYPES = {"string": "str", "number": "float", "integer": "int", "boolean": "bool", "null": "None"}
+
+
+def get_schema_hash(schema: dict) -> str:
+    """
+    SHA-256 of the endpoints and types of the schema ("paths" and "components") in canonical form (sorted keys),
+    so the same API always has the same hash.  "info" (title, version) is left out.
+    The generated check_schema() computes the same hash.
+    """
+    api = {"paths": schema.get("paths", {}), "components": schema.get("components", {})}
+    return hashlib.sha256(json.dumps(api, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def get_schema_from_app() -> dict:
+    """The OpenAPI schema of rest_api_server.app (imported, the lifespan is not run)."""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from rest_api_server import app
+    return app.openapi()
+
+
+def get_schema_from_url(base_url: str, api_key: str = None) -> dict:
+    import httpx
+    response = httpx.get(f"{base_url.rstrip('/')}/openapi.json", params={"key": api_key} if api_key else None, timeout=30.0, follow_redirects=True)
+    response.raise_for_status()
+    return response.json()
+
+
+def python_name(name: str) -> str:
+    """A valid Python identifier for a parameter or property name (e.g. 'last-event-id' -> 'last_event_id')."""
+    name = re.sub(r"\W", "_", name)
+    if name[:1].isdigit(): name = f"_{name}"
+    return f"{name}_" if keyword.iskeyword(name) else name
+
+
+def method_name(operation_id: str, path: str, method: str) -> str:
+    """
+    FastAPI's operationId is the endpoint function name + the path + the method (non-word characters as '_'),
+    e.g. 'calculate_api_calculator_post' -> 'calculate'.
+    """
+    suffix = re.sub(r"\W", "_", path) + "_" + method
+    if operation_id.endswith(suffix) and len(operation_id) > len(suffix):
+        return python_name(operation_id[:-len(suffix)])
+    return python_name(operation_id)
+
+
+def python_type(schema: dict) -> str:
+    """Python type annotation for a JSON schema."""
+    if not schema: return "Any"
+    if "$ref" in schema: return schema["$ref"].rsplit("/", 1)[-1]
+    if "anyOf" in schema:
+        types = [python_type(s) for s in schema["anyOf"]]
+        if "None" in types:
+            types.remove("None")
+            return f"Optional[{types[0]}]" if len(types) == 1 else f"Optional[Union[{', '.join(types)}]]"
+        return f"Union[{', '.join(types)}]"
+    kind = schema.get("type")
+    if kind == "array": return f"List[{python_type(schema.get('items', {}))}]"
+    if kind == "object": return "Dict[str, Any]"
+    return JSON_TYPES.get(kind, "Any")
+
+
+def literal(value) -> str:
+    """Python literal for a JSON value, strings in double quotes."""
+    return json.dumps(value) if isinstance(value, str) else repr(value)
+
+
+def get_component_order(components: dict) -> list:
+    """Component names ordered so each one comes after the components it refers to (TypedDicts are evaluated in order)."""
+    order = []
+
+    def visit(name: str, seen: tuple):
+        if name in order or name in seen or name not in components: return
+        for ref in re.findall(r'"#/components/schemas/(\w+)"', json.dumps(components[name])):
+            visit(ref, seen + (name,))
+        order.append(name)
+
+    for name in components: visit(name, ())
+    return order
+
+
+def get_typed_dicts(schema: dict) -> list:
+    """Lines of a TypedDict for each object in the schema components."""
+    lines = []
+    components = schema.get("components", {}).get("schemas", {})
+    for name in get_component_order(components):
+        component = components[name]
+        if component.get("type") != "object" or "properties" not in component: continue
+        required = set(component.get("required", []))
+        lines += ["", "", f"class {name}(TypedDict):"]
+        if component.get("description"): lines.append(f"    {json.dumps(component['description'])}")
+        for prop, prop_schema in component["properties"].items():
+            annotation = python_type(prop_schema)
+            if prop not in required: annotation = f"NotRequired[{annotation}]"
+            if python_name(prop) == prop:
+                lines.append(f"    {prop}: {annotation}")
+            else:
+                lines.append(f"    # {prop!r} is not a valid Python name, pass it in a dict")
+    return lines
+
+
+def get_operations(schema: dict) -> list:
+    """One dict per endpoint with what is needed to write its method."""
+    components = schema.get("components", {}).get("schemas", {})
+    operations = []
+    for path, path_item in schema.get("paths", {}).items():
+        for method, op in path_item.items():
+            if method not in ("get", "post", "put", "patch", "delete"): continue
+            args = []           # (python name, annotation, default repr or None, location, wire name)
+            for p in op.get("parameters", []):
+                default = literal(p["schema"]["default"]) if "default" in p.get("schema", {}) else (None if p.get("required") else "None")
+                annotation = python_type(p.get("schema", {}))
+                if default == "None" and not annotation.startswith("Optional"): annotation = f"Optional[{annotation}]"
+                args.append((python_name(p["name"]), annotation, default, p["in"], p["name"]))
+
+            body_type = None
+            body_schema = op.get("requestBody", {}).get("content", {}).get("application/json", {}).get("schema")
+            if body_schema:
+                body_type = python_type(body_schema)
+                ref = components.get(body_type) if "$ref" in body_schema else None
+                if ref and "properties" in ref and all(python_name(k) == k for k in ref["properties"]):
+                    # The body fields become keyword arguments
+                    required = set(ref.get("required", []))
+                    for prop, prop_schema in ref["properties"].items():
+                        if "default" in prop_schema: default = literal(prop_schema["default"])
+                        elif prop in required: default = None
+                        else: default = "_UNSET"
+                        args.append((prop, python_type(prop_schema), default, "body", prop))
+                else:
+                    args.append(("body", body_type, None, "json", None))
+
+            response_type = "Any"
+            for code, response in op.get("responses", {}).items():
+                if code.startswith("2"):
+                    response_type = python_type(response.get("content", {}).get("application/json", {}).get("schema", {}))
+                    break
+
+            operations.append({
+                "name": method_name(op.get("operationId", f"{method}_{path}"), path, method),
+                "method": method.upper(),
+                "path": path,
+                "summary": op.get("summary", ""),
+                "description": (op.get("description") or "").strip(),
+                # Required arguments first, keeping the schema order otherwise
+                "args": sorted(args, key=lambda a: a[2] is not None),
+                "response_type": response_type,
+                "sse": path.startswith(SSE_PATH_PREFIX),
+            })
+    return operations
+
+
+def get_method_lines(op: dict) -> list:
+    """Lines of the ApiClient method for one endpoint."""
+    signature = ", ".join(["self"] + [f"{name}: {annotation}" + (f" = {default}" if default is not None else "")
+                                      for name, annotation, default, _, _ in op["args"]])
+    url = re.sub(r"{(\w+)}", lambda m: "{" + python_name(m.group(1)) + "}", op["path"])
+    url_expr = f'f"{url}"' if "{" in url else f'"{url}"'
+    query = [(name, wire) for name, _, _, where, wire in op["args"] if where == "query"]
+    headers = [(name, wire) for name, _, _, where, wire in op["args"] if where == "header"]
+    body = [(name, default) for name, _, default, where, _ in op["args"] if where == "body"]
+    raw_body = any(where == "json" for _, _, _, where, _ in op["args"])
+
+    if op["sse"]:
+        lines = [f"    async def {op['name']}({signature}) -> AsyncIterator[Dict[str, Any]]:"]
+    else:
+        lines = [f"    async def {op['name']}({signature}) -> {op['response_type']}:"]
+    description = op["description"].replace("\n", "\n        ")
+    doc = f"{op['method']} {op['path']}" + (f"\n\n        {description}" if description else "")
+    if op["sse"]: doc += "\n\n        Yields the Server-Sent Events as {\"event\": ..., \"id\": ..., \"data\": ...} (data decoded from JSON)."
+    lines += [f'        """{doc}"""']
+
+    kwargs = []
+    if query:
+        lines.append("        params = {" + ", ".join(f'"{wire}": {name}' for name, wire in query) + "}")
+        kwargs.append("params=params")
+    if headers:
+        lines.append("        headers = {" + ", ".join(f'"{wire}": str({name})' for name, wire in headers) + "}")
+        kwargs.append("headers=headers")
+    if body:
+        lines.append("        body = {" + ", ".join(f'"{name}": {name}' for name, default in body if default != "_UNSET") + "}")
+        for name, default in body:
+            if default == "_UNSET": lines.append(f'        if {name} is not _UNSET: body["{name}"] = {name}')
+    if body or raw_body: kwargs.append("body=body")
+    call_args = ", ".join([f'"{op["method"]}"', url_expr] + kwargs)
+    if op["sse"]:
+        lines += [f"        async for event in self._stream_events({call_args}):", "            yield event"]
+    else:
+        lines.append(f"        return await self._request({call_args})")
+    return lines
+
+
+SDK_TEMPLATE = '''#
+#   Generated by generate_client_sdk.py v{generator_version} from the OpenAPI schema of '{title}' v{version}.
+#   Do not edit:  regenerate with  python generate_client_sdk.py  (see generate_client_sdk.py).
+
+
+__version__ = "{version}"
+
+# Hash of the OpenAPI schema this SDK was generated from (see check_schema())
+SCHEMA_HASH = "{schema_hash}"
+GENERATOR_VERSION = "{generator_version}"
+
+"""
+Typed async client for '{title}'.
+
+    async with ApiClient("http://localhost:8000") as api:                       # or ("https://GATEWAY_HOST", api_key="###")
+        if await api.is_up():
+            reply = await api.calculate(5.5, 10.2)
+            replies = await api.batch(api.calculate, [dict(num1=i, num2=2) for i in range(100)])
+
+Methods:
+{method_list}
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypedDict, Union
+from typing import NotRequired
+from importlib.util import find_spec
+import asyncio
+import hashlib
+import json
+# pip install
+import httpx
+
+try:
+    # pip install orjson   (faster encoding and decoding of the JSON payloads)
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# HTTP/2 support in httpx requires the 'h2' package (pip install httpx[http2])
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+_JSON_HEADERS = {{"content-type": "application/json"}}
+# Default of the optional body fields that have no default in the schema:  the field is not sent.
+_UNSET = object()
+
+
+class ApiError(Exception):
+    """The server replied with a status code other than 2xx.  'body' is the decoded JSON reply, or the text."""
+
+    def __init__(self, status_code: int, body: Any):
+        super().__init__(f"HTTP {{status_code}}: {{body}}")
+        self.status_code = status_code
+        self.body = body
+{typed_dicts}
+
+
+class ApiClient:
+    """
+    Async client for '{title}'.  One shared httpx.AsyncClient (connection pool) for all the methods.
+    'api_key' is sent as ?key= (API Gateway).  Pass 'client' to use an existing httpx.AsyncClient.
+    """
+
+    def __init__(self, base_url: str, api_key: str = None, concurrency: int = 32, timeout: float = 60.0, http2: bool = True,
+                 client: httpx.AsyncClient = None):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self._own_client = client is None
+        if client is None:
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            client = httpx.AsyncClient(base_url=self.base_url, http2=http2 and HTTP2_AVAILABLE, timeout=timeout, limits=limits,
+                                       params={{"key": api_key}} if api_key else None, follow_redirects=True)
+        self.client = client
+        self._schema_ok = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._own_client: await self.client.aclose()
+
+    async def _request(self, method: str, url: str, body: Any = None, params: dict = None, headers: dict = None) -> Any:
+        if params: params = {{k: v for k, v in params.items() if v is not None}}
+        if body is not None:
+            response = await self.client.request(method, url, content=_dumps(body), params=params, headers={{**_JSON_HEADERS, **(headers or {{}})}})
+        else:
+            response = await self.client.request(method, url, params=params, headers=headers)
+        if response.is_success:
+            return _loads(response.content) if response.content else None
+        try:
+            detail = _loads(response.content)
+        except ValueError:
+            detail = response.text
+        raise ApiError(response.status_code, detail)
+
+    async def _stream_events(self, method: str, url: str, params: dict = None, headers: dict = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the events of a Server-Sent Events response."""
+        async with self.client.stream(method, url, params=params, headers=headers, timeout=None) as response:
+            if not response.is_success:
+                await response.aread()
+                raise ApiError(response.status_code, response.text)
+            event = {{}}
+            async for line in response.aiter_lines():
+                if not line:
+                    if "data" in event: yield event
+                    event = {{}}
+                elif line.startswith(":"):
+                    continue            # comment (heartbeat)
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "data": event["data"] = _loads(value) if value[:1] in "{{[\\"" else value
+                    elif field in ("event", "id"): event[field] = value
+
+    async def batch(self, method: Callable[..., Awaitable], items: Iterable, concurrency: int = None, return_exceptions: bool = True) -> list:
+        """
+        Calls 'method' (e.g. api.calculate) once for each item of 'items' (a dict of keyword arguments, or a tuple of
+        positional arguments) with at most 'concurrency' (default: the client's) calls in flight.
+        Returns the results in the order of 'items'.  A failed call is returned as its exception
+        (e.g. ApiError), or raised if 'return_exceptions' is False.
+        """
+        slots = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def call(item):
+            async with slots:
+                return await (method(**item) if isinstance(item, dict) else method(*item))
+
+        return await asyncio.gather(*(call(item) for item in items), return_exceptions=return_exceptions)
+
+    async def is_up(self) -> bool:
+        """True if the server answers {health_path}."""
+        try:
+            await self._request("GET", "{health_path}")
+            return True
+        except (httpx.HTTPError, ApiError):
+            return False
+
+    async def check_schema(self) -> bool:
+        """
+        True if the server's OpenAPI schema is the one this SDK was generated from (SCHEMA_HASH:  the "paths"
+        and "components", not the server version).
+        The schema is downloaded once per client, later calls return the cached result.
+        """
+        if self._schema_ok is None:
+            schema = await self._request("GET", "/openapi.json")
+            api = {{"paths": schema.get("paths", {{}}), "components": schema.get("components", {{}})}}
+            schema_hash = hashlib.sha256(json.dumps(api, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+            self._schema_ok = schema_hash == SCHEMA_HASH
+        return self._schema_ok
+
+    # ------------------------------------------------------------------
+    # Endpoints
+{methods}
+'''
+
+
+def generate_sdk(schema: dict) -> str:
+    """Returns the source code of the SDK for 'schema'."""
+    operations = get_operations(schema)
+    methods = []
+    for op in operations:
+        methods += [""] + get_method_lines(op)
+    paths = schema.get("paths", {})
+    health_path = next(p for p in HEALTH_PATHS if p in paths or p == "/openapi.json")
+    method_list = "\n".join(f"    {op['name']:28s} {op['method']:5s} {op['path']}" for op in operations)
+    info = schema.get("info", {})
+    return SDK_TEMPLATE.format(
+        generator_version=__version__, title=info.get("title", ""), version=info.get("version", "0.0.0"),
+        schema_hash=get_schema_hash(schema), method_list=method_list, typed_dicts="\n".join(get_typed_dicts(schema)),
+        methods="\n".join(methods), health_path=health_path,
+    )
+
+
+def get_existing_hash(path_file: Path) -> tuple:
+    """(SCHEMA_HASH, GENERATOR_VERSION) of an existing SDK file, or (None, None)."""
+    if not path_file.is_file(): return None, None
+    text = path_file.read_text(encoding="utf-8")
+    schema_hash = re.search(r'^SCHEMA_HASH = "(\w+)"', text, re.M)
+    generator = re.search(r'^GENERATOR_VERSION = "([^"]+)"', text, re.M)
+    return (schema_hash.group(1) if schema_hash else None), (generator.group(1) if generator else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a typed async client SDK from the server's OpenAPI schema.")
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: import rest_api_server)")
+    parser.add_argument("--api-key", default=None, help="API key sent as ?key= with --url")
+    parser.add_argument("--out", default=str(PATH_FILE_SDK), help=f"Output file (default {PATH_FILE_SDK.name})")
+    parser.add_argument("--force", action="store_true", help="Write the SDK even if the schema has not changed")
+    parser.add_argument("--check", action="store_true", help="Do not write.  Exit 1 if the SDK is out of date")
+    args = parser.parse_args()
+
+    schema = get_schema_from_url(args.url, args.api_key) if args.url else get_schema_from_app()
+    schema_hash = get_schema_hash(schema)
+    path_file = Path(args.out)
+    up_to_date = get_existing_hash(path_file) == (schema_hash, __version__)
+
+    if args.check:
+        if up_to_date:
+            logger.info(f"{path_file.name} is up to date (schema {schema_hash[:12]})")
+            return
+        logger.error(f"{path_file.name} is out of date with the schema {schema_hash[:12]}.  Run:  python {Path(__file__).name}")
+        sys.exit(1)
+
+    if up_to_date and not args.force:
+        logger.info(f"{path_file.name} was generated from this schema ({schema_hash[:12]}), not rewritten")
+        return
+    source = generate_sdk(schema)
+    # Check the generated code before replacing the file
+    compile(source, str(path_file), "exec")
+    path_file.write_text(source, encoding="utf-8")
+    logger.info(f"Wrote {path_file} ({len(get_operations(schema))} endpoints, schema {schema_hash[:12]})")
+
+
+if __name__ == "__main__":
+    main()
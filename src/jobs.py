@@ -0,0 +1,363 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.4"
+# v0.0.0    initial release
+# v0.0.1    Added JobEventLog (progress / partial result events for Server-Sent Events streaming).
+# v0.0.2    Non-blocking logging (log_config.py).
+# v0.0.3    Trace spans around FileJobStore file I/O and for each job (child of the submitting request).
+# v0.0.4    FileJobStore.get() returns None for an invalid job_id (404) instead of raising.  Only writes raise.
+
+"""
+Asynchronous job support for long-running work (e.g. /api/ext_api_call) in 'rest_api_server.py'.
+
+Instead of holding the HTTP connection (and an API Gateway / Cloud Run concurrency slot) open for the full
+upstream retry window, a client POSTs the work and immediately receives a job ID.  A bounded pool of
+background workers (JobRunner) performs the work, and the client polls or long-polls the job status.
+
+Job state is kept in a pluggable store selected by the environment variable JOB_STORE:
+    "memory"    In-process dictionary (default).  Fastest, but only visible to the worker process
+                that accepted the job, and lost when the instance shuts down.
+    "tmp"       JSON files in the Cloud Run ephemeral /tmp folder.  Shared by all worker processes
+                of one instance (multi-worker launch).  Counts against instance memory.
+    "bucket"    JSON files in the GCS FUSE bucket mount.  Shared by all instances and survives
+                restarts, at the cost of FUSE latency on every status read.
+
+Job record (dict):
+    job_id, job_type, status ("queued", "running", "done", "error", "cancelled"),
+    created, updated (epoch seconds), request, result, message
+
+Job events
+Every job accepted by this process also has a JobEventLog: a bounded, numbered list of events 
+("status", "progress", "result", ...) that the job function publishes while it runs.  
+The /sse/jobs/{job_id} endpoint streams them to the client (Server-Sent Events), and a client that 
+reconnects with the Last-Event-ID header resumes after the last event it received.
+"""
+
+from pathlib import Path
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+
+# ---------------------------------------------------------------------------
+# Configure logging
+
+from log_config import get_logger
+from tracing import tracer
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+
+
+# ----------------------------------------------------------------------
+# Constants
+
+JOB_STATUS_FINAL = ("done", "error", "cancelled")
+
+# Maximum events kept per job.  A subscriber that falls further behind receives a "resync" event.
+JOB_EVENTS_MAX = 1000
+
+
+# ----------------------------------------------------------------------
+# Job stores
+
+class MemoryJobStore:
+    """
+    Job store backed by a dictionary in this process.
+    Jobs older than 'ttl_s' are evicted when new jobs are added.
+    """
+
+    def __init__(self, ttl_s: float = 3600.0):
+        self.ttl_s = ttl_s
+        self._jobs = {}
+
+    async def put(self, job: dict):
+        if job["job_id"] not in self._jobs: self._evict()
+        self._jobs[job["job_id"]] = job
+
+    async def get(self, job_id: str) -> dict:
+        return self._jobs.get(job_id)
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl_s
+        for job_id in [k for k, v in self._jobs.items() if v["updated"] < cutoff]:
+            del self._jobs[job_id]
+
+
+class FileJobStore:
+    """
+    Job store that writes one JSON file per job to 'path_folder' (the /tmp folder or the GCS FUSE bucket mount).
+    File I/O runs in a thread so FUSE latency does not block the event loop.
+    Each write goes to a temporary file that is then renamed, so a reader never sees a partial record.
+    Expired job files are removed at most once every 'ttl_s' / 10 seconds.
+    """
+
+    def __init__(self, path_folder: Path, ttl_s: float = 3600.0):
+        self.path_folder = Path(path_folder)
+        self.path_folder.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self._t_last_evict = 0.0
+
+    @staticmethod
+    def _valid_id(job_id: str) -> bool:
+        # job_id comes from the URL, so never let it escape the folder.
+        return job_id.isascii() and job_id.replace("-", "").isalnum()
+
+    def _path(self, job_id: str) -> Path:
+        if not self._valid_id(job_id): raise ValueError(f"Invalid job_id: {job_id}")
+        return self.path_folder.joinpath(f"{job_id}.json")
+
+    def _write(self, job: dict):
+        path_file = self._path(job["job_id"])
+        path_tmp = path_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(path_tmp, mode="w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(path_tmp, path_file)
+
+    def _read(self, job_id: str) -> dict:
+        # An invalid job_id can't have been written, so it is simply not found.
+        if not self._valid_id(job_id): return None
+        try:
+            with open(self._path(job_id), mode="r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl_s
+        for path_file in self.path_folder.glob("*.json"):
+            try:
+                if path_file.stat().st_mtime < cutoff: path_file.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def put(self, job: dict):
+        with tracer.span("fs.write", path=str(self.path_folder), job_id=job["job_id"]):
+            await asyncio.to_thread(self._write, job)
+        if time.time() - self._t_last_evict > self.ttl_s / 10:
+            self._t_last_evict = time.time()
+            await asyncio.to_thread(self._evict)
+
+    async def get(self, job_id: str) -> dict:
+        if not self._valid_id(job_id): return None
+        with tracer.span("fs.read", path=str(self.path_folder), job_id=job_id):
+            return await asyncio.to_thread(self._read, job_id)
+
+
+def get_job_store(kind: str, app_config: dict, ttl_s: float = 3600.0):
+    """
+    Returns the job store for 'kind' ("memory", "tmp" or "bucket").
+    'app_config' is the app.state.app_config dict populated by lifespan (paths to /tmp and the bucket mount).
+    """
+    if kind == "memory":
+        return MemoryJobStore(ttl_s=ttl_s)
+    elif kind == "tmp":
+        return FileJobStore(Path(app_config["path_gcp_tmp"]).joinpath("jobs"), ttl_s=ttl_s)
+    elif kind == "bucket":
+        return FileJobStore(Path(app_config["bucket_mount_path"]).joinpath("jobs"), ttl_s=ttl_s)
+    raise ValueError(f"Unknown JOB_STORE '{kind}'.  Use 'memory', 'tmp' or 'bucket'.")
+
+
+# ----------------------------------------------------------------------
+# Job events
+
+class JobEventLog:
+    """
+    Bounded, numbered log of the events of one job (event IDs start at 1).
+
+    Publishing never blocks: the job keeps running at full speed no matter how slowly a subscriber reads.
+    Each subscriber reads at its own pace with since(), and memory stays bounded because only the
+    newest 'maxlen' events are kept.  wait() lets subscribers sleep until something new is published.
+    """
+
+    def __init__(self, maxlen: int = JOB_EVENTS_MAX):
+        self._events = deque(maxlen=maxlen)
+        self._changed = asyncio.Event()
+        self.next_id = 1
+        self.closed = False
+        self.t_closed = None
+
+    def publish(self, event: str, data):
+        """Append an event.  'data' must be JSON serializable."""
+        self._events.append((self.next_id, event, data))
+        self.next_id += 1
+        self._notify()
+
+    def close(self):
+        """No more events will be published (the job reached a final status)."""
+        self.closed = True
+        self.t_closed = time.time()
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, and give new waiters a fresh one.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def since(self, last_id: int):
+        """
+        Returns (events, gap) where events is the list of (id, event, data) after 'last_id'
+        and gap is True if events after 'last_id' were already discarded.
+        """
+        if not self._events: return [], False
+        first_id = self._events[0][0]
+        gap = last_id < first_id - 1
+        start = max(last_id - first_id + 1, 0)
+        return [self._events[i] for i in range(start, len(self._events))], gap
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to 'timeout' seconds for a new event or close().  Returns False on timeout."""
+        if self.closed: return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# ----------------------------------------------------------------------
+# Job runner
+
+class JobQueueFull(Exception):
+    """Raised by JobRunner.submit() when the job queue is at capacity."""
+
+
+class JobRunner:
+    """
+    Bounded pool of 'workers' asyncio tasks that execute queued jobs and record their state in 'store'.
+
+    At most 'queue_size' jobs may be waiting; submit() raises JobQueueFull beyond that so the caller
+    can answer 429 instead of accepting unbounded work.
+    """
+
+    def __init__(self, store, workers: int = 4, queue_size: int = 100):
+        self.store = store
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self._events = {}           # job_id -> JobEventLog for the jobs accepted by this process
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"JobRunner started with {self.workers} workers ({type(self.store).__name__}).")
+
+    async def submit(self, job_type: str, request: dict, func) -> dict:
+        """
+        Queue the coroutine function 'func(request, publish)' and return the new job record.
+        The value returned by 'func' (must be JSON serializable) becomes the job 'result'.
+        'publish(event, data)' may be called by 'func' to report progress and partial results.
+        """
+        if self._queue.full(): raise JobQueueFull(f"{self._queue.qsize()} jobs already queued")
+        self._evict_events()
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "job_type": job_type,
+            "status": "queued",
+            "created": now,
+            "updated": now,
+            "request": request,
+            "result": None,
+            "message": None,
+        }
+        await self.store.put(job)
+        self._events[job["job_id"]] = JobEventLog()
+        self._publish_status(job)
+        # The current trace span (the submitting request) becomes the parent of the job's span.
+        self._queue.put_nowait((job, func, tracer.current()))
+        return job
+
+    def events(self, job_id: str) -> JobEventLog:
+        """Returns the JobEventLog for 'job_id', or None if the job was not accepted by this process."""
+        return self._events.get(job_id)
+
+    def _publish_status(self, job: dict):
+        log = self._events.get(job["job_id"])
+        if log is None: return
+        if job["status"] in JOB_STATUS_FINAL:
+            log.publish(job["status"], job)
+            log.close()
+        else:
+            log.publish("status", {"job_id": job["job_id"], "status": job["status"], "updated": job["updated"]})
+
+    def _evict_events(self):
+        # Keep finished event logs for an hour so clients can still resume / replay them.
+        cutoff = time.time() - 3600
+        for job_id in [k for k, v in self._events.items() if v.closed and v.t_closed < cutoff]:
+            del self._events[job_id]
+
+    async def get(self, job_id: str, wait: float = 0.0) -> dict:
+        """
+        Returns the job record (None if unknown).  If 'wait' > 0 and the job is not final yet,
+        waits up to 'wait' seconds for it to finish (long-poll).
+        Jobs accepted by this process are awaited on an event; jobs from other processes / instances
+        (file stores) are re-read from the store every 0.5 s.
+        """
+        job = await self.store.get(job_id)
+        if job is None or wait <= 0 or job["status"] in JOB_STATUS_FINAL: return job
+
+        deadline = time.monotonic() + wait
+        log = self._events.get(job_id)
+        if log is not None:
+            while not log.closed and time.monotonic() < deadline:
+                await log.wait(deadline - time.monotonic())
+            return await self.store.get(job_id)
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, deadline - time.monotonic()))
+            job = await self.store.get(job_id)
+            if job is None or job["status"] in JOB_STATUS_FINAL: break
+        return job
+
+    async def _finish(self, job: dict, status: str, result=None, message: str = None):
+        job.update(status=status, result=result, message=message, updated=time.time())
+        await self.store.put(job)
+        self._publish_status(job)
+
+    async def _worker(self, i: int):
+        while True:
+            job, func, trace_parent = await self._queue.get()
+            try:
+                with tracer.span(f"job {job['job_type']}", parent=trace_parent, job_id=job["job_id"]):
+                    job.update(status="running", updated=time.time())
+                    await self.store.put(job)
+                    self._publish_status(job)
+                    t_start = time.perf_counter()
+                    result = await func(job["request"], self._events[job["job_id"]].publish)
+                    if result is None:
+                        await self._finish(job, "error", message="An error occurred contacting the API")
+                    else:
+                        await self._finish(job, "done", result=result, message=f"{job['job_type']} took {round(time.perf_counter()-t_start,1)} s")
+            except asyncio.CancelledError:
+                await self._finish(job, "cancelled", message="Instance shutting down")
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} failed: {repr(e)}")
+                await self._finish(job, "error", message=repr(e))
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 0.0):
+        """
+        Wait up to 'timeout' seconds for queued and running jobs to finish, then cancel the workers
+        (running jobs are recorded as "cancelled") and mark any jobs still queued "cancelled".
+        """
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"JobRunner stop timeout with {self._queue.qsize()} job(s) queued.")
+        for task in self._tasks: task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while not self._queue.empty():
+            job, func, trace_parent = self._queue.get_nowait()
+            await self._finish(job, "cancelled", message="Instance shutting down")
+        logger.info("JobRunner stopped.")
@@ -0,0 +1,232 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.1"
+# v0.0.0    initial release
+# v0.0.1    Rate limiting is opt-in (per logger or per call) and never applies to ERROR and CRITICAL records.
+
+"""
+Non-blocking, Cloud Logging compatible logging for the scripts in /src.
+
+    from log_config import get_logger
+    logger = get_logger(Path(__file__).stem)
+
+A logging.StreamHandler(sys.stdout) writes to stdout in the thread that calls logger.info().  In the server that
+is the event loop thread, so under load (or when the Cloud Run log agent is slow to drain stdout) every request
+waits on the write.  get_logger() instead attaches one shared QueueHandler:
+- The calling thread only merges the message arguments and puts the record on a bounded queue.
+  If the queue is full (stdout cannot keep up), the record is dropped and counted instead of blocking.
+- A QueueListener thread formats the records (including tracebacks) and writes them to stdout.
+- The listener is stopped (and the queue drained) at interpreter exit.
+
+Format (LOG_FORMAT):
+    "json"      One JSON object per line with "severity", "message", "logger" and
+                "logging.googleapis.com/sourceLocation".  Cloud Logging parses these into structured log entries
+                (the colored severity in the console, filtering by severity, jumping to the source line).
+                Extra fields can be added to an entry with:  logger.info("...", extra={"json_fields": {...}})
+    "text"      [LEVEL] message    (readable in a terminal)
+    Default:  "json" on Cloud Run (K_SERVICE is set), otherwise "text".
+
+LOG_LEVEL (default INFO) sets the level.  E.g. set LOG_LEVEL=WARNING on the Cloud Run service and the
+logger.info() calls are discarded before they are queued.
+
+Rate limiting (LOG_RATE_LIMIT="N/S", default "20/10"):
+Noisy log lines (e.g. in a request handler at thousands of requests per second) opt in to rate limiting,
+either per call or for a whole logger:
+    logger.warning(f"Retrying {url}", extra=RATE_LIMITED)
+    logger = get_logger(Path(__file__).stem, rate_limit=True)
+At most N of these records per S seconds are written from each source line (file + line number).  Further
+records from that line are dropped and the first record of the next period reports how many were suppressed.
+Everything else, including uvicorn's access and error logs, is never rate limited, and neither are ERROR and
+CRITICAL records.  LOG_RATE_LIMIT=0 disables rate limiting.
+"""
+
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+
+
+# ----------------------------------------------------------------------
+# Constants
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json" if os.environ.get("K_SERVICE") else "text")
+LOG_RATE_LIMIT = os.environ.get("LOG_RATE_LIMIT", "20/10")
+# Records waiting to be written.  When full, new records are dropped.
+LOG_QUEUE_SIZE = 10000
+
+# logger.info("...", extra=RATE_LIMITED) rate limits that call (see the description at the top)
+RATE_LIMITED = {"rate_limit": True}
+
+# Python level name -> Cloud Logging severity
+SEVERITY = {
+    "DEBUG": "DEBUG",
+    "INFO": "INFO",
+    "WARNING": "WARNING",
+    "ERROR": "ERROR",
+    "CRITICAL": "CRITICAL",
+}
+
+
+class CloudLoggingFormatter(logging.Formatter):
+    """Formats a record as a single line JSON object for Cloud Logging (structured logging)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        entry = {
+            "severity": SEVERITY.get(record.levelname, "DEFAULT"),
+            "message": message,
+            "logger": record.name,
+            "logging.googleapis.com/sourceLocation": {"file": record.pathname, "line": record.lineno, "function": record.funcName},
+        }
+        json_fields = getattr(record, "json_fields", None)
+        if json_fields: entry.update(json_fields)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Allows at most 'limit' records per 'period' seconds from each source line.
+    The first record allowed after records were suppressed reports the number suppressed.
+    Only records logged with extra=RATE_LIMITED are limited, unless 'all_records' (a filter of a rate limited
+    logger).  ERROR and CRITICAL records are never limited.
+    """
+
+    def __init__(self, limit: int, period: float, all_records: bool = False):
+        super().__init__()
+        self.limit = limit
+        self.period = period
+        self.all_records = all_records
+        self._sites = {}            # (pathname, lineno) -> [period start, count, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR: return True
+        if not self.all_records and not getattr(record, "rate_limit", False): return True
+        now = time.monotonic()
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None:
+            self._sites[(record.pathname, record.lineno)] = [now, 1, 0]
+            return True
+        if now - site[0] >= self.period:
+            suppressed = site[2]
+            site[:] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()}  ({suppressed} similar message(s) suppressed in the last {self.period:g} s)"
+                record.args = None
+            return True
+        site[1] += 1
+        if site[1] > self.limit:
+            site[2] += 1
+            return False
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller.  Records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments now (they may be mutated after the call).  Formatting, including
+        # tracebacks, is left to the listener thread.  The record stays in this process, so exc_info is kept.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler = None
+_listener = None
+
+
+def get_rate_limit() -> tuple:
+    """Returns (limit, period) from LOG_RATE_LIMIT, or None if rate limiting is disabled."""
+    if LOG_RATE_LIMIT in ("", "0"): return None
+    limit, period = LOG_RATE_LIMIT.split("/")
+    return int(limit), float(period)
+
+
+def get_queue_handler() -> NonBlockingQueueHandler:
+    """Returns the process wide queue handler, starting the listener thread on first use."""
+    global _queue_handler, _listener
+    if _queue_handler is not None: return _queue_handler
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(CloudLoggingFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    # Limits only the calls made with extra=RATE_LIMITED
+    if get_rate_limit() is not None:
+        _queue_handler.addFilter(RateLimitFilter(*get_rate_limit()))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    # Write whatever is still queued before the interpreter exits.
+    atexit.register(stop_logging)
+    return _queue_handler
+
+
+def stop_logging():
+    """Stop the listener thread after it has written all queued records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _queue_handler.dropped:
+            sys.stdout.write(f"[WARNING] {_queue_handler.dropped} log record(s) dropped (log queue full)\n")
+
+
+def get_logger(name: str, rate_limit: bool = False) -> logging.Logger:
+    """
+    Returns the named logger, writing through the non-blocking queue handler at level LOG_LEVEL.
+    Use logger rather than print() (see the description at the top of this script).
+    'rate_limit' rate limits every record of the logger below ERROR (see LOG_RATE_LIMIT).
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(get_queue_handler())
+        # Prevent double-logging
+        logger.propagate = False
+    if rate_limit and get_rate_limit() is not None and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(*get_rate_limit(), all_records=True))
+    return logger
+
+
+def route_uvicorn_logs():
+    """
+    Send uvicorn's own loggers (startup messages, errors and access log) through the queue handler,
+    so they are written off the event loop thread in the same format.  Call after uvicorn has configured
+    logging, e.g. from lifespan.  They are not rate limited:  the access log is written from a single source
+    line, so a per-line limit would drop almost every request.
+    """
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = [get_queue_handler()]
+        uvicorn_logger.propagate = False
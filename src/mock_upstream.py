@@ -0,0 +1,273 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.0"
+# v0.0.0    initial release
+
+"""
+Local mock upstream server with fault injection, for testing savvy_request_get_async() and /api/ext_api_call
+without network access (in place of live hosts such as httpbin.org).
+
+Start it:
+    python mock_upstream.py --port 9000 --latency exp:50 --error-rate 0.05 --seed 1
+and point the server at it, e.g. with the load test in rest_api_client.py:
+    python rest_api_client.py loadtest --mix ext_api_call=1 --ext-url "http://127.0.0.1:9000/json?latency=bimodal:20:2000:0.02"
+
+Endpoints:
+    GET /json               JSON document.  Behaviour set by the query parameters below (defaults from the command line).
+    GET /redirect/{n}       Redirects n times (302), then serves /json with the same query parameters.
+    GET /stats              Requests served, by status code.
+    GET /reset?seed=N       Clears the statistics and the fail_first counters, and re-seeds the random generator.
+
+Query parameters of /json (all optional):
+    latency=SPEC            Delay before the response headers.  SPEC (milliseconds):
+                                50                  fixed
+                                uniform:10:100      uniform between 10 and 100
+                                exp:50              exponential with mean 50
+                                normal:50:10        normal, mean 50, standard deviation 10 (>= 0)
+                                lognormal:50:0.8    log-normal with median 50 and sigma 0.8 (long tail)
+                                bimodal:20:2000:0.01   20 ms, except 1% of requests take 2000 ms (cold start / hiccup)
+    error_rate=0.1          Fraction of requests answered with an error status.
+    error_codes=429,503     Error statuses to choose from (default 429,500,502,503,504).  429 and 503 include Retry-After.
+    fail_first=N&key=K      The first N requests with key K fail with the first of error_codes, the rest succeed
+                            (deterministic retry tests, independent of the random generator).
+    size=BYTES              Approximate size of the JSON body (list of records), e.g. size=5000000 for 5 MB.
+    drip_ms=MS&chunks=N     Slow-drip body:  sent in N chunks with MS milliseconds between chunks.
+
+With --seed, the sequence of delays and errors is the same on every run (for a given order of requests).
+
+Run a set of scenarios against savvy_request_get_async() (starts the mock server in this process):
+    python mock_upstream.py --scenarios
+"""
+
+from pathlib import Path
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+from time import perf_counter
+# pip install
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+import httpx
+import uvicorn
+
+from log_config import get_logger
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+
+# ----------------------------------------------------------------------
+# Constants
+
+PORT = 9000
+DEFAULT_ERROR_CODES = "429,500,502,503,504"
+
+# Defaults for the /json query parameters (set from the command line)
+defaults = {
+    "latency": "0",
+    "error_rate": 0.0,
+    "error_codes": DEFAULT_ERROR_CODES,
+    "size": 0,
+    "drip_ms": 0.0,
+    "chunks": 1,
+}
+
+rng = random.Random()
+stats = {}
+fail_counters = {}
+
+
+def sample_latency_ms(spec: str) -> float:
+    """Returns a delay in milliseconds drawn from the distribution SPEC (see the description at the top)."""
+    kind, _, args = spec.partition(":")
+    if not args: return float(kind)
+    a = [float(x) for x in args.split(":")]
+    if kind == "uniform": return rng.uniform(a[0], a[1])
+    if kind == "exp": return rng.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+    if kind == "normal": return max(rng.gauss(a[0], a[1]), 0.0)
+    if kind == "lognormal": return rng.lognormvariate(math.log(a[0]), a[1])
+    if kind == "bimodal": return a[1] if rng.random() < a[2] else a[0]
+    raise ValueError(f"Unknown latency distribution '{kind}'")
+
+
+@lru_cache(maxsize=16)
+def get_body(size: int) -> bytes:
+    """A JSON document of about 'size' bytes (cached, the same size is served repeatedly)."""
+    record = {"station": "USW00094728", "date": "2026-01-01", "value": 12.5, "flags": "abc"}
+    n_records = max(size // (len(json.dumps(record)) + 2), 1) if size else 1
+    return json.dumps({"source": "mock_upstream", "count": n_records, "items": [record] * n_records}).encode()
+
+
+def count(status: int):
+    stats[status] = stats.get(status, 0) + 1
+
+
+app = FastAPI(title="Mock Upstream", version=__version__)
+
+
+@app.get("/json")
+async def json_endpoint(request: Request, latency: str = None, error_rate: float = None, error_codes: str = None,
+                        size: int = None, drip_ms: float = None, chunks: int = None, fail_first: int = 0, key: str = "default"):
+    latency = defaults["latency"] if latency is None else latency
+    error_rate = defaults["error_rate"] if error_rate is None else error_rate
+    codes = [int(c) for c in (defaults["error_codes"] if error_codes is None else error_codes).split(",")]
+    size = defaults["size"] if size is None else size
+    drip_ms = defaults["drip_ms"] if drip_ms is None else drip_ms
+    chunks = max(defaults["chunks"] if chunks is None else chunks, 1)
+
+    # Draw all random values up front so the sequence only depends on the order of the requests.
+    delay_ms = sample_latency_ms(latency)
+    error = rng.random() < error_rate
+    code = rng.choice(codes)
+
+    if fail_first:
+        n = fail_counters.get(key, 0)
+        fail_counters[key] = n + 1
+        error, code = n < fail_first, codes[0]
+
+    if delay_ms > 0: await asyncio.sleep(delay_ms / 1000)
+
+    if error:
+        count(code)
+        headers = {"Retry-After": "1"} if code in (429, 503) else None
+        return JSONResponse({"error": f"Injected error {code}"}, status_code=code, headers=headers)
+
+    count(200)
+    body = get_body(size)
+    if drip_ms <= 0 or chunks == 1:
+        return Response(body, media_type="application/json")
+
+    async def drip():
+        step = -(-len(body) // chunks)
+        for i in range(0, len(body), step):
+            if i: await asyncio.sleep(drip_ms / 1000)
+            yield body[i:i + step]
+
+    return StreamingResponse(drip(), media_type="application/json")
+
+
+@app.get("/redirect/{n}")
+async def redirect(request: Request, n: int):
+    count(302)
+    target = f"/redirect/{n - 1}" if n > 1 else "/json"
+    if request.url.query: target += f"?{request.url.query}"
+    return RedirectResponse(target, status_code=302)
+
+
+@app.get("/stats")
+async def get_stats():
+    return {"requests": sum(stats.values()), "status_codes": stats}
+
+
+@app.get("/reset")
+async def reset(seed: int = None):
+    stats.clear()
+    fail_counters.clear()
+    rng.seed(seed)
+    return {"reset": True, "seed": seed}
+
+
+@asynccontextmanager
+async def mock_upstream(port: int = PORT, seed: int = None):
+    """
+    Async context manager that runs the mock upstream in this event loop (no subprocess).
+    Yields the base URL.  Used by run_scenarios() and available to other benchmarks.
+    """
+    rng.seed(seed)
+    stats.clear()
+    fail_counters.clear()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done(): await task      # raises if the port could not be bound
+        await asyncio.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+# ----------------------------------------------------------------------
+# Scenarios for savvy_request_get_async()
+
+# name: (path and query string, requests, concurrency)
+SCENARIOS = {
+    "clean, exp:20 ms": ("/json?latency=exp:20", 200, 20),
+    "tail, bimodal 20/1000 ms 2%": ("/json?latency=bimodal:20:1000:0.02", 200, 20),
+    "10% 503 (retried)": ("/json?latency=exp:20&error_rate=0.1&error_codes=503", 100, 20),
+    "10% 404 (not retried)": ("/json?latency=exp:20&error_rate=0.1&error_codes=404", 100, 20),
+    "fail first 2 (429)": ("/json?fail_first=2&key=s1&error_codes=429", 1, 1),
+    "3 redirects": ("/redirect/3?latency=5", 50, 10),
+    "5 MB payload": ("/json?size=5000000", 10, 2),
+    "slow drip 20 x 50 ms": ("/json?drip_ms=50&chunks=20&size=100000", 20, 10),
+}
+
+
+async def run_scenarios(port: int = PORT, seed: int = 1):
+    """Runs each scenario in SCENARIOS through rest_api_server.savvy_request_get_async() and logs the results."""
+    # Imported here so the mock server itself does not depend on the REST API server.
+    from rest_api_server import savvy_request_get_async
+    # The retry warnings of every request would bury the results.
+    get_logger("rest_api_server").setLevel("CRITICAL")
+
+    async with mock_upstream(port, seed) as base_url:
+        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
+            logger.info(f"{'scenario':30s} {'ok':>5s} {'failed':>6s} {'p50 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+            for name, (path, n_requests, concurrency) in SCENARIOS.items():
+                slots = asyncio.Semaphore(concurrency)
+                latencies = []
+                ok = 0
+
+                async def one():
+                    nonlocal ok
+                    async with slots:
+                        t_start = perf_counter()
+                        response = await savvy_request_get_async(url=f"{base_url}{path}", client=client)
+                        latencies.append(1000*(perf_counter()-t_start))
+                        if response is not None: ok += 1
+
+                await asyncio.gather(*(one() for _ in range(n_requests)))
+                latencies.sort()
+                p99 = latencies[min(int(0.99 * len(latencies)), len(latencies) - 1)]
+                logger.info(f"{name:30s} {ok:5d} {n_requests-ok:6d} {statistics.median(latencies):9.1f} {p99:9.1f} {latencies[-1]:9.1f}")
+            response = await client.get(f"{base_url}/stats")
+            logger.info(f"Mock upstream served: {response.json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock upstream with fault injection (see the description in this script).")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for repeatable delays and errors")
+    parser.add_argument("--latency", default=defaults["latency"], help="Default latency SPEC, e.g. exp:50")
+    parser.add_argument("--error-rate", type=float, default=defaults["error_rate"])
+    parser.add_argument("--error-codes", default=defaults["error_codes"])
+    parser.add_argument("--size", type=int, default=defaults["size"], help="Default body size in bytes")
+    parser.add_argument("--drip-ms", type=float, default=defaults["drip_ms"])
+    parser.add_argument("--chunks", type=int, default=defaults["chunks"])
+    parser.add_argument("--scenarios", action="store_true", help="Run the savvy_request_get_async() scenarios and exit")
+    args = parser.parse_args()
+
+    if args.scenarios:
+        asyncio.run(run_scenarios(args.port, args.seed if args.seed is not None else 1))
+        return
+
+    defaults.update(latency=args.latency, error_rate=args.error_rate, error_codes=args.error_codes,
+                    size=args.size, drip_ms=args.drip_ms, chunks=args.chunks)
+    rng.seed(args.seed)
+    logger.info(f"Mock upstream on http://127.0.0.1:{args.port}  defaults {defaults}  seed {args.seed}")
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,16 @@
 
 # Define the script version in terms of Semantic Versioning (SemVer)
 # when Git or other versioning systems are not employed.
-__version__ = "0.0.1"
+__version__ = "0.0.7"
 # v0.0.0    initial release
 # v0.0.1    
+# v0.0.2    Non-blocking logging (log_config.py).
+# v0.0.3    Load test mode (python rest_api_client.py loadtest ...) with latency percentiles and JSON results.
+# v0.0.4    Batch runner run_batch() (python rest_api_client.py batch ...):  bounded concurrency over HTTP/2, retries, ordered results.
+# v0.0.5    Opt-in hedged requests (Hedger) for idempotent calls, with a budget cap.  loadtest --hedge.
+# v0.0.6    decode_nested_json() iterative, only parses strings that look like JSON, depth and size limits.  
+#           JsonStreamDecoder / stream_decode_nested_json() for huge responses.  python rest_api_client.py bench-decode
+# v0.0.7    loadtest --sweep (throughput versus concurrency) and recommend (Cloud Run concurrency / instance settings).
 
 """
 
@@ -21,6 +28,67 @@ This script implements FastAPI, which is built on an ASGI (Asynchronous Server G
 This whole ecosystem is asynchronous.  FastAPI is smart enough to detect a synchronous function and to prevent it from blocking the main asynchronous event loop.  
 
 
+Load Test
+    python rest_api_client.py loadtest --mix calculator=8,healthz=2 --concurrency 32 --duration 30 --out results.json
+    python rest_api_client.py loadtest --gateway-host my-gateway-###.uk.gateway.dev --api-key ### --rps 50
+Sends a weighted mix of the endpoints in LOAD_TEST_ENDPOINTS from one shared httpx.AsyncClient (one connection pool) 
+and reports the throughput, the error rate and the p50 / p90 / p99 / p99.9 latency, overall and per endpoint.
+- --concurrency N (closed loop):  N workers each send the next request as soon as the previous one completes.
+- --rps R (open loop):  requests are started on a fixed schedule of R per second, with up to --concurrency in flight.
+  Latency is measured from the scheduled start time, so time spent waiting for a free slot when the server falls 
+  behind is included (no "coordinated omission").
+- --base-url (default BASE_URL, e.g. localhost) or --gateway-host (https://GATEWAY_HOST, API key as ?key=).
+- --out writes the results as JSON.  --compare baseline.json logs the change from an earlier result.
+- --warmup seconds of requests are sent first and not recorded (connection setup, Cloud Run cold start).
+
+
+Cloud Run Settings from a Concurrency Sweep
+    python rest_api_client.py loadtest --sweep 1,2,4,8,16,32,64 --duration 20 --warmup 5 --out sweep.json
+    python rest_api_client.py recommend sweep.json --p99-target 500 --peak-rps 200 --base-rps 5
+The sweep runs the closed loop load test once per concurrency and reports the throughput versus concurrency.
+Test ONE instance with the CPU / memory it will be deployed with (a Cloud Run revision deployed with 
+--max-instances 1, or the container locally with 'docker run --cpus 1 --memory 1g'), otherwise the throughput 
+of several instances is measured.  recommend (see recommend_run_settings()) picks:
+- GCP_RUN_CONCURRENCY:  the lowest concurrency that reaches RECOMMEND_KNEE (90%) of the peak throughput, among the 
+  points within the error rate and p99 limits.  More requests in flight per instance beyond that point mostly 
+  add queueing delay, not throughput.
+- GCP_RUN_MAX_INSTANCES:  the instances needed for --peak-rps at that throughput per instance, plus RECOMMEND_HEADROOM.
+- GCP_RUN_MIN_INSTANCES:  the instances kept warm for the steady --base-rps (0 = scale to zero, with cold starts).
+The printed lines go into gcp_constants.txt, where they override the flags of GCP_RUN_PERFORMANCE_PROFILE.
+
+
+Batch Runner
+    python rest_api_client.py batch --input jobs.jsonl --output results.jsonl --concurrency 32
+run_batch() runs an iterable of jobs (calculator and ext_api_call) with at most 'concurrency' requests in flight 
+and yields the results in the order of the jobs, as soon as each result (and all before it) is available.
+One job per line of the input file:
+    {"tool": "calculator", "num1": 5.5, "num2": 10.2, "operation": "add"}
+    {"tool": "ext_api_call", "url": "https://httpbin.org/json"}
+One result per line of the output file:
+    {"index": 0, "tool": "calculator", "status": 200, "result": {...}, "error": null, "attempts": 1, "latency_ms": 12.3}
+- The jobs are read lazily and at most BATCH_WINDOW * concurrency results are held, so batches of any size 
+  run in constant memory.
+- 429 (Too Many Requests) and 503 (Service Unavailable, e.g. Cloud Run scaling up) and connection errors are retried 
+  up to BATCH_RETRIES times with exponential backoff and full jitter (honouring Retry-After), so the retries of many 
+  concurrent jobs are spread out rather than arriving together.
+- Progress (jobs done, jobs/s, failures, retries, estimated time remaining) is logged every BATCH_PROGRESS_SECONDS.
+- HTTP/2 (pip install httpx[http2]) multiplexes all the requests over one TLS connection to Cloud Run or the 
+  API Gateway instead of opening 'concurrency' connections.  Without the 'h2' package, HTTP/1.1 is used 
+  (with a pool of 'concurrency' keep-alive connections).  Plain http:// (localhost) always uses HTTP/1.1.
+
+
+Hedged Requests
+A Cloud Run cold start or a Gateway hiccup makes an occasional request take seconds instead of milliseconds.
+With a Hedger (opt-in, HEDGE_REQUESTS or loadtest --hedge), an idempotent request (GET status, calculator) that has 
+not been answered after the hedge delay is sent a second time, and the first response wins (the other is cancelled).
+- The hedge delay is the HEDGE_PERCENTILE (default p95) of the recent latencies, so only the slowest ~5% of 
+  requests are hedged.
+- Budget cap:  hedges may add at most HEDGE_BUDGET (default 5%) extra requests.  Each request earns 'budget' 
+  hedge credit and each hedge spends 1, so when the whole server is slow (and every request would be hedged) 
+  the hedges stop instead of doubling the load.
+- Never for requests with side effects or that are expensive to repeat (ext_api_call calls an external API).
+hedger.stats reports the requests, hedges sent, hedges that won, and hedges skipped for lack of budget.
+
 """
 
 from pathlib import Path
@@ -29,6 +97,13 @@ import httpx
 import asyncio
 import sys
 import json
+import random
+import time
+import argparse
+import math
+from collections import deque
+from datetime import datetime, timezone
+from importlib.util import find_spec
 
 
 # ---------------------------------------------------------------------------
@@ -39,30 +114,14 @@ import json
 # By default, print() goes to stdout. Depending on the environment, the Python root logger might be sending logs to stderr. 
 # You can set an Environment Variable in Cloud Run LOG_LEVEL=WARNING. Even if the code is full of logger.info() calls, they will be discarded instantly by the logger and never sent to Google Cloud
 # While Cloud Run captures both print() and logger, they are often processed by different buffers.
-# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error). The python-json-logger uses levelname by default.
+# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error).
 
-# Install with: pip install python-json-logger
-import logging
+# log_config writes through a queue to a background thread, so logging never blocks the event loop.
+# JSON with "severity" on Cloud Run, [LEVEL] message locally.  See log_config.py for LOG_LEVEL, LOG_FORMAT and LOG_RATE_LIMIT.
+from log_config import get_logger
 
 # Use a named logger
-logger = logging.getLogger(Path(__file__).stem)
-logger.setLevel(logging.INFO)
-
-# Setup a standard Text Handler (Not JSON)
-# This is what gcloud CLI "pretty prints" best.
-if not logger.handlers:
-    # Cloud Run captures everything on stdout
-    logHandler = logging.StreamHandler(sys.stdout)
-    
-    # Use a clean, classic format: [LEVEL] Message
-    # This format is highly readable in both the CLI and the Console.
-    formatter = logging.Formatter('[%(levelname)s] %(message)s')
-    logHandler.setFormatter(formatter)
-    
-    logger.addHandler(logHandler)
-
-# Prevent double-logging
-logger.propagate = False
+logger = get_logger(Path(__file__).stem)
 
 logger.info(f"'{Path(__file__).stem}.py' v{__version__}") 
 # logger.info(), logger.warning(), logger.error()
@@ -71,6 +130,9 @@ logger.info(f"'{Path(__file__).stem}.py' v{__version__}")
 
 DEBUG = True
 
+# Send idempotent requests in main() through a Hedger (see Hedged Requests at the top)
+HEDGE_REQUESTS = False
+
 # __file__ is /app/src/main.py
 # .parent is /app/src
 # .parent.parent is /app
@@ -96,8 +158,38 @@ if DEBUG: logger.info(f"API_KEY: {API_KEY}")
 
 
 
-def decode_nested_json(data):
-    """Recursively parses stringified JSON inside dictionaries or lists.
+# decode_nested_json() limits
+DECODE_MAX_DEPTH = 256                  # deeper containers are left as they are
+DECODE_MAX_STRING = 10_000_000          # longer strings are not parsed (characters)
+# JsonStreamDecoder:  largest single value (characters) held while waiting for the rest of it
+DECODE_MAX_VALUE = 100_000_000
+# A string that may be a JSON object or array starts with one of these
+JSON_FIRST_CHARACTERS = frozenset("{[ \t\r\n")
+
+
+def parse_json_string(text: str, max_string: int = DECODE_MAX_STRING):
+    """
+    Returns the dict or list encoded in 'text', or None if 'text' does not look like a JSON object or array
+    (first and last non-blank characters {} or []), is longer than 'max_string', or is not valid JSON.
+    """
+    if len(text) > max_string: return None
+    # lstrip() / rstrip() return the same string (no copy) when there is nothing to strip.
+    first = text.lstrip()[:1]
+    if first == "{":
+        if text.rstrip()[-1:] != "}": return None
+    elif first == "[":
+        if text.rstrip()[-1:] != "]": return None
+    else:
+        return None
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, RecursionError):
+        # It's just a normal string, leave it alone
+        return None
+
+
+def decode_nested_json(data, max_depth: int = DECODE_MAX_DEPTH, max_string: int = DECODE_MAX_STRING):
+    """Parses stringified JSON objects and arrays inside dictionaries or lists, at any depth.
     
     Usage:
 
@@ -108,34 +200,137 @@ def decode_nested_json(data):
         # Print beautifully
         print(json.dumps(fully_decoded_dict, indent=4))
 
-    
+    Iterative (an explicit stack instead of recursion), so any depth of nesting is handled without reaching
+    the recursion limit.  'data' is not modified, the containers are copied.
+    - Only strings that look like a JSON object or array (see parse_json_string()) are parsed, so the 
+      ordinary strings of a large payload cost a character check rather than a failed json.loads().
+      Strings such as "123" or "true" are left as strings.
+    - Containers deeper than 'max_depth' (counting the levels decoded from strings) are left as they are.
+    - Strings longer than 'max_string' characters are not parsed.
     """
-    if isinstance(data, str):
-        try:
-            parsed = json.loads(data)
-            # If the decoded string is another dict or list, keep digging
-            if isinstance(parsed, (dict, list)):
-                return decode_nested_json(parsed)
-            return parsed
-        except (json.JSONDecodeError, TypeError):
-            # It's just a normal string, leave it alone
-            return data
-    elif isinstance(data, dict):
-        return {k: decode_nested_json(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [decode_nested_json(item) for item in data]
-    else:
-        return data
+    root = [data]
+    # (parent container, key or index, depth of the value, value is a new object that may be modified)
+    stack = [(root, 0, 0, False)]
+    while stack:
+        parent, key, depth, owned = stack.pop()
+        value = parent[key]
+        if isinstance(value, str):
+            parsed = parse_json_string(value, max_string)
+            if parsed is None: continue
+            parent[key] = value = parsed
+            owned = True
+        if depth >= max_depth: continue
+        if isinstance(value, dict):
+            if not owned: parent[key] = value = dict(value)
+            items = value.items()
+        elif isinstance(value, list):
+            if not owned: parent[key] = value = list(value)
+            items = enumerate(value)
+        else:
+            continue
+        # Only containers, and strings that may be JSON, are visited.
+        for k, v in items:
+            if isinstance(v, (dict, list)) or (isinstance(v, str) and v[:1] in JSON_FIRST_CHARACTERS):
+                stack.append((value, k, depth + 1, False))
+    return root[0]
+
+
+class JsonStreamDecoder:
+    """
+    Incremental decoder for a huge JSON response that is a top-level array (or JSON Lines / concatenated 
+    JSON values).  feed() text as it arrives and it returns the values completed so far, each passed
+    through decode_nested_json(), so the whole response is never held in memory, only the value being received.
+
+        decoder = JsonStreamDecoder()
+        for chunk in chunks:
+            for item in decoder.feed(chunk): ...
+        for item in decoder.close(): ...
+    """
+
+    def __init__(self, max_depth: int = DECODE_MAX_DEPTH, max_string: int = DECODE_MAX_STRING, max_value: int = DECODE_MAX_VALUE):
+        self.max_depth = max_depth
+        self.max_string = max_string
+        self.max_value = max_value
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._in_array = None           # None until the first character is seen
+        self._done = False
+        self._retry_at = 0              # buffer length at which an incomplete value is tried again
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        return self._decode(final=False)
+
+    def close(self) -> list:
+        """Returns the last values.  Raises ValueError if the stream ended inside a value or array."""
+        values = self._decode(final=True)
+        if self._buffer.strip() or (self._in_array and not self._done):
+            raise ValueError("JSON stream ended before the end of a value")
+        return values
+
+    def _decode(self, final: bool) -> list:
+        values = []
+        buffer = self._buffer
+        pos = 0
+        if len(buffer) < self._retry_at and not final: return values
+        self._retry_at = 0
+        while not self._done:
+            # Skip white space, and the separators in an array
+            while pos < len(buffer) and (buffer[pos].isspace() or (self._in_array and buffer[pos] == ",")): pos += 1
+            if pos == len(buffer): break
+            if self._in_array is None:
+                self._in_array = buffer[pos] == "["
+                if self._in_array:
+                    pos += 1
+                    continue
+            if self._in_array and buffer[pos] == "]":
+                self._done = True
+                pos += 1
+                break
+            try:
+                value, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final: raise
+                value, end = None, None
+            # A value ending at the end of the buffer may be incomplete (e.g. a number).
+            if end is None or (end == len(buffer) and not final):
+                # A large value is tried again when the buffer has doubled, rather than on every chunk,
+                # so it is not parsed over and over again (quadratic).
+                remaining = len(buffer) - pos
+                if remaining > self.max_value: raise ValueError(f"JSON value larger than {self.max_value} characters")
+                if remaining > 65536: self._retry_at = 2 * remaining
+                break
+            values.append(decode_nested_json(value, self.max_depth, self.max_string))
+            pos = end
+        self._buffer = buffer[pos:]
+        return values
+
+
+async def stream_decode_nested_json(response: httpx.Response, max_depth: int = DECODE_MAX_DEPTH, max_string: int = DECODE_MAX_STRING):
+    """
+    Async generator of the decoded values of a streamed response (a top-level JSON array, or JSON Lines),
+    see JsonStreamDecoder.
+
+        async with client.stream("GET", url) as response:
+            async for item in stream_decode_nested_json(response): ...
+    """
+    decoder = JsonStreamDecoder(max_depth, max_string)
+    async for text in response.aiter_text():
+        for value in decoder.feed(text): yield value
+    for value in decoder.close(): yield value
 
 
-async def get_server_status(client: httpx.AsyncClient, verbose:bool=False) -> bool:
+async def get_server_status(client: httpx.AsyncClient, verbose:bool=False, hedger: "Hedger" = None) -> bool:
     """
     Checks the server status using a shared client. 
     Returns True if the server responds successfully, False otherwise.
     """
     try:
         # We check the OpenAPI spec as a heartbeat
-        response = await client.get(f"{BASE_URL}/openapi.json", timeout=2.0)
+        if hedger:
+            response = await hedger.request(client, "GET", f"{BASE_URL}/openapi.json", timeout=2.0)
+        else:
+            response = await client.get(f"{BASE_URL}/openapi.json", timeout=2.0)
         if response.status_code == 200:
             spec = response.json()
             title = spec.get("info", {}).get("title", "Unknown")
@@ -147,9 +342,10 @@ async def get_server_status(client: httpx.AsyncClient, verbose:bool=False) -> bo
         return False
 
 
-async def run_calculator_tool(client: httpx.AsyncClient, num1: float, num2: float, operation: str = "add"):
+async def run_calculator_tool(client: httpx.AsyncClient, num1: float, num2: float, operation: str = "add", hedger: "Hedger" = None):
     """
     Executes the calculator tool using a shared client.
+    The calculator is idempotent, so it may be hedged (pass a Hedger).
     """
     logger.info(f"--- Executing Tool: {operation} ---")
     
@@ -161,7 +357,10 @@ async def run_calculator_tool(client: httpx.AsyncClient, num1: float, num2: floa
     }
 
     try:
-        response = await client.post(url, json=payload)
+        if hedger:
+            response = await hedger.request(client, "POST", url, json=payload)
+        else:
+            response = await client.post(url, json=payload)
         response.raise_for_status()
         result_data = response.json()
         
@@ -197,27 +396,680 @@ async def run_ext_api_call(client: httpx.AsyncClient, api_url: str = "add"):
 
 
 
+# ----------------------------------------------------------------------
+# Batch runner
+
+# tool: endpoint.  The job, without "tool", is the JSON payload.
+BATCH_TOOLS = {
+    "calculator": "/api/calculator",
+    "ext_api_call": "/api/ext_api_call",
+}
+
+BATCH_RETRY_STATUS = (429, 503)
+BATCH_RETRIES = 5
+BATCH_BACKOFF_BASE = 0.5            # seconds, doubled for each retry
+BATCH_BACKOFF_MAX = 30.0            # seconds
+BATCH_PROGRESS_SECONDS = 10.0
+# Jobs started ahead of the oldest unfinished job, as a multiple of the concurrency.
+# A slow job then does not stall the others while its result is waiting to be yielded in order.
+BATCH_WINDOW = 4
+
+# HTTP/2 support in httpx requires the 'h2' package (pip install httpx[http2])
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+def get_batch_client(concurrency: int = 32, timeout: float = 60.0, api_key: str = None, http2: bool = True) -> httpx.AsyncClient:
+    """
+    Returns an httpx.AsyncClient for run_batch() with a connection pool sized for 'concurrency', using HTTP/2 if 
+    requested and the 'h2' package is installed.  Use it as:  async with get_batch_client(...) as client:
+    """
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed (pip install httpx[http2]).  Using HTTP/1.1.")
+        http2 = False
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(http2=http2, timeout=timeout, limits=limits, params={"key": api_key} if api_key else None, follow_redirects=True)
+
+
+def get_backoff(attempt: int, retry_after: str = None) -> float:
+    """Seconds to wait before retry 'attempt' (1, 2, ...):  full jitter exponential backoff, at least Retry-After."""
+    delay = random.uniform(0, min(BATCH_BACKOFF_MAX, BATCH_BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass            # HTTP-date form, use the backoff
+    return min(delay, BATCH_BACKOFF_MAX)
+
+
+async def run_batch_job(client: httpx.AsyncClient, base_url: str, index: int, job: dict, slots: asyncio.Semaphore, retries: int = BATCH_RETRIES) -> dict:
+    """
+    Runs one job of a batch, retrying 429/503 and connection errors.  A slot of 'slots' is held while a request 
+    is in flight (not while waiting to retry).  Returns the result dict (see the description at the top), 
+    never raises for a failed job.
+    """
+    tool = job.get("tool") if isinstance(job, dict) else None
+    result = {"index": index, "tool": tool, "status": None, "result": None, "error": None, "attempts": 0, "latency_ms": None}
+    if tool not in BATCH_TOOLS:
+        result["error"] = f"Unknown tool '{tool}'.  Use: {', '.join(BATCH_TOOLS)}"
+        return result
+    url = f"{base_url}{BATCH_TOOLS[tool]}"
+    payload = {k: v for k, v in job.items() if k != "tool"}
+
+    t_start = time.perf_counter()
+    for attempt in range(retries + 1):
+        if attempt: await asyncio.sleep(get_backoff(attempt, retry_after))
+        result["attempts"] = attempt + 1
+        retry_after = None
+        try:
+            async with slots:
+                response = await client.post(url, json=payload)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # The request was not sent, safe to retry.
+            result["status"], result["error"] = None, f"{type(e).__name__}: {e}"
+            continue
+        except httpx.HTTPError as e:
+            result["status"], result["error"] = None, f"{type(e).__name__}: {e}"
+            break
+        result["status"] = response.status_code
+        if response.status_code in BATCH_RETRY_STATUS:
+            result["error"] = f"HTTP {response.status_code}"
+            retry_after = response.headers.get("retry-after")
+            continue
+        try:
+            result["result"] = response.json()
+        except ValueError:
+            result["result"] = response.text
+        result["error"] = None if response.is_success else f"HTTP {response.status_code}"
+        break
+    result["latency_ms"] = round(1000*(time.perf_counter()-t_start), 3)
+    return result
+
+
+async def run_batch(client: httpx.AsyncClient, base_url: str, jobs, concurrency: int = 32, retries: int = BATCH_RETRIES,
+                    total: int = None, progress_s: float = BATCH_PROGRESS_SECONDS):
+    """
+    Async generator that runs 'jobs' (an iterable of job dicts, read lazily) against 'base_url' with at most 
+    'concurrency' requests in flight on the shared 'client', and yields the result of each job in the order 
+    of the jobs.  'total' (default len(jobs) if available) is only used for the progress log.
+
+        async with get_batch_client(concurrency=32) as client:
+            async for result in run_batch(client, BASE_URL, jobs, concurrency=32):
+                ...
+    """
+    if total is None and hasattr(jobs, "__len__"): total = len(jobs)
+    jobs = enumerate(jobs)
+    slots = asyncio.Semaphore(concurrency)
+    window = deque()
+    window_size = BATCH_WINDOW * concurrency
+    done = failed = retried = 0
+    t_start = t_progress = time.perf_counter()
+
+    def fill():
+        while len(window) < window_size:
+            item = next(jobs, None)
+            if item is None: return
+            index, job = item
+            window.append(asyncio.create_task(run_batch_job(client, base_url, index, job, slots, retries)))
+
+    def log_progress():
+        elapsed = time.perf_counter() - t_start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        of_total = f"/{total} ({100*done/total:.1f}%)" if total else ""
+        eta = f", {(total-done)/rate:.0f} s remaining" if total and rate > 0 else ""
+        logger.info(f"Batch: {done}{of_total} done, {rate:.1f} jobs/s, {failed} failed, {retried} retries{eta}")
+
+    try:
+        fill()
+        while window:
+            result = await window.popleft()
+            fill()
+            done += 1
+            retried += result["attempts"] - 1 if result["attempts"] else 0
+            if result["error"]: failed += 1
+            if progress_s and time.perf_counter() - t_progress >= progress_s:
+                t_progress = time.perf_counter()
+                log_progress()
+            yield result
+        log_progress()
+    finally:
+        # The consumer stopped early (or an error):  cancel the jobs started ahead.
+        for task in window: task.cancel()
+        if window: await asyncio.gather(*window, return_exceptions=True)
+
+
+def read_jobs(path: str):
+    """Yields the jobs in the JSON Lines file 'path' (one job per line, blank lines skipped)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip(): yield json.loads(line)
+
+
+async def main_batch(args):
+    base_url = f"https://{args.gateway_host}" if args.gateway_host else args.base_url.rstrip("/")
+    with open(args.input, "r", encoding="utf-8") as f:
+        total = sum(1 for line in f if line.strip())
+    logger.info(f"Batch {args.input}: {total} jobs  {base_url}  concurrency {args.concurrency}")
+
+    async with get_batch_client(args.concurrency, args.timeout, args.api_key or API_KEY, http2=not args.http1) as client:
+        with open(args.output, "w", encoding="utf-8") as f:
+            async for result in run_batch(client, base_url, read_jobs(args.input), concurrency=args.concurrency,
+                                          retries=args.retries, total=total, progress_s=args.progress):
+                f.write(json.dumps(result) + "\n")
+    logger.info(f"Results written to {args.output}")
+
+
+# ----------------------------------------------------------------------
+# Hedged requests
+
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05                 # at most 5% extra requests
+HEDGE_INITIAL_DELAY = 0.5           # seconds, until HEDGE_MIN_SAMPLES latencies have been seen
+HEDGE_MIN_DELAY = 0.01              # seconds
+HEDGE_MAX_DELAY = 5.0               # seconds
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 1000                 # recent latencies the delay is computed from
+HEDGE_MAX_CREDIT = 10.0             # hedges that can be sent in a burst
+
+
+class Hedger:
+    """
+    Sends a second copy of an idempotent request if the first has not been answered after the hedge delay
+    (the 'percentile' of recent latencies), and returns the first response.  Hedges are limited to 'budget'
+    extra requests per request.  One Hedger can be shared by any number of concurrent requests.
+    See Hedged Requests at the top of this script.
+    """
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, budget: float = HEDGE_BUDGET, initial_delay: float = HEDGE_INITIAL_DELAY,
+                 min_delay: float = HEDGE_MIN_DELAY, max_delay: float = HEDGE_MAX_DELAY):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = initial_delay
+        self.latencies = deque(maxlen=HEDGE_WINDOW)
+        self.credit = 1.0
+        self.stats = {"requests": 0, "hedged": 0, "hedge_won": 0, "no_budget": 0}
+
+    def record(self, latency: float):
+        """Adds a latency (seconds) and, every few requests, updates the hedge delay."""
+        self.latencies.append(latency)
+        if len(self.latencies) >= HEDGE_MIN_SAMPLES and self.stats["requests"] % 10 == 0:
+            delay = percentile(sorted(self.latencies), self.percentile)
+            self.delay = min(max(delay, self.min_delay), self.max_delay)
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        """client.request(method, url, **kwargs), hedged.  Only use for idempotent requests."""
+        self.stats["requests"] += 1
+        self.credit = min(self.credit + self.budget, HEDGE_MAX_CREDIT)
+        t_start = time.perf_counter()
+        primary = asyncio.create_task(client.request(method, url, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.delay)
+        if done or self.credit < 1.0:
+            if not done: self.stats["no_budget"] += 1
+            response = await primary
+            self.record(time.perf_counter() - t_start)
+            return response
+
+        self.credit -= 1.0
+        self.stats["hedged"] += 1
+        hedge = asyncio.create_task(client.request(method, url, **kwargs))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A successful copy first.  A failed copy only counts if the other one fails too.
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    if task.exception() is not None and pending: continue
+                    if task is hedge and task.exception() is None: self.stats["hedge_won"] += 1
+                    # The latency seen by the caller, not that of either copy.
+                    self.record(time.perf_counter() - t_start)
+                    return task.result()
+        finally:
+            for task in pending: task.cancel()
+
+
+# ----------------------------------------------------------------------
+# Load test
+
+# name: (method, path, JSON payload).  "{ext_url}" is replaced by the --ext-url option.
+LOAD_TEST_ENDPOINTS = {
+    "healthz": ("GET", "/healthz", None),
+    "status": ("GET", "/openapi.json", None),
+    "calculator": ("POST", "/api/calculator", {"num1": 5.5, "num2": 10.2, "operation": "add"}),
+    "ext_api_call": ("POST", "/api/ext_api_call", {"url": "{ext_url}"}),
+}
+
+LOAD_TEST_PERCENTILES = (50, 90, 99, 99.9)
+# recommend:  fraction of the peak throughput that the recommended concurrency must reach, the highest error 
+# rate accepted, and the spare capacity added to the instances needed for the peak load.
+RECOMMEND_KNEE = 0.9
+RECOMMEND_MAX_ERROR_RATE = 0.01
+RECOMMEND_HEADROOM = 1.3
+# Endpoints that are idempotent and may be hedged (loadtest --hedge)
+HEDGE_ENDPOINTS = ("healthz", "status", "calculator")
+
+
+def parse_mix(mix: str) -> dict:
+    """Parses "calculator=8,healthz=2" into {"calculator": 8.0, "healthz": 2.0}."""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in LOAD_TEST_ENDPOINTS: raise ValueError(f"Unknown endpoint '{name}' in mix. Use: {', '.join(LOAD_TEST_ENDPOINTS)}")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile 'p' (0..100) of the already sorted list."""
+    if not sorted_values: return None
+    rank = max(int(-(-p * len(sorted_values) // 100)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list, status_codes: dict, errors: dict, elapsed: float) -> dict:
+    """Throughput, error rate and latency percentiles (ms) of one set of requests."""
+    latencies = sorted(latencies)
+    n_requests = len(latencies)
+    n_errors = sum(errors.values()) + sum(n for code, n in status_codes.items() if int(code) >= 400)
+    summary = {
+        "requests": n_requests,
+        "throughput_rps": round(n_requests / elapsed, 2) if elapsed > 0 else None,
+        "error_rate": round(n_errors / n_requests, 5) if n_requests else None,
+        "status_codes": dict(sorted(status_codes.items())),
+        "errors": errors,
+        "latency_ms": {f"p{p:g}": round(percentile(latencies, p), 3) if latencies else None for p in LOAD_TEST_PERCENTILES},
+    }
+    if latencies:
+        summary["latency_ms"]["mean"] = round(sum(latencies) / n_requests, 3)
+        summary["latency_ms"]["max"] = round(latencies[-1], 3)
+    return summary
+
+
+async def load_test(client: httpx.AsyncClient, base_url: str, mix: dict, duration_s: float = 30.0, rps: float = None,
+                    concurrency: int = 32, warmup_s: float = 0.0, ext_url: str = "https://httpbin.org/json", hedger: Hedger = None) -> dict:
+    """
+    Sends the weighted endpoint 'mix' to 'base_url' for 'duration_s' seconds with the shared 'client'.
+    Closed loop with 'concurrency' workers, or open loop at 'rps' requests per second (at most 'concurrency'
+    in flight) if 'rps' is given.  Returns the results (see summarize()) overall and per endpoint.
+    With a 'hedger', the HEDGE_ENDPOINTS requests are hedged.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    requests = {}
+    for name in names:
+        method, path, payload = LOAD_TEST_ENDPOINTS[name]
+        if payload is not None: payload = json.loads(json.dumps(payload).replace("{ext_url}", ext_url))
+        requests[name] = (method, f"{base_url}{path}", payload)
+
+    latencies = {name: [] for name in names}
+    status_codes = {name: {} for name in names}
+    errors = {name: {} for name in names}
+    recording = False
+
+    async def send(name: str, t_scheduled: float):
+        method, url, payload = requests[name]
+        try:
+            if hedger and name in HEDGE_ENDPOINTS:
+                response = await hedger.request(client, method, url, json=payload)
+            else:
+                response = await client.request(method, url, json=payload)
+            await response.aread()
+            outcome = str(response.status_code)
+        except httpx.HTTPError as e:
+            outcome = None
+            error = type(e).__name__
+        if not recording: return
+        latencies[name].append(1000*(time.perf_counter()-t_scheduled))
+        if outcome is None:
+            errors[name][error] = errors[name].get(error, 0) + 1
+        else:
+            status_codes[name][outcome] = status_codes[name].get(outcome, 0) + 1
+
+    async def closed_loop(deadline: float):
+        async def worker():
+            while time.perf_counter() < deadline:
+                await send(random.choices(names, weights)[0], time.perf_counter())
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(deadline: float):
+        slots = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def scheduled(name: str, t_scheduled: float):
+            async with slots:
+                await send(name, t_scheduled)
+
+        t_next = time.perf_counter()
+        while t_next < deadline:
+            delay = t_next - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+            task = asyncio.create_task(scheduled(random.choices(names, weights)[0], t_next))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            t_next += 1.0 / rps
+        if tasks: await asyncio.gather(*tasks)
+
+    run = closed_loop if rps is None else open_loop
+    if warmup_s > 0:
+        logger.info(f"Warm up {warmup_s} s")
+        await run(time.perf_counter() + warmup_s)
+
+    logger.info(f"Load test {base_url}  mix {mix}  {'rps ' + str(rps) if rps else 'closed loop'}  concurrency {concurrency}  duration {duration_s} s")
+    if hedger:
+        # Count the hedges of the recorded requests only (the delay learned during the warm up is kept).
+        hedger.stats = dict.fromkeys(hedger.stats, 0)
+    recording = True
+    t_start = time.perf_counter()
+    await run(t_start + duration_s)
+    elapsed = time.perf_counter() - t_start
+    recording = False
+
+    all_status = {}
+    all_errors = {}
+    for name in names:
+        for code, n in status_codes[name].items(): all_status[code] = all_status.get(code, 0) + n
+        for error, n in errors[name].items(): all_errors[error] = all_errors.get(error, 0) + n
+    results = {
+        "config": {"base_url": base_url, "mix": mix, "rps": rps, "concurrency": concurrency, "duration_s": duration_s, "warmup_s": warmup_s,
+                   "hedge": {"percentile": hedger.percentile, "budget": hedger.budget} if hedger else None},
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "client_version": __version__,
+        "elapsed_s": round(elapsed, 3),
+        **summarize([l for name in names for l in latencies[name]], all_status, all_errors, elapsed),
+        "endpoints": {name: summarize(latencies[name], status_codes[name], errors[name], elapsed) for name in names},
+    }
+    if hedger: results["hedge"] = {**hedger.stats, "delay_ms": round(1000*hedger.delay, 3)}
+    return results
+
+
+def log_load_test_results(results: dict, baseline: dict = None):
+    """Logs the results table, and the change from 'baseline' (an earlier results dict) if given."""
+    def row(label: str, r: dict) -> str:
+        lat = r["latency_ms"]
+        return (f"{label:14s} {r['requests']:8d} {r['throughput_rps'] or 0:10.1f} {100*(r['error_rate'] or 0):7.2f}% " +
+                " ".join(f"{lat[k] if lat[k] is not None else float('nan'):9.1f}" for k in ("p50", "p90", "p99", "p99.9")))
+
+    logger.info(f"{'endpoint':14s} {'requests':>8s} {'req/s':>10s} {'errors':>8s} {'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'p99.9 ms':>9s}")
+    for name, r in results["endpoints"].items(): logger.info(row(name, r))
+    logger.info(row("ALL", results))
+    if results.get("hedge"): logger.info(f"Hedging: {results['hedge']}")
+
+    if baseline:
+        for key in ("p50", "p99", "p99.9"):
+            old, new = baseline["latency_ms"].get(key), results["latency_ms"].get(key)
+            if old and new: logger.info(f"{key:6s} {old:9.1f} ms -> {new:9.1f} ms  ({100*(new-old)/old:+.1f}%)")
+        old, new = baseline.get("throughput_rps"), results.get("throughput_rps")
+        if old and new: logger.info(f"req/s  {old:9.1f}    -> {new:9.1f}     ({100*(new-old)/old:+.1f}%)")
+
+
+async def main_load_test(args):
+    base_url = f"https://{args.gateway_host}" if args.gateway_host else args.base_url.rstrip("/")
+    api_key = args.api_key or API_KEY
+    sweep = [int(c) for c in args.sweep.split(",")] if args.sweep else None
+    if sweep and args.rps: raise ValueError("--sweep runs closed loop tests, it cannot be combined with --rps")
+    max_concurrency = max(sweep) if sweep else args.concurrency
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    # One shared client (connection pool) for all requests.  The API key is only needed through the Gateway.
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits, params={"key": api_key} if api_key else None, follow_redirects=True) as client:
+        hedger = Hedger(percentile=args.hedge_percentile, budget=args.hedge_budget) if args.hedge else None
+        if sweep:
+            runs = []
+            for concurrency in sweep:
+                runs.append(await load_test(client, base_url, parse_mix(args.mix), duration_s=args.duration, concurrency=concurrency,
+                                            warmup_s=args.warmup, ext_url=args.ext_url, hedger=hedger))
+            results = {"sweep": runs}
+        else:
+            results = await load_test(client, base_url, parse_mix(args.mix), duration_s=args.duration, rps=args.rps,
+                                      concurrency=args.concurrency, warmup_s=args.warmup, ext_url=args.ext_url, hedger=hedger)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    if sweep:
+        log_sweep_points(get_sweep_points([results]))
+    else:
+        log_load_test_results(results, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.out}")
+    return results
+
+
+# ----------------------------------------------------------------------
+# Cloud Run settings from the throughput versus concurrency (see the description at the top)
+
+def get_sweep_points(results_list: list) -> list:
+    """
+    Returns [{"concurrency", "throughput_rps", "p50_ms", "p99_ms", "error_rate"}, ...] sorted by concurrency from a
+    list of load test results:  'loadtest --sweep' results ({"sweep": [...]}) and / or single closed loop runs
+    (--out) at different --concurrency.  Open loop runs (--rps) are skipped (their concurrency is only a limit).
+    """
+    points = {}
+    for results in results_list:
+        for r in results.get("sweep", [results]):
+            if r["config"].get("rps"): continue
+            concurrency = r["config"]["concurrency"]
+            points[concurrency] = {"concurrency": concurrency, "throughput_rps": r["throughput_rps"] or 0.0,
+                                   "p50_ms": r["latency_ms"]["p50"], "p99_ms": r["latency_ms"]["p99"], "error_rate": r["error_rate"] or 0.0}
+    return [points[c] for c in sorted(points)]
+
+
+def log_sweep_points(points: list):
+    logger.info(f"{'concurrency':>11s} {'req/s':>10s} {'p50 ms':>9s} {'p99 ms':>9s} {'errors':>8s}")
+    for p in points:
+        logger.info(f"{p['concurrency']:11d} {p['throughput_rps']:10.1f} {p['p50_ms'] or float('nan'):9.1f} "
+                    f"{p['p99_ms'] or float('nan'):9.1f} {100*p['error_rate']:7.2f}%")
+
+
+def recommend_run_settings(points: list, p99_target_ms: float = None, max_error_rate: float = RECOMMEND_MAX_ERROR_RATE,
+                           knee: float = RECOMMEND_KNEE, peak_rps: float = None, base_rps: float = 0.0,
+                           headroom: float = RECOMMEND_HEADROOM) -> dict:
+    """
+    Recommends the Cloud Run concurrency and instance settings from the load test 'points' of one instance
+    (see get_sweep_points()).
+    The points with an error rate above 'max_error_rate' or a p99 latency above 'p99_target_ms' are not used.
+    concurrency:    the lowest concurrency that reaches 'knee' of the peak throughput of the remaining points.
+    max_instances:  'peak_rps' * 'headroom' / the throughput per instance at that concurrency (None without 'peak_rps').
+    min_instances:  'base_rps' / the throughput per instance (0 without 'base_rps').
+    Raises ValueError if no point is within the limits.
+    """
+    usable = [p for p in points if p["error_rate"] <= max_error_rate and p["throughput_rps"] > 0 and
+              (p99_target_ms is None or (p["p99_ms"] is not None and p["p99_ms"] <= p99_target_ms))]
+    if not usable:
+        raise ValueError(f"No load test point has an error rate <= {max_error_rate} and p99 <= {p99_target_ms} ms.  "
+                         f"Test lower concurrencies or relax the limits.")
+    peak = max(p["throughput_rps"] for p in usable)
+    best = next(p for p in usable if p["throughput_rps"] >= knee * peak)
+    per_instance = best["throughput_rps"]
+    return {
+        "concurrency": best["concurrency"],
+        "throughput_rps": per_instance,
+        "p99_ms": best["p99_ms"],
+        "peak_throughput_rps": peak,
+        "peak_concurrency": next(p["concurrency"] for p in usable if p["throughput_rps"] == peak),
+        "min_instances": math.ceil(base_rps / per_instance) if base_rps else 0,
+        "max_instances": max(math.ceil(headroom * peak_rps / per_instance), 1) if peak_rps else None,
+    }
+
+
+def main_recommend(args):
+    results_list = []
+    for path in args.results:
+        with open(path, "r", encoding="utf-8") as f:
+            results_list.append(json.load(f))
+    points = get_sweep_points(results_list)
+    if not points: raise ValueError("No closed loop load test results found (use loadtest --sweep or --concurrency, without --rps)")
+    log_sweep_points(points)
+
+    r = recommend_run_settings(points, p99_target_ms=args.p99_target, max_error_rate=args.max_error_rate, knee=args.knee,
+                               peak_rps=args.peak_rps, base_rps=args.base_rps, headroom=args.headroom)
+    logger.info(f"Peak {r['peak_throughput_rps']:.1f} req/s per instance at concurrency {r['peak_concurrency']}.  "
+                f"Concurrency {r['concurrency']} reaches {100*r['throughput_rps']/r['peak_throughput_rps']:.0f}% of it "
+                f"({r['throughput_rps']:.1f} req/s, p99 {r['p99_ms']:.1f} ms).")
+    lines = [f"GCP_RUN_CONCURRENCY={r['concurrency']}", f"GCP_RUN_MIN_INSTANCES={r['min_instances']}"]
+    if r["max_instances"] is None:
+        logger.info("Give --peak-rps (the highest expected requests/s) to size GCP_RUN_MAX_INSTANCES.")
+    else:
+        lines.append(f"GCP_RUN_MAX_INSTANCES={r['max_instances']}")
+    logger.info("Recommended settings for gcp_constants.txt:\n" + "\n".join(lines))
+    return r
+
+
+# ----------------------------------------------------------------------
+# decode_nested_json() benchmark
+
+def decode_nested_json_recursive(data):
+    """The previous recursive implementation of decode_nested_json(), for comparison in bench_decode_nested_json()."""
+    if isinstance(data, str):
+        try:
+            parsed = json.loads(data)
+            if isinstance(parsed, (dict, list)):
+                return decode_nested_json_recursive(parsed)
+            return parsed
+        except (json.JSONDecodeError, TypeError):
+            return data
+    elif isinstance(data, dict):
+        return {k: decode_nested_json_recursive(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [decode_nested_json_recursive(item) for item in data]
+    else:
+        return data
+
+
+def get_decode_documents() -> dict:
+    """name: document, for bench_decode_nested_json()."""
+    record = {"station": "USW00094728", "date": "2026-01-01", "name": "NY CITY CENTRAL PARK", "value": 12.5,
+              "flags": "T,,7", "attributes": json.dumps({"quality": "ok", "source": ["7", "W"]})}
+    wide = {"count": 50_000, "items": [dict(record, id=i) for i in range(50_000)]}
+
+    # Each level is stored as a string in the level above (the escaping doubles the size per level).
+    stringified = {"value": 1}
+    for _ in range(8): stringified = {"payload": json.dumps(stringified), "note": "nested"}
+
+    deep = []
+    for _ in range(5_000): deep = [deep, "text"]
+
+    return {"wide 50k records": wide, "stringified 8 levels": stringified, "deep 5000 levels": deep,
+            "wide as one string": {"body": json.dumps(wide)}}
+
+
+def bench_decode_nested_json(repeat: int = 3):
+    """Logs the best time of 'repeat' runs of decode_nested_json() and the previous recursive version per document."""
+    logger.info(f"{'document':24s} {'recursive ms':>13s} {'iterative ms':>13s}")
+    for name, document in get_decode_documents().items():
+        times = {}
+        for label, func in (("recursive", decode_nested_json_recursive), ("iterative", lambda d: decode_nested_json(d, max_depth=100_000))):
+            best = None
+            for _ in range(repeat):
+                t_start = time.perf_counter()
+                try:
+                    func(document)
+                except RecursionError:
+                    best = "RecursionError"
+                    break
+                elapsed = 1000*(time.perf_counter()-t_start)
+                best = elapsed if best is None else min(best, elapsed)
+            times[label] = best if isinstance(best, str) else f"{best:.1f}"
+        logger.info(f"{name:24s} {times['recursive']:>13s} {times['iterative']:>13s}")
+
+    # Streaming:  the 'wide' document as a response arriving in 64 KB chunks
+    text = json.dumps(get_decode_documents()["wide 50k records"]["items"])
+    t_start = time.perf_counter()
+    decoder = JsonStreamDecoder()
+    n_items = 0
+    for i in range(0, len(text), 65536): n_items += len(decoder.feed(text[i:i + 65536]))
+    n_items += len(decoder.close())
+    logger.info(f"JsonStreamDecoder: {n_items} items from {len(text)/1e6:.1f} MB in 64 KB chunks in {1000*(time.perf_counter()-t_start):.1f} ms")
+
+
+def get_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Client for the REST API server.  Without a command, runs the example calls in main().")
+    commands = parser.add_subparsers(dest="command")
+
+    lt = commands.add_parser("loadtest", help="Load test with a mix of endpoints and report latency percentiles.")
+    lt.add_argument("--base-url", default=BASE_URL, help=f"Server URL (default {BASE_URL})")
+    lt.add_argument("--gateway-host", default=None, help="API Gateway host name (overrides --base-url, uses https)")
+    lt.add_argument("--api-key", default=None, help="API key sent as ?key= (default API_KEY)")
+    lt.add_argument("--mix", default="calculator=8,healthz=2", help=f"Weighted endpoints, e.g. calculator=8,healthz=2.  Endpoints: {', '.join(LOAD_TEST_ENDPOINTS)}")
+    lt.add_argument("--rps", type=float, default=None, help="Target requests per second (open loop).  Default: closed loop")
+    lt.add_argument("--concurrency", type=int, default=32, help="Workers (closed loop) or maximum requests in flight (open loop)")
+    lt.add_argument("--duration", type=float, default=30.0, help="Seconds recorded")
+    lt.add_argument("--warmup", type=float, default=0.0, help="Seconds sent first and not recorded")
+    lt.add_argument("--timeout", type=float, default=60.0, help="Request timeout in seconds")
+    lt.add_argument("--ext-url", default="https://httpbin.org/json", help="URL fetched by the ext_api_call endpoint")
+    lt.add_argument("--out", default=None, help="Write the results as JSON to this file")
+    lt.add_argument("--compare", default=None, help="Earlier results JSON file to compare against")
+    lt.add_argument("--hedge", action="store_true", help=f"Hedge the idempotent requests ({', '.join(HEDGE_ENDPOINTS)})")
+    lt.add_argument("--hedge-percentile", type=float, default=HEDGE_PERCENTILE, help="Hedge after this percentile of recent latencies")
+    lt.add_argument("--hedge-budget", type=float, default=HEDGE_BUDGET, help="Maximum extra requests as a fraction, e.g. 0.05")
+    lt.add_argument("--sweep", default=None, help="Closed loop test at each concurrency, e.g. 1,2,4,8,16,32 (throughput versus concurrency)")
+
+    rc = commands.add_parser("recommend", help="Recommend Cloud Run concurrency and instance settings from load test results.")
+    rc.add_argument("results", nargs="+", help="loadtest --out JSON files (a --sweep, or runs at different --concurrency)")
+    rc.add_argument("--p99-target", type=float, default=None, help="Highest acceptable p99 latency in ms")
+    rc.add_argument("--max-error-rate", type=float, default=RECOMMEND_MAX_ERROR_RATE, help="Highest acceptable error rate, e.g. 0.01")
+    rc.add_argument("--knee", type=float, default=RECOMMEND_KNEE, help="Fraction of the peak throughput to reach, e.g. 0.9")
+    rc.add_argument("--peak-rps", type=float, default=None, help="Highest expected requests/s (sizes GCP_RUN_MAX_INSTANCES)")
+    rc.add_argument("--base-rps", type=float, default=0.0, help="Steady requests/s served by warm instances (sizes GCP_RUN_MIN_INSTANCES)")
+    rc.add_argument("--headroom", type=float, default=RECOMMEND_HEADROOM, help="Spare capacity factor for the peak, e.g. 1.3")
+
+    bt = commands.add_parser("batch", help="Run a file of calculator / ext_api_call jobs concurrently, results in order.")
+    bt.add_argument("--input", required=True, help="JSON Lines file, one job per line")
+    bt.add_argument("--output", required=True, help="JSON Lines file for the results (in the order of the jobs)")
+    bt.add_argument("--base-url", default=BASE_URL, help=f"Server URL (default {BASE_URL})")
+    bt.add_argument("--gateway-host", default=None, help="API Gateway host name (overrides --base-url, uses https)")
+    bt.add_argument("--api-key", default=None, help="API key sent as ?key= (default API_KEY)")
+    bt.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    bt.add_argument("--retries", type=int, default=BATCH_RETRIES, help="Retries of a job after 429 / 503 / connection errors")
+    bt.add_argument("--timeout", type=float, default=60.0, help="Request timeout in seconds")
+    bt.add_argument("--progress", type=float, default=BATCH_PROGRESS_SECONDS, help="Seconds between progress log lines")
+    bt.add_argument("--http1", action="store_true", help="Do not use HTTP/2")
+
+    commands.add_parser("bench-decode", help="Benchmark decode_nested_json() on deep and wide documents.")
+    return parser
+
+
 async def main():
     # Initialize the client once to enable connection pooling.
     # Inject the API key as a global query parameter for all requests.
     # Follow any redirects.
     async with httpx.AsyncClient(timeout=360.0, params={"key": API_KEY}, follow_redirects=True) as client:
         # Pass the shared client to all functions
+        hedger = Hedger() if HEDGE_REQUESTS else None
 
         # Check if the REST API server is up
-        server_online = await get_server_status(client, verbose=False)
+        server_online = await get_server_status(client, verbose=False, hedger=hedger)
         if server_online: 
             logger.info(f"The server is ONLINE  {BASE_URL}")
         else:
             raise Exception(f"The REST API server is offline!  {BASE_URL}")
         
         # Test run_calculator_tool()
-        await run_calculator_tool(client, 5.5, 10.2, "add")
+        await run_calculator_tool(client, 5.5, 10.2, "add", hedger=hedger)
         #await run_calculator_tool(client, 10, 3, "multiply")
 
         # Test run_ext_api_call
         await run_ext_api_call(client, "https://httpbin.org/json")
 
+    # Test run_batch():  the jobs run concurrently, the results arrive in order.
+    jobs = [{"tool": "calculator", "num1": i, "num2": 2, "operation": "multiply"} for i in range(10)]
+    async with get_batch_client(concurrency=4, api_key=API_KEY) as client:
+        async for result in run_batch(client, BASE_URL, jobs, concurrency=4):
+            logger.info(f"Job {result['index']}: {result['status']} {result['result'] or result['error']}")
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = get_arg_parser().parse_args()
+    if args.command == "loadtest":
+        asyncio.run(main_load_test(args))
+    elif args.command == "batch":
+        asyncio.run(main_batch(args))
+    elif args.command == "recommend":
+        main_recommend(args)
+    elif args.command == "bench-decode":
+        bench_decode_nested_json()
+    else:
+        asyncio.run(main())
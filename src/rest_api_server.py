@@ -4,9 +4,23 @@
 #   http://www.savvysolutions.info/savvycodesolutions/
 
 
-__version__ = "0.0.1"
+__version__ = "0.0.15"
 # v0.0.0    Release 2 February 2026
 # v0.0.1    Revised with best practices from gcp_rest_api_noaa.
+# v0.0.2    Graceful SIGTERM draining with in-flight request tracking.
+# v0.0.3    /readyz confirms the FUSE mount per worker process (multi-worker launch).
+# v0.0.4    Runtime profile (uvloop / httptools selection) reported at startup and on /debug/startup.
+# v0.0.5    Asynchronous job API (/api/jobs/...) for long-running upstream calls.
+# v0.0.6    Server-Sent Events endpoint /sse/jobs/{job_id} and the fan-out job /api/jobs/ext_api_batch.
+# v0.0.7    WebSocket endpoint /ws/calculator for high-rate calculator sessions.
+# v0.0.8    MCP tool server (calculator, ext_api_call) mounted at /mcp, sharing the lifespan http_client.
+# v0.0.9    Request and upstream analytics batched into Parquet files (analytics.py) for BigQuery.
+# v0.0.10   Non-blocking JSON logging (log_config.py).  Upstream payloads are only logged with LOG_PAYLOADS=1.
+# v0.0.11   Distributed tracing (tracing.py):  Cloud Trace / traceparent propagation, spans for upstream attempts and file I/O.
+# v0.0.12   RUNTIME_PROFILE defaults to "standard" (the default of GCP_RUN_RUNTIME_PROFILE in gcp_generator.py).
+# v0.0.13   ANALYTICS_SINK defaults to "off".  analytics.py (and pyarrow) are only imported when it is enabled.
+# v0.0.14   Only the per-request upstream warnings and timings are rate limited (extra=RATE_LIMITED).
+# v0.0.15   Startup warning for JOB_STORE=memory with several workers.  Documented that jobs need CPU outside requests.
 
 """
 This is a template for a RESTful API server deployed to Google Cloud Run service.
@@ -38,6 +52,113 @@ Note that while the app is running (yield), Cloud Run pings the /ready endpoint
 When Google Cloud Run decides to shut down the app instance (e.g., because no one has used it for 15 minutes, or you are deploying a new version), 
 it sends a SIGTERM signal.  The application stops accepting new connections and resumes the lifespan function after the yield statement.
 
+Graceful Shutdown (Draining)
+Cloud Run allows 10 seconds between SIGTERM and SIGKILL.  When SIGTERM arrives the app enters a drain phase:
+- /readyz returns 503 so nothing new is routed to the instance.
+- Requests already in flight (tracked by InflightMiddleware) are allowed to finish.
+- A deadline of DRAIN_GRACE_SECONDS (environment variable, default 8 s) is started.  When it passes, any 
+  pending retry sleeps in savvy_request_get_async() are cancelled so those requests return immediately 
+  instead of being killed mid-response.
+The lifespan shutdown block then waits (up to the same deadline) for the in-flight count to reach zero 
+before closing the httpx.AsyncClient connection pool.
+
+Multiple Workers
+When GCP_RUN_WORKERS in gcp_constants.txt is not 1, the container runs several worker processes (uvicorn --workers or gunicorn).
+Each worker imports this script and runs lifespan on its own, so everything in app.state (httpx.AsyncClient, 
+probe_succeeded, drain state) is per worker.  The startup probe only reaches one of the workers, so /readyz 
+repeats the (cheap) FUSE check the first time a worker is asked rather than reporting 503 forever.
+
+Runtime Profile (event loop and HTTP parser)
+The environment variable RUNTIME_PROFILE (set in the Dockerfile from GCP_RUN_RUNTIME_PROFILE) selects:
+    "standard"      asyncio event loop + h11 HTTP parser (default).
+    "performance"   uvloop event loop + httptools HTTP parser when installed (falls back to asyncio / h11).
+The Dockerfile CMD passes the matching --loop / --http options to uvicorn, and the __main__ block below does 
+the same for local runs.  The implementations actually in use are logged by lifespan and returned by /debug/startup.
+
+Asynchronous Jobs
+/api/ext_api_call holds the connection open for the whole upstream retry window (up to 120 s timeout plus backoff).
+POST /api/jobs/ext_api_call instead returns a job ID immediately (HTTP 202) and a bounded pool of background 
+workers performs the call.  Poll GET /api/jobs/{job_id}, or long-poll with GET /api/jobs/{job_id}?wait=10.
+See jobs.py.  Environment variables:
+    JOB_STORE           memory (default), tmp, or bucket.  Use tmp or bucket with multiple workers / instances.
+    JOB_WORKERS         number of concurrent background jobs per worker process (default 4).
+    JOB_QUEUE_SIZE      maximum queued jobs before POST returns 429 (default 100).
+    JOB_TTL_SECONDS     how long finished job records are kept (default 3600).
+Jobs run after the 202 response, outside any request.  With Cloud Run's default CPU allocation (CPU only while
+a request is in flight, 'gcloud run deploy --cpu-throttling':  GCP_RUN_PERFORMANCE_PROFILE default and cheap)
+a queued or running job stalls between client requests.  Deploy with --no-cpu-throttling
+(GCP_RUN_PERFORMANCE_PROFILE=balanced or low-latency) when the job API is used.  The same applies to the background
+flushes of analytics, tracing and firestore_store.py.
+With JOB_STORE=memory each worker process has its own jobs, so with WEB_CONCURRENCY > 1 (GCP_RUN_WORKERS)
+GET /api/jobs/{job_id} and /sse/jobs/{job_id} return 404 when another worker answers.  lifespan logs a warning.
+
+Server-Sent Events (SSE)
+GET /sse/jobs/{job_id} streams the events of a job (status changes, progress and partial results) over one 
+long-lived response instead of the client polling through the API Gateway.  For example, the fan-out job 
+POST /api/jobs/ext_api_batch publishes a "result" event as each URL completes and a "progress" event with the count.
+- Heartbeat:  a comment line is sent every SSE_HEARTBEAT_SECONDS (default 15) when there are no events, 
+  so proxies and the API Gateway do not close an idle stream.
+- Resume:  every event has an id.  A client that reconnects with the Last-Event-ID header (EventSource does this 
+  automatically) continues after the last event it received.  If those events were already discarded 
+  (more than 1000 behind) a "resync" event carries the current job record.
+- Back-pressure:  the stream is produced by a generator that only advances when uvicorn has written the previous 
+  chunk to the socket, so a slow reader slows only its own stream.  The job itself never waits for readers 
+  (events go to a bounded log, see jobs.JobEventLog).
+- Draining:  when the instance is shutting down the stream sends a "shutdown" event and closes; the client 
+  reconnects with Last-Event-ID.
+
+WebSocket Calculator Sessions
+/ws/calculator accepts a stream of calculator requests over one long-lived connection, avoiding the per-request 
+HTTP (and API Gateway) overhead of /api/calculator for clients that send thousands of small requests.
+- Each text frame is one JSON request {"id": ..., "num1": ..., "num2": ..., "operation": ...} or a JSON list 
+  of up to WS_MAX_BATCH of them.  The reply frame has the same shape: {"id": ..., "result": ..., "message": ...} 
+  (or {"id": ..., "error": ...}), so responses are correlated by "id".
+- Pipelining:  clients may send many frames without waiting for the replies.  Replies are sent in request order.
+- Flow control:  a frame is only read after the reply to the previous one has been written, so a client that 
+  does not read its replies is slowed down by TCP back-pressure instead of growing server-side buffers.
+- Google API Gateway does not support WebSockets.  Connect directly to the Cloud Run URL (wss://...).
+- When the instance starts draining, the connection is closed with code 1012 (service restart).
+See bench_websocket_calculator.py for a throughput comparison against /api/calculator.
+
+MCP (Model Context Protocol) Tool Server
+The calculator and ext_api_call tools are also exposed to MCP clients (LLM agents) using the MCP streamable HTTP
+transport at /mcp/ in this same ASGI app.  The tools call the same functions as the REST endpoints and use the 
+lifespan-managed httpx.AsyncClient, so there is one connection pool per worker process, not one per protocol.
+- stateless_http:  no MCP session state is kept between requests, so any Cloud Run instance / worker can 
+  serve any tool call (no session affinity needed) and concurrent tool calls run concurrently on the event loop.
+- json_response:  tool results are returned as a plain JSON response rather than a one-event SSE stream.
+- The MCP app's own lifespan (its session manager) is run inside lifespan below.
+- Requires:  pip install fastmcp.  If fastmcp is not installed, or MCP_ENABLED=0, /mcp/ is not mounted.
+
+Request Analytics
+One row per HTTP request (method, route, status, duration) and one row per upstream call made by 
+savvy_request_get_async() (host, status, attempts, duration, error) are recorded in memory by AnalyticsMiddleware
+and written as zstd compressed Parquet files to the bucket mount by a background task (see analytics.py).
+Recording a row is a list append, so nothing on the request path waits on the bucket.
+The files are loaded into the BigQuery dataset GCP_BQ_DATASET_ID with a batch load job (analytics.bigquery_load()).
+- ANALYTICS_SINK:  "off" (default), "bucket" {MOUNT_PATH}/analytics, or "tmp" /tmp/analytics.
+- ANALYTICS_MAX_ROWS / ANALYTICS_FLUSH_SECONDS:  a file is written per table at this many rows, or this often.
+- Requires:  pip install pyarrow (add it to gcp/pip_install.txt).  If pyarrow is not installed, analytics is disabled.
+  analytics.py and pyarrow are only imported by lifespan when ANALYTICS_SINK is not "off", so they add nothing
+  to the cold start otherwise.
+
+Logging
+All logging (including uvicorn's) goes through a queue to a background writer thread (see log_config.py), so a slow
+stdout never blocks the event loop.  On Cloud Run each entry is a JSON line with "severity" for Cloud Logging.
+- LOG_LEVEL:  e.g. WARNING to discard the logger.info() calls.
+- LOG_RATE_LIMIT:  at most N records per S seconds from each of the noisy per-request log lines ("N/S", default 
+  "20/10"):  the upstream retry, redirect and failure warnings and the /api/ext_api_call timing.
+  uvicorn's access and error logs and all ERROR records are never rate limited.
+- LOG_PAYLOADS=1:  log the upstream payloads returned by /api/ext_api_call (off by default).
+
+Tracing
+TracingMiddleware continues the trace in the incoming X-Cloud-Trace-Context / traceparent header (set by
+API Gateway and Cloud Run), so one request can be followed from the gateway, through this service, to the upstream.
+Each savvy_request_get_async() attempt and the file system checks of the startup probe and FileJobStore get 
+a child span, and the trace headers are passed on to the upstream.  See tracing.py.
+- TRACE_EXPORTER:  "none" (default, propagation and log correlation only), "file" or "cloudtrace".
+- TRACE_SAMPLE_RATE:  fraction of requests traced when the caller has not decided (default 0.01).
+
 
 Overall Architecture Implemented for Cloud Run Deployment:
 
@@ -61,7 +182,7 @@ Overall Architecture Implemented for Cloud Run Deployment:
 - Traffic Routing:
     The /ready endpoint returns 200 OK only after it confirms the FUSE mount exists and passes 
     I/O validation tests. Once Cloud Run receives this 200 OK response, it considers 
-    the instance "Healthy" and begins routing actual user traffic to the /sse endpoint.
+    the instance "Healthy" and begins routing actual user traffic to the API endpoints (including /sse/jobs/{job_id}).
 
     
 Google Cloud Run local, ephemeral /tmp directory:
@@ -108,17 +229,22 @@ Google Cloud Storage FUSE Mount:
 
 from pathlib import Path
 #from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import Dict, Any, List
 import os
 import sys
 import time
 from contextlib import asynccontextmanager
 import asyncio
+import signal
 import json
 import httpx
 from time import perf_counter
+from importlib.util import find_spec
+from jobs import JobRunner, JobQueueFull, get_job_store, JOB_STATUS_FINAL
+from tracing import tracer, get_exporter, TRACE_EXPORTER
 
 
 
@@ -130,30 +256,14 @@ from time import perf_counter
 # By default, print() goes to stdout. Depending on the environment, the Python root logger might be sending logs to stderr. 
 # You can set an Environment Variable in Cloud Run LOG_LEVEL=WARNING. Even if the code is full of logger.info() calls, they will be discarded instantly by the logger and never sent to Google Cloud
 # While Cloud Run captures both print() and logger, they are often processed by different buffers.
-# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error). The python-json-logger uses levelname by default.
+# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error).
 
-# Install with: pip install python-json-logger
-import logging
+# log_config writes through a queue to a background thread, so logging never blocks the event loop.
+# JSON with "severity" on Cloud Run, [LEVEL] message locally.  See log_config.py for LOG_LEVEL, LOG_FORMAT and LOG_RATE_LIMIT.
+from log_config import get_logger, route_uvicorn_logs, RATE_LIMITED
 
 # Use a named logger
-logger = logging.getLogger(Path(__file__).stem)
-logger.setLevel(logging.INFO)
-
-# Setup a standard Text Handler (Not JSON)
-# This is what gcloud CLI "pretty prints" best.
-if not logger.handlers:
-    # Cloud Run captures everything on stdout
-    logHandler = logging.StreamHandler(sys.stdout)
-    
-    # Use a clean, classic format: [LEVEL] Message
-    # This format is highly readable in both the CLI and the Console.
-    formatter = logging.Formatter('[%(levelname)s] %(message)s')
-    logHandler.setFormatter(formatter)
-    
-    logger.addHandler(logHandler)
-
-# Prevent double-logging
-logger.propagate = False
+logger = get_logger(Path(__file__).stem)
 
 logger.info(f"'{Path(__file__).stem}.py' v{__version__}") 
 # logger.info(), logger.warning(), logger.error()
@@ -179,6 +289,36 @@ app_config = {
     "bucket_mount_path": None,                                          # Google Storage bucket mount path
     "path_gcp_tmp": None,                                               # Google Cloud Run ephemeral /tmp
 }
+
+# Seconds allowed for in-flight requests to finish after SIGTERM.
+# Cloud Run sends SIGKILL 10 seconds after SIGTERM, so keep this below 10.
+DRAIN_GRACE_SECONDS = float(os.environ.get("DRAIN_GRACE_SECONDS", "8"))
+
+# Asynchronous job API (see jobs.py)
+JOB_STORE = os.environ.get("JOB_STORE", "memory")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "100"))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "3600"))
+# Upper limit for the long-poll 'wait' (keep below the API Gateway backend deadline of 15 s).
+JOB_MAX_WAIT_SECONDS = 10.0
+# Maximum number of URLs and concurrent upstream requests for /api/jobs/ext_api_batch
+JOB_BATCH_MAX_URLS = 1000
+JOB_BATCH_MAX_CONCURRENCY = 32
+
+# Server-Sent Events: idle time before a heartbeat comment is sent
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+
+# WebSocket calculator: maximum requests in one frame
+WS_MAX_BATCH = 1000
+
+# Request analytics (see analytics.py)
+ANALYTICS_SINK = os.environ.get("ANALYTICS_SINK", "off")
+ANALYTICS_MAX_ROWS = int(os.environ.get("ANALYTICS_MAX_ROWS", "10000"))
+ANALYTICS_FLUSH_SECONDS = float(os.environ.get("ANALYTICS_FLUSH_SECONDS", "60"))
+
+# Log the upstream payloads returned by /api/ext_api_call (opt-in, they can be large).  Truncated to LOG_PAYLOAD_MAX_CHARS.
+LOG_PAYLOADS = os.environ.get("LOG_PAYLOADS", "0") == "1"
+LOG_PAYLOAD_MAX_CHARS = 2000
 # Note: after lifespan(), access 'app_config' this way:
 # print(f"bucket_mount_path: {app.state.app_config['bucket_mount_path']}")
 
@@ -343,6 +483,186 @@ def get_tmp_path() -> Path:
 
 
 
+def get_runtime_profile(profile: str = None) -> dict:
+    """
+    Returns the uvicorn 'loop' and 'http' settings for the runtime profile 'profile'
+    (default: environment variable RUNTIME_PROFILE, else "standard").
+
+    "performance" selects uvloop / httptools only if they are installed (uvloop does not support Windows), 
+    otherwise it falls back to asyncio / h11 so the server always starts.
+    """
+    profile = profile or os.environ.get("RUNTIME_PROFILE", "standard")
+    if profile == "performance":
+        loop = "uvloop" if find_spec("uvloop") is not None and sys.platform != "win32" else "asyncio"
+        http = "httptools" if find_spec("httptools") is not None else "h11"
+    else:
+        loop = "asyncio"
+        http = "h11"
+    return {"profile": profile, "loop": loop, "http": http}
+
+
+def get_active_runtime() -> dict:
+    """
+    Returns the event loop and HTTP parser implementations actually in use by the running server.
+    Must be called from within the event loop (e.g. lifespan or an async endpoint).
+    """
+    loop_module = type(asyncio.get_running_loop()).__module__.split(".")[0]
+    # uvicorn imports the protocol implementation it selected before lifespan startup.
+    if "uvicorn.protocols.http.httptools_impl" in sys.modules:
+        http = "httptools"
+    elif "uvicorn.protocols.http.h11_impl" in sys.modules:
+        http = "h11"
+    else:
+        http = "unknown"        # Not served by uvicorn (e.g. an in-process test client)
+    return {"loop": "uvloop" if loop_module == "uvloop" else loop_module, "http": http}
+
+
+# ---------------------------------------------------------------------------
+# Graceful shutdown (drain) support
+
+class InflightMiddleware:
+    """
+    Pure ASGI middleware that counts the HTTP requests and WebSocket sessions currently being processed.
+    app.state.inflight is the live count and app.state.idle_event is set whenever it is zero,
+    so the drain phase can wait for it without polling.
+    (A pure ASGI class is used rather than @app.middleware("http") to avoid the per-request overhead
+    of BaseHTTPMiddleware and so streaming responses are not buffered.)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        state = scope["app"].state
+        state.inflight += 1
+        state.idle_event.clear()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            state.inflight -= 1
+            if state.inflight == 0: state.idle_event.set()
+
+
+class AnalyticsMiddleware:
+    """
+    Pure ASGI middleware that records one analytics row per HTTP request (method, route template, status,
+    duration) in app.state.analytics.  The route template (e.g. /api/jobs/{job_id}) is recorded rather than the
+    path so the number of distinct values stays small.  Does nothing if analytics is disabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        sink = getattr(scope["app"].state, "analytics", None) if scope["type"] == "http" else None
+        if sink is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        t_start = perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start": status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in scope.  Unmatched paths (scanners, typos) share one value.
+            route = getattr(scope.get("route"), "path", "(no route)")
+            sink.record_request(scope["method"], route, status, 1000*(perf_counter()-t_start))
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that runs each HTTP request inside a server span continuing the caller's trace
+    (X-Cloud-Trace-Context / traceparent headers).  See tracing.py.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"] if k in (b"traceparent", b"x-cloud-trace-context")}
+        with tracer.start_request(headers, f"{scope['method']} {scope['path']}") as span:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start": span.set("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+            route = getattr(scope.get("route"), "path", None)
+            if route: span.name = f"{scope['method']} {route}"
+
+
+def begin_drain(app: FastAPI):
+    """
+    Enter the drain phase (idempotent).  /readyz starts failing and a timer is started that
+    sets app.state.abort_event once DRAIN_GRACE_SECONDS have elapsed.  Setting abort_event
+    cancels any pending retry sleeps in savvy_request_get_async().
+    """
+    if app.state.draining: return
+    app.state.draining = True
+    app.state.drain_event.set()
+    loop = asyncio.get_running_loop()
+    app.state.drain_deadline = loop.time() + DRAIN_GRACE_SECONDS
+    app.state.drain_timer = loop.call_later(DRAIN_GRACE_SECONDS, app.state.abort_event.set)
+    logger.info(f"Drain started. {app.state.inflight} request(s) in flight. Grace period {DRAIN_GRACE_SECONDS} s.")
+
+
+def install_sigterm_drain(app: FastAPI):
+    """
+    Chain a SIGTERM handler in front of the one installed by uvicorn so the drain phase starts the
+    moment Cloud Run sends SIGTERM (uvicorn only resumes lifespan after its own connections close).
+    Signal handlers can only be installed from the main thread; otherwise this is a no-op.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        previous_handler = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(sig, frame):
+            loop.call_soon_threadsafe(begin_drain, app)
+            if callable(previous_handler): previous_handler(sig, frame)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        # Not running in the main thread (e.g. a test client). Drain still runs from lifespan shutdown.
+        logger.info("SIGTERM drain handler not installed (not in main thread).")
+
+
+async def drain_inflight_requests(app: FastAPI):
+    """
+    Wait for in-flight requests to finish, up to the drain deadline.
+    When the deadline passes, abort_event is set so pending retry sleeps are cancelled,
+    and the remaining requests get a short moment to unwind.
+    """
+    begin_drain(app)
+    t_start = perf_counter()
+    remaining = app.state.drain_deadline - asyncio.get_running_loop().time()
+    try:
+        if not app.state.idle_event.is_set():
+            await asyncio.wait_for(app.state.idle_event.wait(), timeout=max(remaining, 0))
+    except asyncio.TimeoutError:
+        logger.warning(f"Drain deadline passed with {app.state.inflight} request(s) in flight. Cancelling retries.")
+        app.state.abort_event.set()
+        try:
+            await asyncio.wait_for(app.state.idle_event.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            logger.error(f"{app.state.inflight} request(s) still in flight at shutdown.")
+    app.state.drain_timer.cancel()
+    logger.info(f"Drain finished in {round(perf_counter()-t_start,2)} s")
+
+
 # ---------------------------------------------------------------------------
 # FastAPI Lifespan (Startup/Shutdown)
 
@@ -362,9 +682,21 @@ async def lifespan(app: FastAPI):
     before the Cloud Run service is considered ready to handle requests that depend on the GCS mount.
     """
 
-    logger.info("Application lifespan startup sequence initiated.")
+    # uvicorn has configured its loggers by now.  Write them through the same non-blocking queue.
+    route_uvicorn_logs()
+
+    logger.info(f"Application lifespan startup sequence initiated (pid {os.getpid()}).")
 
     app.state.probe_succeeded = False
+
+    # Graceful shutdown state (see InflightMiddleware and drain_inflight_requests())
+    app.state.inflight = 0
+    app.state.idle_event = asyncio.Event()
+    app.state.idle_event.set()
+    app.state.draining = False
+    app.state.drain_event = asyncio.Event()
+    app.state.abort_event = asyncio.Event()
+    install_sigterm_drain(app)
     
     # Define the Mount Path location
     path_bucket_mount = get_mount_path()
@@ -389,6 +721,24 @@ async def lifespan(app: FastAPI):
     app.state.http_client = httpx.AsyncClient(timeout=timeout_config, follow_redirects=True)
     logger.info("httpx.AsyncClient initialized.")
 
+    # Start the background job workers (asynchronous job API)
+    app.state.job_runner = JobRunner(get_job_store(JOB_STORE, app.state.app_config, ttl_s=JOB_TTL_SECONDS), workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE)
+    app.state.job_runner.start()
+    if JOB_STORE == "memory" and int(os.environ.get("WEB_CONCURRENCY") or "1") > 1:
+        logger.warning(f"JOB_STORE=memory with WEB_CONCURRENCY={os.environ['WEB_CONCURRENCY']} workers:  each worker only knows its own jobs, "
+                       "so /api/jobs/{job_id} and /sse/jobs/{job_id} return 404 when another worker answers.  Use JOB_STORE=tmp or bucket.")
+
+    # Request analytics (None if ANALYTICS_SINK=off or pyarrow is not installed)
+    app.state.analytics = None
+    if ANALYTICS_SINK != "off":
+        # Imported here so analytics.py and pyarrow are not loaded at all when analytics is off.
+        from analytics import get_analytics_sink
+        app.state.analytics = get_analytics_sink(ANALYTICS_SINK, app.state.app_config, max_rows=ANALYTICS_MAX_ROWS, flush_interval=ANALYTICS_FLUSH_SECONDS)
+    if app.state.analytics is not None: app.state.analytics.start()
+
+    # Export sampled trace spans (nothing to start if TRACE_EXPORTER=none)
+    tracer.start(get_exporter(TRACE_EXPORTER, app.state.app_config))
+
     # Execute other initialization code here, before the yield statement. 
 
     # Optional block of code
@@ -399,18 +749,45 @@ async def lifespan(app: FastAPI):
         pass
         # Local non-Cloud Run environment
 
+    # Report the runtime profile requested and the implementations actually in use.
+    app.state.startup_report = {
+        "version": __version__,
+        "pid": os.getpid(),
+        "runtime_profile": get_runtime_profile(),
+        "runtime_active": get_active_runtime(),
+        "startup_s": round(perf_counter()-t_boot,3),
+    }
+    logger.info(f"Runtime profile: {app.state.startup_report['runtime_profile']}  active: {app.state.startup_report['runtime_active']}")
+
     logger.info(f"lifecycle took {round(perf_counter()-t_boot,1)} s")
 
     # Application endpoints are now ready to serve traffic.
-    yield 
+    # The MCP app's session manager must run for the lifetime of the app (see "MCP Tool Server" section).
+    if mcp_app is not None:
+        async with mcp_app.lifespan(app):
+            yield
+    else:
+        yield 
 
     # 4. SHUTDOWN LOGIC (runs when server is shutting down)
     logger.info("Application shutdown sequence initiated.")
 
+    # Let in-flight requests finish (bounded by DRAIN_GRACE_SECONDS) before closing the pool.
+    await drain_inflight_requests(app)
+
+    # Give background jobs whatever remains of the grace period, then cancel them.
+    await app.state.job_runner.stop(timeout=max(app.state.drain_deadline - asyncio.get_running_loop().time(), 0))
+
     # Cleanly close the connection pool to prevent resource leaks
     await app.state.http_client.aclose()
     logger.info("httpx.AsyncClient closed.")
 
+    # Write the analytics rows still in memory
+    if app.state.analytics is not None: await app.state.analytics.close()
+
+    # Export the trace spans still pending
+    await tracer.stop()
+
  
 # FastAPI Application Initialization
 # The 'title' and 'description' fields are important for the auto-generated
@@ -430,6 +807,13 @@ app = FastAPI(
     lifespan=lifespan,       # Attach the lifespan handler
 )
 
+# Track in-flight requests for graceful shutdown draining.
+app.add_middleware(InflightMiddleware)
+# Run each request in a trace span
+app.add_middleware(TracingMiddleware)
+# Record request analytics (added last, so it is the outermost middleware and times the whole request).
+app.add_middleware(AnalyticsMiddleware)
+
 # ----------------------------------------------------------------------
 # Pydantic Models for Data Validation
 
@@ -442,6 +826,18 @@ class CalculatorInput(BaseModel):
 class ExtApiInput(BaseModel):
     url: str
 
+
+class ExtApiBatchInput(BaseModel):
+    urls: List[str]
+    concurrency: int = 8
+
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
 # ----------------------------------------------------------------------
 # Path Operations (API Endpoints)
 
@@ -465,8 +861,15 @@ def liveness_check():
 @app.get("/readyz")
 def readiness_check(request: Request):
     """Checks if the environment and storage are fully ready."""
+    if request.app.state.draining:
+        raise HTTPException(status_code=503, detail="Service draining")
     if not request.app.state.probe_succeeded:
-        raise HTTPException(status_code=503, detail="Service initializing")
+        # With multiple workers the startup probe may have been answered by a different worker process,
+        # so confirm the FUSE mount for this worker (sets probe_succeeded on success).
+        try:
+            startup_probe(request)
+        except HTTPException:
+            raise HTTPException(status_code=503, detail="Service initializing")
     return {"status": "ready"}
 
 
@@ -486,7 +889,9 @@ def startup_probe(request: Request):
     if not path_bucket_mount.exists():  raise HTTPException(status_code=503, detail="Waiting for GCS FUSE mount to stabilize.")
     
     path_file_startup_probe = path_bucket_mount.joinpath("startup_probe.txt")
-    if path_file_startup_probe.is_file():
+    with tracer.span("fs.is_file", path=str(path_file_startup_probe)):
+        probe_found = path_file_startup_probe.is_file()
+    if probe_found:
         # FUSE mount is ready. Signal Cloud Run to send traffic.
         logger.info(f"Startup probe succeeded. FUSE file found at: {path_file_startup_probe}.")
 
@@ -513,6 +918,15 @@ def startup_probe(request: Request):
     return {"status": "ok", "message": "FUSE mount ready, application is starting up."}
 
 
+@app.get("/debug/startup")
+def debug_startup(request: Request) -> Dict[str, Any]:
+    """
+    Startup report for this worker process: version, pid, runtime profile (requested vs. active
+    event loop and HTTP parser) and the time taken from import to the end of lifespan startup.
+    """
+    return request.app.state.startup_report
+
+
 @app.get("/")
 def read_root() -> Dict[str, str]:
     """
@@ -537,10 +951,9 @@ def read_root() -> Dict[str, str]:
 
 
 
-@app.post("/api/calculator")
-async def calculate(data: CalculatorInput):
+def do_calculation(data: CalculatorInput) -> dict:
     """
-    RESTful endpoint for the simple calculator.
+    The simple calculator used by /api/calculator and /ws/calculator.
     """
     num1 = data.num1
     num2 = data.num2
@@ -557,16 +970,97 @@ async def calculate(data: CalculatorInput):
     return {"result": result, "message": message}
 
 
+@app.post("/api/calculator")
+async def calculate(data: CalculatorInput):
+    """
+    RESTful endpoint for the simple calculator.
+    """
+    return do_calculation(data)
+
+
+def ws_calculate(item) -> dict:
+    """Validate and calculate one /ws/calculator request.  The request "id" is copied to the reply."""
+    if not isinstance(item, dict):
+        return {"id": None, "error": "Each request must be a JSON object"}
+    try:
+        reply = do_calculation(CalculatorInput.model_validate(item))
+    except ValidationError as e:
+        reply = {"error": e.errors(include_url=False, include_context=False)}
+    reply["id"] = item.get("id")
+    return reply
+
+
+@app.websocket("/ws/calculator")
+async def ws_calculator(websocket: WebSocket):
+    """
+    WebSocket calculator session.  See "WebSocket Calculator Sessions" at the top of this script.
+    """
+    await websocket.accept()
+    app_state = websocket.app.state
+
+    async def close_on_drain():
+        await app_state.drain_event.wait()
+        await websocket.close(code=1012, reason="Instance shutting down")
+
+    drain_watcher = asyncio.create_task(close_on_drain())
+    try:
+        while True:
+            # Read the next frame only after the reply to the previous one was sent (flow control).
+            text = await websocket.receive_text()
+            try:
+                request = json.loads(text)
+            except ValueError:
+                await websocket.send_text(json.dumps({"id": None, "error": "Invalid JSON"}))
+                continue
+
+            if isinstance(request, list):
+                if len(request) > WS_MAX_BATCH:
+                    reply = {"id": None, "error": f"At most {WS_MAX_BATCH} requests per frame"}
+                else:
+                    reply = [ws_calculate(item) for item in request]
+            else:
+                reply = ws_calculate(request)
+            await websocket.send_text(json.dumps(reply, separators=(',', ':')))
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away, or the socket was closed by close_on_drain()
+        pass
+    finally:
+        drain_watcher.cancel()
+
+
 import random
 from http import HTTPStatus
 
+async def _retry_sleep(wait_time: float, abort_event: asyncio.Event = None) -> bool:
+    """
+    Sleep 'wait_time' seconds between retries.  Returns True if the sleep was cut short by abort_event.
+    """
+    if abort_event is None:
+        await asyncio.sleep(wait_time)
+        return False
+    if abort_event.is_set(): return True
+    try:
+        await asyncio.wait_for(abort_event.wait(), timeout=wait_time)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+def _record_upstream(url: str, t_start: float, attempts: int, status: int = None, error: str = None):
+    """Record one analytics row for a savvy_request_get_async() call (if analytics is enabled)."""
+    sink = getattr(app.state, "analytics", None)
+    if sink is not None:
+        sink.record_upstream(httpx.URL(url).host, status, attempts, 1000*(perf_counter()-t_start), error)
+
+
 async def savvy_request_get_async(
     url: str, 
     client: httpx.AsyncClient, 
     params: dict = None, 
     retries: int = 3, 
     headers: dict = None, 
-    verbose: bool = False
+    verbose: bool = False,
+    abort_event: asyncio.Event = None
 ):
     """
     Asynchronous version of savvy_request_get.
@@ -575,6 +1069,9 @@ async def savvy_request_get_async(
 
     Returns the response object from a HTTP GET to 'url' of up to 'retries' attempts for HTTP response codes 429,500-504.
     Returns None for other errors. 
+
+    If 'abort_event' is passed and becomes set (drain deadline passed during shutdown), any pending 
+    retry sleep is cancelled and None is returned immediately.
     """
     if url is None:
         raise ValueError("Argument 'url' not passed to function")
@@ -587,24 +1084,29 @@ async def savvy_request_get_async(
         HTTPStatus.GATEWAY_TIMEOUT,         # 504
     ]
 
+    t_start = perf_counter()
+    status = error = None
+    attempt = 0
     for attempt in range(1, retries + 1):
         if attempt > 1: verbose = True
         try:
             # The timeout duration is handled by the client configuration passed in from lifespan
-            response = await client.get(url=url, params=params, headers=headers)
+            # One span per attempt.  The trace headers let the upstream join this request's trace.
+            with tracer.span("savvy_request_get_async", url=url, attempt=attempt) as span:
+                response = await client.get(url=url, params=params, headers=tracer.inject(headers))
+                span.set("http.status_code", response.status_code)
+            status, error = response.status_code, None
             
             # Show any 301 redirects
             if response.history: 
                 if not response.history[0].url == response.url:
-                    logger.warning(100*"-")
-                    logger.warning(f"URL redirected!")
-                    logger.warning(f"{response.history[0].url} -> {response.url}")
-                    logger.warning(100*"-")
+                    logger.warning(f"URL redirected!  {response.history[0].url} -> {response.url}", extra=RATE_LIMITED)
                 #logger.info(f"Original URL: {response.history[0].url}")
                 #logger.info(f"Final URL: {response.url}")
             # -----------------------------------
 
             response.raise_for_status()
+            _record_upstream(url, t_start, attempt, status)
             return response  # Success
             
         except httpx.HTTPStatusError as e:
@@ -613,40 +1115,48 @@ async def savvy_request_get_async(
                 jitter = random.uniform(0, 2)
                 wait_time = attempt * 3 + jitter
                 if verbose:
-                    logger.warning(f"HTTP {code} on attempt {attempt}/{retries}. Retrying in {wait_time:.2f}s...")
-                await asyncio.sleep(wait_time)
+                    logger.warning(f"HTTP {code} on attempt {attempt}/{retries}. Retrying in {wait_time:.2f}s...", extra=RATE_LIMITED)
+                if await _retry_sleep(wait_time, abort_event): break
                 continue
             else:
                 # Note: httpx uses .reason_phrase instead of .reason
                 logger.error(f"HTTP Error {code}: {e.response.reason_phrase}")
+                _record_upstream(url, t_start, attempt, status)
                 return None
                 
         except httpx.RequestError as e:
             # Catches network-level errors and httpx.TimeoutException
+            status, error = None, type(e).__name__
             jitter = random.uniform(0, 2)
             wait_time = attempt * 3 + jitter
             if verbose:
-                logger.warning(f"Request exception on attempt {attempt}/{retries}: {e}. Retrying in {wait_time:.2f}s...")
-            await asyncio.sleep(wait_time)
+                logger.warning(f"Request exception on attempt {attempt}/{retries}: {e}. Retrying in {wait_time:.2f}s...", extra=RATE_LIMITED)
+            if await _retry_sleep(wait_time, abort_event): break
             continue
 
+    _record_upstream(url, t_start, attempt, status, error)
+
+    if abort_event is not None and abort_event.is_set():
+        logger.warning(f"Retries cancelled by shutdown for url: {url}")
+        return None
+
     if verbose:
         logger.error(f"Failed to get a successful response after {retries} attempts.")
     return None
 
 
-async def ex_savvy_request_get_async(url: str, client: httpx.AsyncClient, verbose: bool = False):
+async def ex_savvy_request_get_async(url: str, client: httpx.AsyncClient, verbose: bool = False, abort_event: asyncio.Event = None):
     
     headers = None
     try:
         # Pass verbose down to the retry handler
-        req = await savvy_request_get_async(url=url, client=client, headers=headers, verbose=verbose)
+        req = await savvy_request_get_async(url=url, client=client, headers=headers, verbose=verbose, abort_event=abort_event)
     except Exception as e:
         logger.error(f"Exception in ex_savvy_request_get_async() for url {url}: {repr(e)}")
         return None
     
     if req is None:
-        logger.warning(f"Request failed and returned None for url: {url}")
+        logger.warning(f"Request failed and returned None for url: {url}", extra=RATE_LIMITED)
         return None
 
     # Protect against successful HTTP requests that return non-JSON bodies
@@ -671,19 +1181,199 @@ async def do_ext_api_call(request: Request, input_data: ExtApiInput) -> dict:
     http_client = request.app.state.http_client
     
     # Await the async data layer function and pass the client AND the missing url
-    result = await ex_savvy_request_get_async(url=input_data.url, client=http_client, verbose=False)
+    # abort_event cancels pending retry sleeps if the instance is shutting down.
+    result = await ex_savvy_request_get_async(url=input_data.url, client=http_client, verbose=False, abort_event=request.app.state.abort_event)
 
     if result is None:
         return {"result": "ERROR", "message": "An error occurred contacting the API"}
 
-    print(f"result:\n{result}")
+    if LOG_PAYLOADS: logger.info(f"result: {json.dumps(result)[:LOG_PAYLOAD_MAX_CHARS]}")
 
-    logger.info(f"/api/ext_api_call took {round(perf_counter()-t_start,1)} s")
+    logger.info(f"/api/ext_api_call took {round(perf_counter()-t_start,1)} s", extra=RATE_LIMITED)
 
     return {"result": result, "message": msg}
 
 
 
+async def run_ext_api_call_job(request: dict, publish):
+    """
+    Background job for /api/jobs/ext_api_call.  Returns the upstream JSON, or None on failure.
+    """
+    return await ex_savvy_request_get_async(url=request["url"], client=app.state.http_client, verbose=False, abort_event=app.state.abort_event)
+
+
+async def run_ext_api_batch_job(request: dict, publish):
+    """
+    Background job for /api/jobs/ext_api_batch.  Fetches all 'urls' with at most 'concurrency' requests 
+    in flight, publishing a "result" event (partial result) and a "progress" event as each URL completes.
+    Returns a summary with the results in the order of 'urls'.
+    """
+    urls = request["urls"]
+    semaphore = asyncio.Semaphore(request["concurrency"])
+    results = [None] * len(urls)
+    n_done = 0
+    n_errors = 0
+
+    async def fetch(i: int, url: str):
+        nonlocal n_done, n_errors
+        async with semaphore:
+            result = await ex_savvy_request_get_async(url=url, client=app.state.http_client, verbose=False, abort_event=app.state.abort_event)
+        results[i] = result
+        n_done += 1
+        if result is None: n_errors += 1
+        publish("result", {"index": i, "url": url, "result": result})
+        publish("progress", {"done": n_done, "total": len(urls), "errors": n_errors})
+
+    await asyncio.gather(*(fetch(i, url) for i, url in enumerate(urls)))
+    return {"total": len(urls), "errors": n_errors, "results": results}
+
+
+@app.post("/api/jobs/ext_api_call", status_code=202)
+async def submit_ext_api_call_job(request: Request, input_data: ExtApiInput) -> JobAccepted:
+    """
+    Asynchronous version of /api/ext_api_call.  Returns a job ID immediately.
+    Get the result from /api/jobs/{job_id}.
+    """
+    return await submit_job(request, "ext_api_call", input_data.model_dump(), run_ext_api_call_job)
+
+
+@app.post("/api/jobs/ext_api_batch", status_code=202)
+async def submit_ext_api_batch_job(request: Request, input_data: ExtApiBatchInput) -> JobAccepted:
+    """
+    Fan-out job: fetch many URLs concurrently.  Returns a job ID immediately.
+    Stream progress and partial results from /sse/jobs/{job_id}, or get the summary from /api/jobs/{job_id}.
+    """
+    if not 0 < len(input_data.urls) <= JOB_BATCH_MAX_URLS:
+        raise HTTPException(status_code=422, detail=f"Between 1 and {JOB_BATCH_MAX_URLS} urls required")
+    params = {"urls": input_data.urls, "concurrency": min(max(input_data.concurrency, 1), JOB_BATCH_MAX_CONCURRENCY)}
+    return await submit_job(request, "ext_api_batch", params, run_ext_api_batch_job)
+
+
+async def submit_job(request: Request, job_type: str, params: dict, func) -> JobAccepted:
+    """Queue a job with the JobRunner.  Answers 429 if the job queue is full."""
+    try:
+        job = await request.app.state.job_runner.submit(job_type, params, func)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue full ({e}). Retry later.")
+    return JobAccepted(job_id=job["job_id"], status=job["status"], status_url=f"/api/jobs/{job['job_id']}", events_url=f"/sse/jobs/{job['job_id']}")
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(request: Request, job_id: str, wait: float = 0.0) -> Dict[str, Any]:
+    """
+    Returns the job status, and the result once status is "done".
+    Pass 'wait' (seconds, max 10) to long-poll: the response is sent as soon as the job finishes or 'wait' elapses.
+    """
+    job = await request.app.state.job_runner.get(job_id, wait=min(max(wait, 0.0), JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+def format_sse(data, event: str = None, event_id: int = None) -> str:
+    """Returns one Server-Sent Events message.  'data' is sent as a single line of JSON."""
+    msg = ""
+    if event_id is not None: msg += f"id: {event_id}\n"
+    if event is not None: msg += f"event: {event}\n"
+    return msg + f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def sse_job_stream(app: FastAPI, job_id: str, last_event_id: int):
+    """
+    Generator for /sse/jobs/{job_id}.  See "Server-Sent Events (SSE)" at the top of this script.
+    All pending events are joined into one chunk per write to keep the number of socket writes low.
+    """
+    runner = app.state.job_runner
+    # Tell EventSource how long to wait before reconnecting.
+    yield "retry: 3000\n\n"
+
+    log = runner.events(job_id)
+    if log is None:
+        # Job accepted by another worker process / instance (tmp or bucket store): follow the stored record.
+        status = None
+        while not app.state.draining:
+            job = await runner.get(job_id)
+            if job is None: return
+            if job["status"] != status:
+                status = job["status"]
+                yield format_sse(job, event=status if status in JOB_STATUS_FINAL else "status")
+                if status in JOB_STATUS_FINAL: return
+            await asyncio.sleep(1.0)
+        yield format_sse({"job_id": job_id}, event="shutdown")
+        return
+
+    last_id = last_event_id
+    t_last_write = perf_counter()
+    while True:
+        events, gap = log.since(last_id)
+        chunk = ""
+        if gap:
+            chunk += format_sse(await runner.get(job_id), event="resync")
+        for event_id, event, data in events:
+            chunk += format_sse(data, event=event, event_id=event_id)
+            last_id = event_id
+        if chunk:
+            yield chunk
+            t_last_write = perf_counter()
+        if log.closed and not log.since(last_id)[0]: return
+        if app.state.draining:
+            yield format_sse({"job_id": job_id, "last_event_id": last_id}, event="shutdown")
+            return
+        # Wake at least once a second so a drain is noticed well within the grace period.
+        if not await log.wait(min(SSE_HEARTBEAT_SECONDS, 1.0)) and perf_counter() - t_last_write >= SSE_HEARTBEAT_SECONDS:
+            yield ": heartbeat\n\n"
+            t_last_write = perf_counter()
+
+
+@app.get("/sse/jobs/{job_id}")
+async def sse_job_events(request: Request, job_id: str, last_event_id: int = Header(default=0)):
+    """
+    Server-Sent Events stream of a job's status, progress and partial results.
+    Reconnect with the Last-Event-ID header to resume after the last event received.
+    """
+    job = await request.app.state.job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",      # Disable response buffering by proxies
+    }
+    return StreamingResponse(sse_job_stream(request.app, job_id, last_event_id), media_type="text/event-stream", headers=headers)
+
+
+# ----------------------------------------------------------------------
+# MCP (Model Context Protocol) Tool Server
+
+MCP_ENABLED = os.environ.get("MCP_ENABLED", "1") != "0"
+
+try:
+    # pip install fastmcp
+    from fastmcp import FastMCP
+except ImportError:
+    FastMCP = None
+    if MCP_ENABLED: logger.warning("fastmcp is not installed.  The MCP tool server at /mcp/ is disabled.")
+
+mcp_app = None
+if FastMCP is not None and MCP_ENABLED:
+    mcp = FastMCP(name="Simple REST API Server MCP Tools", version=__version__)
+
+    @mcp.tool
+    async def calculator(num1: float, num2: float, operation: str = "add") -> dict:
+        """Simple calculator.  Returns the result and a message.  Only 'add' is supported."""
+        return do_calculation(CalculatorInput(num1=num1, num2=num2, operation=operation))
+
+    @mcp.tool
+    async def ext_api_call(url: str) -> dict:
+        """Fetch JSON from an external API 'url' (with retries).  Returns the JSON as 'result'."""
+        # Reuse the lifespan-managed connection pool of this worker process.
+        result = await ex_savvy_request_get_async(url=url, client=app.state.http_client, verbose=False, abort_event=app.state.abort_event)
+        if result is None:
+            return {"result": "ERROR", "message": "An error occurred contacting the API"}
+        return {"result": result, "message": "ext_api_call"}
+
+    mcp_app = mcp.http_app(path="/", stateless_http=True, json_response=True)
+    app.mount("/mcp", mcp_app)
+
 
 if __name__ == "__main__":
     pass
@@ -695,7 +1385,10 @@ if __name__ == "__main__":
         # It tells uvicorn to run the 'app' instance found in the 'api_mcp_fastapi_server' module.
         # host="0.0.0.0" makes the server accessible externally (useful for deployment/containers).
         # port=8000 is the default port.
-        uvicorn.run(f"{Path(__file__).stem}:app", host="0.0.0.0", port=8000, reload=True)
+        # loop / http select uvloop / httptools when available (see get_runtime_profile()).
+        runtime = get_runtime_profile()
+        logger.info(f"Runtime profile: {runtime}")
+        uvicorn.run(f"{Path(__file__).stem}:app", host="0.0.0.0", port=8000, reload=True, loop=runtime["loop"], http=runtime["http"])
 
         # ALTERNATIVELY: To run this script locally in a Windows command (cmd) window:
         # 1) Open a Windows command (cmd) window.
@@ -0,0 +1,353 @@
+#
+#   Written by:  Mark W Kiehl
+#   http://mechatronicsolutionsllc.com/
+#   http://www.savvysolutions.info/savvycodesolutions/
+
+
+# Define the script version in terms of Semantic Versioning (SemVer)
+# when Git or other versioning systems are not employed.
+__version__ = "0.0.1"
+# v0.0.0    initial release
+# v0.0.1    The incoming sampled flag is propagated unchanged.  Only the recording of spans depends on the exporter.
+
+"""
+Lightweight distributed tracing compatible with Google Cloud Trace and W3C Trace Context.
+
+A request arriving through API Gateway / Cloud Run carries the trace of the caller in the headers
+'X-Cloud-Trace-Context: TRACE_ID/SPAN_ID;o=1' and/or 'traceparent: 00-TRACE_ID-SPAN_ID-01'.
+TracingMiddleware (rest_api_server.py) continues that trace:
+- A server span is created for the request as a child of the caller's span (a new trace if there are no headers).
+- tracer.span("name", key=value) creates a child span of the current span (context manager, works in async code
+  because the current span is held in a contextvars.ContextVar).  Used around each savvy_request_get_async()
+  attempt and around file system operations.
+- tracer.inject(headers) adds 'traceparent' and 'X-Cloud-Trace-Context' for the current span, so the upstream
+  request joins the same trace.
+- Log entries written while a span is current get "logging.googleapis.com/trace" and ".../spanId" fields
+  (JSON logging, see log_config.py), so Cloud Logging groups them under the request's trace.
+
+Sampling (head based):  the sampled flag of the incoming request is honored (o=1 / flags 01, e.g. set by Cloud Run
+or the caller).  Requests without a decision are sampled with probability TRACE_SAMPLE_RATE (default 0.01).
+The decision is propagated upstream unchanged (tracer.inject()), even if this service records no spans.
+Spans are only recorded when the request is sampled and an exporter is running (Span.recording).  Otherwise
+tracer.span() returns a shared no-op object, so the cost is one ContextVar lookup.  Trace ids are still
+propagated upstream and added to the log entries.
+
+Export:  finished spans are appended to an in-memory list and a background task hands them to the exporter in
+batches of up to TRACE_BATCH_SIZE spans, at least every TRACE_EXPORT_SECONDS seconds.  The export runs in a worker
+thread.  If the exporter falls behind, spans beyond TRACE_MAX_PENDING are dropped (counted in tracer.stats).
+    TRACE_EXPORTER=none         (default) Propagation and log correlation only, spans are not recorded.
+    TRACE_EXPORTER=file         JSON lines appended to TRACE_FILE (default {/tmp folder}/traces.jsonl).  For tests.
+    TRACE_EXPORTER=cloudtrace   Cloud Trace API.  Requires:  pip install google-cloud-trace  and GCP_PROJ_ID.
+Any object with an export(spans: list[dict]) method can be passed to tracer.start().
+"""
+
+from pathlib import Path
+from contextvars import ContextVar
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from log_config import get_logger, get_queue_handler
+
+# Use a named logger (non-blocking, see log_config.py)
+logger = get_logger(Path(__file__).stem)
+
+
+# ----------------------------------------------------------------------
+# Constants
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_EXPORT_SECONDS = float(os.environ.get("TRACE_EXPORT_SECONDS", "5"))
+TRACE_BATCH_SIZE = 512
+TRACE_MAX_PENDING = 10000
+# Project for the Cloud Logging trace field and the Cloud Trace exporter
+TRACE_PROJECT = os.environ.get("GCP_PROJ_ID", os.environ.get("GOOGLE_CLOUD_PROJECT"))
+
+
+# ----------------------------------------------------------------------
+# Spans
+
+class Span:
+    """A timed operation.  Use through tracer.span() / tracer.start_request() as a context manager."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "sampled", "recording", "attributes",
+                 "t_start", "t_end", "error", "_token")
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: str, sampled: bool, attributes: dict, recording: bool = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        # 'sampled' is the trace's sampling decision (propagated), 'recording' whether this span is exported.
+        self.sampled = sampled
+        self.recording = sampled if recording is None else recording
+        self.attributes = attributes
+        self.t_start = self.t_end = None
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.t_start = time.time()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.t_end = time.time()
+        _current_span.reset(self._token)
+        if exc is not None: self.error = repr(exc)
+        if self.recording: self.tracer._on_end(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time": self.t_start,
+            "end_time": self.t_end,
+            "duration_ms": round(1000*(self.t_end-self.t_start), 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned by tracer.span() when the current request is not recorded."""
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span = ContextVar("current_span", default=None)
+
+
+def parse_trace_headers(headers) -> tuple:
+    """
+    Returns (trace_id, parent span_id (16 hex digits), sampled True/False/None) from the
+    'traceparent' or 'X-Cloud-Trace-Context' header, or (None, None, None).
+    'headers' is a dict with lower case keys.
+    """
+    traceparent = headers.get("traceparent")
+    if traceparent:
+        parts = traceparent.strip().split("-")
+        if len(parts) >= 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            try:
+                return parts[1].lower(), parts[2].lower(), bool(int(parts[3][:2], 16) & 1)
+            except ValueError:
+                pass
+    cloud = headers.get("x-cloud-trace-context")
+    if cloud:
+        # TRACE_ID/SPAN_ID;o=OPTIONS   (SPAN_ID is a decimal unsigned 64 bit integer)
+        trace_id, _, rest = cloud.strip().partition("/")
+        span, _, options = rest.partition(";")
+        if len(trace_id) == 32:
+            try:
+                span_id = f"{int(span):016x}" if span else None
+            except ValueError:
+                span_id = None
+            sampled = None
+            if options.startswith("o="): sampled = options[2:] == "1"
+            return trace_id.lower(), span_id, sampled
+    return None, None, None
+
+
+# ----------------------------------------------------------------------
+# Exporters
+
+class FileExporter:
+    """Appends spans as JSON lines to 'path_file'."""
+
+    def __init__(self, path_file: Path):
+        self.path_file = Path(path_file)
+        self.path_file.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: list):
+        with open(self.path_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+
+
+class CloudTraceExporter:
+    """Writes spans to the Cloud Trace API (batch_write_spans).  Requires:  pip install google-cloud-trace"""
+
+    def __init__(self, project_id: str):
+        # pip install google-cloud-trace
+        from google.cloud import trace_v2
+        from datetime import datetime, timezone
+        self._datetime = lambda t: datetime.fromtimestamp(t, tz=timezone.utc)
+        self.client = trace_v2.TraceServiceClient()
+        self.project_id = project_id
+
+    def export(self, spans: list):
+        trace_spans = []
+        for span in spans:
+            attributes = {k: {"string_value": {"value": str(v)[:256]}} for k, v in span["attributes"].items()}
+            if span["error"]: attributes["error"] = {"string_value": {"value": span["error"][:256]}}
+            trace_spans.append({
+                "name": f"projects/{self.project_id}/traces/{span['trace_id']}/spans/{span['span_id']}",
+                "span_id": span["span_id"],
+                "parent_span_id": span["parent_span_id"] or "",
+                "display_name": {"value": span["name"]},
+                "start_time": self._datetime(span["start_time"]),
+                "end_time": self._datetime(span["end_time"]),
+                "attributes": {"attribute_map": attributes},
+            })
+        self.client.batch_write_spans(name=f"projects/{self.project_id}", spans=trace_spans)
+
+
+def get_exporter(kind: str, app_config: dict):
+    """Returns the exporter for TRACE_EXPORTER 'kind' ("none", "file" or "cloudtrace"), or None."""
+    if kind == "none": return None
+    if kind == "file":
+        return FileExporter(os.environ.get("TRACE_FILE", Path(app_config["path_gcp_tmp"]) / "traces.jsonl"))
+    if kind == "cloudtrace":
+        if not TRACE_PROJECT: raise Exception("TRACE_EXPORTER=cloudtrace requires the environment variable GCP_PROJ_ID")
+        return CloudTraceExporter(TRACE_PROJECT)
+    raise Exception(f"Unknown trace exporter '{kind}'. Use 'none', 'file' or 'cloudtrace'.")
+
+
+# ----------------------------------------------------------------------
+# Tracer
+
+class Tracer:
+    """Creates spans and exports them in batches.  Use the module level 'tracer'."""
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.exporter = None
+        self._pending = []
+        self._loop = None
+        self._flush_event = None
+        self._task = None
+        self._closing = False
+        self.stats = {"spans": 0, "dropped": 0, "exported": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # Span creation
+
+    def start_request(self, headers: dict, name: str, **attributes) -> Span:
+        """
+        Returns the server span for an incoming request (a context manager), continuing the trace in
+        'headers' (dict with lower case keys).  The caller's sampling decision is kept as is.  Without one,
+        the request is sampled with probability sample_rate if an exporter is running.
+        The span is recorded only if it is sampled and an exporter is running.
+        """
+        trace_id, parent_id, sampled = parse_trace_headers(headers)
+        if trace_id is None: trace_id = os.urandom(16).hex()
+        if sampled is None: sampled = self.exporter is not None and random.random() < self.sample_rate
+        return Span(self, name, trace_id, parent_id, sampled, attributes, recording=sampled and self.exporter is not None)
+
+    def span(self, name: str, parent: Span = None, **attributes):
+        """
+        Returns a child span of 'parent' (default: the current span), or a no-op span if there is none
+        or it is not recorded.  Pass 'parent' to continue a trace in another task (e.g. a background job).
+        """
+        if parent is None: parent = _current_span.get()
+        if parent is None or not parent.recording: return _NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, True, attributes)
+
+    def current(self) -> Span:
+        return _current_span.get()
+
+    def inject(self, headers: dict = None) -> dict:
+        """Returns a copy of 'headers' with the trace headers of the current span added (if any)."""
+        span = _current_span.get()
+        if span is None: return headers
+        headers = dict(headers) if headers else {}
+        headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"
+        headers["X-Cloud-Trace-Context"] = f"{span.trace_id}/{int(span.span_id, 16)};o={1 if span.sampled else 0}"
+        return headers
+
+    # ------------------------------------------------------------------
+    # Export
+
+    def start(self, exporter):
+        """Start exporting finished spans to 'exporter'.  Call from a running event loop (e.g. lifespan)."""
+        if exporter is None: return
+        self.exporter = exporter
+        self._loop = asyncio.get_running_loop()
+        self._flush_event = asyncio.Event()
+        self._task = asyncio.create_task(self._export_loop())
+        logger.info(f"Tracing: exporter {type(exporter).__name__}, sample rate {self.sample_rate}")
+
+    def _on_end(self, span: Span):
+        # May be called from a worker thread (asyncio.to_thread copies the context).  list.append is thread safe.
+        if len(self._pending) >= TRACE_MAX_PENDING:
+            self.stats["dropped"] += 1
+            return
+        self._pending.append(span)
+        self.stats["spans"] += 1
+        if len(self._pending) == TRACE_BATCH_SIZE and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._flush_event.set)
+
+    async def flush(self):
+        while self._pending:
+            batch, self._pending = self._pending[:TRACE_BATCH_SIZE], self._pending[TRACE_BATCH_SIZE:]
+            try:
+                await asyncio.to_thread(self.exporter.export, [span.to_dict() for span in batch])
+                self.stats["exported"] += len(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Tracing: export of {len(batch)} spans failed: {repr(e)}")
+
+    async def _export_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=TRACE_EXPORT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def stop(self):
+        """Export the spans still pending and stop the export task."""
+        if self._task is None: return
+        # Let an export in progress finish rather than cancelling it part way.
+        self._closing = True
+        self._flush_event.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        self.exporter = None
+        logger.info(f"Tracing stopped. {self.stats}")
+
+
+tracer = Tracer()
+
+
+# ----------------------------------------------------------------------
+# Log correlation
+
+class TraceLogFilter(logging.Filter):
+    """Adds the Cloud Logging trace fields of the current span to each record (runs in the thread that logs, where the span is current)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        if span is not None:
+            fields = {
+                "logging.googleapis.com/spanId": span.span_id,
+                "logging.googleapis.com/trace_sampled": span.sampled,
+            }
+            if TRACE_PROJECT: fields["logging.googleapis.com/trace"] = f"projects/{TRACE_PROJECT}/traces/{span.trace_id}"
+            json_fields = getattr(record, "json_fields", None)
+            record.json_fields = {**fields, **json_fields} if json_fields else fields
+        return True
+
+
+get_queue_handler().addFilter(TraceLogFilter())
@@ -11,15 +11,15 @@
 
 """
 
-__version__ = "0.0.0"
+__version__ = "0.0.1"
 # v0.0.0    
+# v0.0.1    Non-blocking logging (log_config.py).
 
 
 from pathlib import Path
 from pydantic import BaseModel
 from typing import Dict, Any, List
 import os
-import sys
 from time import perf_counter
 from datetime import datetime, timezone, timedelta, date
 import pandas as pd
@@ -35,30 +35,14 @@ import asyncio
 # By default, print() goes to stdout. Depending on the environment, the Python root logger might be sending logs to stderr. 
 # You can set an Environment Variable in Cloud Run LOG_LEVEL=WARNING. Even if the code is full of logger.info() calls, they will be discarded instantly by the logger and never sent to Google Cloud
 # While Cloud Run captures both print() and logger, they are often processed by different buffers.
-# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error). The python-json-logger uses levelname by default.
+# Google Cloud Logging looks for a field named severity to categorize logs (Blue for Info, Orange for Warning, Red for Error).
 
-# Install with: pip install python-json-logger
-import logging
+# log_config writes through a queue to a background thread, so logging never blocks the event loop.
+# JSON with "severity" on Cloud Run, [LEVEL] message locally.  See log_config.py for LOG_LEVEL, LOG_FORMAT and LOG_RATE_LIMIT.
+from log_config import get_logger
 
 # Use a named logger
-logger = logging.getLogger(Path(__file__).stem)
-logger.setLevel(logging.INFO)
-
-# Setup a standard Text Handler (Not JSON)
-# This is what gcloud CLI "pretty prints" best.
-if not logger.handlers:
-    # Cloud Run captures everything on stdout
-    logHandler = logging.StreamHandler(sys.stdout)
-    
-    # Use a clean, classic format: [LEVEL] Message
-    # This format is highly readable in both the CLI and the Console.
-    formatter = logging.Formatter('[%(levelname)s] %(message)s')
-    logHandler.setFormatter(formatter)
-    
-    logger.addHandler(logHandler)
-
-# Prevent double-logging
-logger.propagate = False
+logger = get_logger(Path(__file__).stem)
 
 logger.info(f"'{Path(__file__).stem}.py' v{__version__}") 
 # logger.info(), logger.warning(), logger.error()